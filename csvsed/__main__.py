@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from csvsed.main import launch_new_instance
+
+launch_new_instance()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous modification of CSV records, for use within an asyncio
+event loop: rows come from an async iterable, and the commands of "e"
+modifiers are run with `asyncio.create_subprocess_shell` instead of
+blocking the loop. This module requires Python 3.6 or later.
+"""
+
+import asyncio
+import collections
+import tempfile
+
+from csvsed.sed import DEFAULT_BATCH_SIZE, ChainModifier, EModifier, standardize_modifiers
+
+DEFAULT_CONCURRENCY = 16
+
+class CommandError(Exception):
+    """
+    Raised within the tasks of an `AsyncCSVModifier` when a command of the
+    `EModifier` `modifier` fails, and reported by the `AsyncCSVModifier`
+    through `EModifier.fail()`, like the synchronous modifiers do.
+    """
+    def __init__(self, modifier, command, err):
+        super(CommandError, self).__init__('command `%s` failed: %s' % (command, err))
+        self.modifier = modifier
+        self.command = command
+        self.err = err
+
+    def report(self):
+        self.modifier.fail(self.command, self.err)
+
+class AsyncModifier(object):
+    """
+    Base class of the modifiers whose `call_many()` is a coroutine.
+    """
+    async def __call__(self, value):
+        return (await self.call_many([value]))[0]
+
+    async def call_many(self, values):
+        raise NotImplementedError()
+
+    async def aclose(self):
+        pass
+
+class AsyncEModifier(AsyncModifier):
+    """
+    Runs the commands of the `EModifier` `modifier` as asyncio
+    subprocesses, at most as many at a time as the `semaphore` allows.
+    Matching, command expansion and results are those of `modifier`, and
+    so are the `b`, `c` and `z` flags: in batch mode, `call_many()` runs
+    one command per distinct expanded command, concurrently; in
+    coprocess mode, the cells are sent to a single coprocess one at a
+    time, and the semaphore does not apply.
+    """
+    def __init__(self, modifier, semaphore):
+        self.modifier = modifier
+        self.semaphore = semaphore
+        self.batch = modifier.batch
+        self.separator = modifier.separator.encode('utf-8')
+        self.proc = None
+        self.lock = asyncio.Lock()
+
+    async def call_many(self, values):
+        mod = self.modifier
+        results = list(values)
+        commands = collections.OrderedDict()
+        for idx, value in enumerate(values):
+            command = mod.expand(value)
+            if command is not None:
+                commands.setdefault(command, []).append(idx)
+        if mod.coprocess:
+            # a single command, and the cells are sent in order
+            for indices in commands.values():
+                for idx in indices:
+                    results[idx] = await self.communicate(values[idx])
+            return results
+
+        if self.batch:
+            groups = list(commands.items())
+            outs = await asyncio.gather(*[self.execute_batch(command, [values[idx] for idx in indices])
+                                          for command, indices in groups])
+            for (command, indices), records in zip(groups, outs):
+                for idx, result in zip(indices, records):
+                    results[idx] = result
+        else:
+            jobs = [(command, idx) for command, indices in commands.items() for idx in indices]
+            outs = await asyncio.gather(*[self.run(command, mod.encode(values[idx])) for command, idx in jobs])
+            for (command, idx), out in zip(jobs, outs):
+                results[idx] = mod.result(out)
+        return results
+
+    async def run(self, command, data):
+        """
+        Runs `command` with `data` on its standard input and returns its standard output, once a slot of the
+        `semaphore` is free. Raises `CommandError` if it fails.
+        """
+        async with self.semaphore:
+            proc = await asyncio.create_subprocess_shell(
+                command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+            try:
+                out, err = await proc.communicate(data)
+            finally:
+                if proc.returncode is None:
+                    # cancelled: do not leave the command running
+                    proc.kill()
+                    await proc.wait()
+        if proc.returncode != 0:
+            raise CommandError(self.modifier, command, err.decode('utf-8'))
+        return out
+
+    async def execute_batch(self, command, values):
+        """
+        Runs `command` once over all `values` and returns one result per value.
+        """
+        mod, separator = self.modifier, self.separator
+        data = []
+        for value in values:
+            encoded = mod.encode(value)
+            if separator in encoded:
+                raise CommandError(mod, command, 'cell contains the record separator: %r\n' % value)
+            data.append(encoded + separator)
+
+        out = await self.run(command, b''.join(data))
+        if out.endswith(separator):
+            out = out[:-len(separator)]
+        records = out.split(separator)
+        if len(records) != len(values):
+            raise CommandError(mod, command, 'expected %i output records, got %i\n' % (len(values), len(records)))
+        return [mod.result(record) for record in records]
+
+    async def communicate(self, value):
+        """
+        Sends `value` to the coprocess, starting it if needed, and returns the record it writes back.
+        """
+        mod, separator = self.modifier, self.separator
+        data = mod.encode(value)
+        if separator in data:
+            raise CommandError(mod, mod.command, 'cell contains the record separator: %r\n' % value)
+
+        async with self.lock:
+            if self.proc is None:
+                self.buffer = b''
+                self.errors = tempfile.TemporaryFile()
+                self.proc = await asyncio.create_subprocess_shell(
+                    mod.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=self.errors)
+
+            # written while the output is read, so that neither blocks on a full pipe
+            writer = asyncio.ensure_future(self.write(data + separator))
+            try:
+                while separator not in self.buffer:
+                    chunk = await self.proc.stdout.read(65536)
+                    if not chunk:
+                        await writer
+                        await self.terminate()
+                        raise CommandError(mod, mod.command, 'coprocess exited before answering\n')
+                    self.buffer += chunk
+                await writer
+            finally:
+                writer.cancel()
+            out, self.buffer = self.buffer.split(separator, 1)
+
+        return mod.result(out)
+
+    async def write(self, data):
+        try:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+        except (IOError, OSError):
+            # the coprocess went away; report it through the end of its output
+            pass
+
+    async def terminate(self):
+        """
+        Closes the standard input of the coprocess and waits for it, raising `CommandError` if it exited with a
+        non-zero status.
+        """
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        await proc.stdout.read()
+        returncode = await proc.wait()
+        self.errors.seek(0)
+        err = self.errors.read().decode('utf-8')
+        self.errors.close()
+        if returncode != 0:
+            raise CommandError(self.modifier, self.modifier.command, err)
+
+    async def aclose(self):
+        """
+        Shuts down the coprocess, if any.
+        """
+        async with self.lock:
+            if self.proc is not None:
+                await self.terminate()
+
+class AsyncChainModifier(AsyncModifier):
+    """
+    Applies a sequence of modifiers in order, some of which are `AsyncModifier` objects.
+    """
+    def __init__(self, modifiers):
+        self.modifiers = modifiers
+
+    async def call_many(self, values):
+        for mod in self.modifiers:
+            values = await call_many(mod, values)
+        return values
+
+    async def aclose(self):
+        for mod in self.modifiers:
+            if isinstance(mod, AsyncModifier):
+                await mod.aclose()
+
+async def call_many(mod, values):
+    """
+    Returns the results of the modifier `mod` for all `values`, whether it is an `AsyncModifier` or not.
+    """
+    if isinstance(mod, AsyncModifier):
+        return await mod.call_many(values)
+    many = getattr(mod, 'call_many', None)
+    return many(values) if many else [mod(value) for value in values]
+
+class AsyncCSVModifier(object):
+    """
+    The asyncio counterpart of `CSVModifier`: modifies the CSV records
+    coming from `rows`, an async iterable (or a plain iterable) of lists
+    of values, and supports ``async for``. See `CSVModifier` for the
+    `modifiers`, `header` and `batch_size` parameters.
+
+    The commands of `e` modifiers are run as asyncio subprocesses, with
+    at most `concurrency` of them running at a time, and up to
+    `concurrency` rows (or batches of rows, for `e` modifiers with the
+    `b` flag) are modified concurrently, without threads. Rows are still
+    returned in input order. As with `CSVModifier`, a failing command is
+    reported on the standard error and exits with status 1 (see
+    `EModifier.fail()`), once the pending rows are cancelled.
+
+    The header row is read on the first iteration (or when entering the
+    ``async with`` block), after which it is available in
+    `column_names`. Use `aclose()`, or ``async with``, to shut down the
+    coprocesses of `e` modifiers with the `c` flag.
+    """
+    def __init__(self, rows, modifiers, header=True, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+        if hasattr(rows, '__aiter__'):
+            self.rows = rows.__aiter__()
+        else:
+            self.rows = iter_rows(rows)
+        self.modifier_specs = modifiers
+        self.header = header
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.column_names = None
+        self.modifiers = None
+        self.functions = None
+        self.pending = collections.deque()
+        self.chunks = None
+
+    async def start(self):
+        """
+        Reads the header row, if any, and prepares the modifiers. Called by the first iteration.
+        """
+        if self.modifiers is not None:
+            return
+        if self.header:
+            try:
+                self.column_names = await self.rows.__anext__()
+            except StopAsyncIteration:
+                self.header = False
+        self.modifiers = standardize_modifiers(self.column_names, self.modifier_specs)
+        # created within the event loop
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.functions = dict((col, self.wrap(mod)) for col, mod in self.modifiers.items())
+        self.batched = any(getattr(mod, 'batch', False) for mod in self.modifiers.values())
+
+    def wrap(self, mod):
+        """
+        Returns the function actually called to modify the cells handled by the modifier `mod`.
+        """
+        if isinstance(mod, EModifier):
+            return AsyncEModifier(mod, self.semaphore)
+        if isinstance(mod, ChainModifier) and any(isinstance(step, EModifier) for step in mod.modifiers):
+            return AsyncChainModifier([self.wrap(step) for step in mod.modifiers])
+        return mod
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.start()
+        if self.header:
+            self.header = False
+            return self.column_names
+        while not self.pending:
+            if self.chunks is None:
+                self.chunks = self.iter_chunks(self.batch_size if self.batched else 1)
+            try:
+                rows = await self.chunks.__anext__()
+            except CommandError as error:
+                await self.aclose()
+                error.report()
+            self.pending.extend(rows)
+        return self.pending.popleft()
+
+    async def read_rows(self, size):
+        """
+        Reads up to `size` rows. Returns an empty list once `rows` is exhausted.
+        """
+        rows = []
+        while len(rows) < size:
+            try:
+                rows.append(await self.rows.__anext__())
+            except StopAsyncIteration:
+                break
+        return rows
+
+    async def iter_chunks(self, size):
+        """
+        Generates lists of up to `size` modified rows, in input order. Up to `concurrency` lists are modified
+        concurrently, each in its own task, and each is yielded once it and all the lists before it are done.
+        """
+        inflight = collections.deque()
+        exhausted = False
+        try:
+            while True:
+                # stop reading ahead as soon as the oldest list is ready, in case the rows come in slowly
+                while not exhausted and len(inflight) < self.concurrency and not (inflight and inflight[0].done()):
+                    rows = await self.read_rows(size)
+                    if rows:
+                        inflight.append(asyncio.ensure_future(self.modify_rows(rows)))
+                    else:
+                        exhausted = True
+                if not inflight:
+                    return
+                yield await inflight.popleft()
+        finally:
+            for task in inflight:
+                task.cancel()
+            if inflight:
+                await asyncio.gather(*inflight, return_exceptions=True)
+
+    async def modify_rows(self, rows):
+        """
+        Modifies a list of rows column by column, like `CSVModifier.modify_rows()`, and returns it.
+        """
+        for col, mod in self.functions.items():
+            values = await call_many(mod, [row[col] for row in rows])
+            for row, value in zip(rows, values):
+                row[col] = value
+        return rows
+
+    async def aclose(self):
+        """
+        Cancels the pending rows and releases the resources held by the modifiers, such as the coprocesses started by
+        `e` modifiers with the `c` flag.
+        """
+        if self.chunks is not None:
+            chunks, self.chunks = self.chunks, None
+            await chunks.aclose()
+        if self.functions is None:
+            return
+        for mod in self.functions.values():
+            if isinstance(mod, AsyncModifier):
+                try:
+                    await mod.aclose()
+                except CommandError as error:
+                    error.report()
+        for mod in self.modifiers.values():
+            if hasattr(mod, 'close'):
+                mod.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+async def iter_rows(rows):
+    """
+    Generates the rows of the plain iterable `rows`, asynchronously.
+    """
+    for row in rows:
+        yield row
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for `csvsed`: the modifiers, `CSVModifier` iteration and the
+command-line interface, on deterministic synthetic CSV data, the
+construction of `CSVModifier`, CPU-bound callable modifiers in worker
+processes, the output stage, the modification of in-memory tables and
+the startup time of the command. Run with ``python -m csvsed.bench``;
+``--save`` writes the results as JSON, and ``--compare`` flags the
+regressions against a previous run.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import agate
+
+from csvsed.sed import CSVModifier, compile_transform, modifier_as_function, modifier_cache, transform_cache
+
+ASCII_CHARS = u'abcdefghijklmnopqrstuvwxyz0123456789 '
+UNICODE_CHARS = u'αβγδεζηθжщюüéñ€中文字'
+SPECIAL_CHARS = u',"\n'
+
+# the synthetic CSV files of the benchmarks: row count, width, average cell size in characters, fraction of cells that
+# must be quoted, and fraction of non-ASCII characters
+DATASETS = {
+    'narrow': dict(rows=20000, width=10, cell_size=8, quoting=0.1, unicode=0.0),
+    'wide': dict(rows=2000, width=200, cell_size=8, quoting=0.1, unicode=0.0),
+    'long': dict(rows=2000, width=10, cell_size=200, quoting=0.5, unicode=0.1),
+    'quoted': dict(rows=20000, width=10, cell_size=8, quoting=0.9, unicode=0.0),
+    'unicode': dict(rows=20000, width=10, cell_size=8, quoting=0.1, unicode=0.5),
+}
+
+MODIFIERS = {
+    's-regex': u's/([a-z]+) ([a-z]+)/\\2 \\1/g',
+    's-literal': u's/ab/AB/g',
+    'y': u'y/abcα/ABCΑ/',
+    'e-batch': u'e/./tr a-z A-Z/b',
+    'e-coprocess': u'e/./while read -r l; do echo "$l"; done/c',
+    'e-exec': u'e/./echo x/',
+}
+
+# the "e" modifiers running a command per cell only get this many cells
+EXEC_ROWS = 200
+
+DEFAULT_THRESHOLD = 0.1
+
+def generate_rows(rows=1000, width=10, cell_size=8, quoting=0.1, unicode=0.0, seed=0):
+    """
+    Returns `rows` lists of `width` random cells, `cell_size` characters long on average. A `quoting` fraction of the
+    cells hold a delimiter, a quote or a new line, and a `unicode` fraction of the characters are not ASCII. The same
+    parameters always give the same rows.
+    """
+    rand = random.Random(seed)
+    data = []
+    for _ in range(rows):
+        row = []
+        for _ in range(width):
+            size = rand.randint(max(1, cell_size // 2), cell_size * 3 // 2)
+            cell = [rand.choice(UNICODE_CHARS if rand.random() < unicode else ASCII_CHARS) for _ in range(size)]
+            if rand.random() < quoting:
+                cell.insert(rand.randint(0, size), rand.choice(SPECIAL_CHARS))
+            row.append(u''.join(cell))
+        data.append(row)
+    return data
+
+def generate_csv(rows=1000, width=10, **kwargs):
+    """
+    Returns the CSV text of the `generate_rows` rows, after a header naming the columns "c0", "c1", etc.
+    """
+    dst = io.StringIO()
+    writer = agate.csv.writer(dst)
+    writer.writerow([u'c%i' % col for col in range(width)])
+    writer.writerows(generate_rows(rows, width, **kwargs))
+    return dst.getvalue()
+
+def measure(name, func, rows, size, repeat=3):
+    """
+    Returns the result of the benchmark `name`: the best time of `repeat` calls to `func`, which processes `rows` rows
+    of `size` bytes in total, with the derived rates.
+    """
+    seconds = min(timeit.repeat(func, number=1, repeat=repeat))
+    return dict(name=name, rows=rows, bytes=size, seconds=seconds, rows_per_s=rows / seconds,
+                mb_per_s=size / seconds / 1e6)
+
+def text_size(values):
+    return sum(len(value.encode('utf-8')) for value in values)
+
+def bench_modifiers(scale=1.0, repeat=3):
+    """
+    Benchmarks each of the `MODIFIERS` on the cells of a column of the "unicode" dataset, without the special
+    characters that "e" modifiers cannot handle, one call per cell (through `call_many` for batch modifiers).
+    """
+    params = dict(DATASETS['unicode'], rows=int(DATASETS['unicode']['rows'] * scale) or 1, width=1, quoting=0.0)
+    values = [row[0] for row in generate_rows(**params)]
+    results = []
+    for name, modifier in sorted(MODIFIERS.items()):
+        mod = modifier_as_function(modifier)
+        cells = values[:EXEC_ROWS] if name == 'e-exec' else values
+        if getattr(mod, 'batch', False):
+            func = lambda: mod.call_many(cells)
+        else:
+            func = lambda: [mod(value) for value in cells]
+        try:
+            results.append(measure('modifier/%s' % name, func, len(cells), text_size(cells), repeat))
+        finally:
+            if hasattr(mod, 'close'):
+                mod.close()
+    return results
+
+def bench_csvmodifier(scale=1.0, repeat=3):
+    """
+    Benchmarks `CSVModifier` on each of the `DATASETS`, with half of the columns modified by an "s" modifier, iterating
+    over the rows one at a time and with `CSVModifier.iter_batches`.
+    """
+    results = []
+    for dataset, params in sorted(DATASETS.items()):
+        params = dict(params, rows=int(params['rows'] * scale) or 1)
+        data = generate_rows(**params)
+        size = sum(text_size(row) for row in data)
+        modifiers = dict((col, u's/a/A/g') for col in range(0, params['width'], 2))
+        def rows_per_row():
+            return list(CSVModifier(iter([list(row) for row in data]), modifiers, header=False))
+        def rows_per_batch():
+            reader = CSVModifier(iter([list(row) for row in data]), modifiers, header=False)
+            return [row for batch in reader.iter_batches() for row in batch]
+        for name, func in (('rows', rows_per_row), ('batches', rows_per_batch)):
+            results.append(measure('csvmodifier/%s/%s' % (dataset, name), func, len(data), size, repeat))
+    return results
+
+def bench_cli(scale=1.0, repeat=3, modes=('rows', 'raw', 'bytes')):
+    """
+    Benchmarks the `CSVSed` command on a file of each of the `DATASETS`, modifying its first and last columns, in each
+    of the `modes`: the default, ``--raw`` and ``--bytes``.
+    """
+    from csvsed.cli import CSVSed
+    options = {'rows': [], 'raw': ['--raw'], 'bytes': ['--bytes']}
+    tmpdir = tempfile.mkdtemp()
+    results = []
+    try:
+        for dataset, params in sorted(DATASETS.items()):
+            params = dict(params, rows=int(params['rows'] * scale) or 1)
+            path = os.path.join(tmpdir, '%s.csv' % dataset)
+            with io.open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(generate_csv(**params))
+            args = ['-c', '1,%i' % params['width'], '-m', u's/a/A/g', path]
+            for mode in modes:
+                def run():
+                    with io.open(os.devnull, 'w', encoding='utf-8') as dst:
+                        CSVSed(options[mode] + args, output_file=dst).run()
+                results.append(measure('cli/%s/%s' % (dataset, mode), run, params['rows'], os.path.getsize(path),
+                                       repeat))
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+def loop_transform(functions):
+    """
+    The reference row transform: a loop over the modified columns.
+    """
+    items = list(functions.items())
+    def transform(row):
+        for col, mod in items:
+            row[col] = mod(row[col])
+        return row
+    return transform
+
+def bench_transform(width=200, columns=100, rows=20000, repeat=3):
+    """
+    Compares the row transform generated by `compile_transform` with the reference loop, on rows of `width` cells
+    of which `columns` are modified by a cheap modifier, so that the per-row overhead dominates.
+    """
+    functions = dict((col, modifier_as_function(u'y/x/y/')) for col in range(0, width, width // columns))
+    data = [[u'cell %i' % col for col in range(width)] for _ in range(rows)]
+    size = sum(text_size(row) for row in data)
+    results = []
+    for name, factory in (('loop', loop_transform), ('compiled', compile_transform)):
+        transform = factory(functions)
+        results.append(measure('transform/%s' % name, lambda: [transform(row) for row in data], rows, size, repeat))
+    return results
+
+class CountingFile(io.FileIO):
+    """
+    The null device, counting the write calls that reach it.
+    """
+    def __init__(self):
+        super(CountingFile, self).__init__(os.devnull, 'w')
+        self.writes = 0
+
+    def write(self, b):
+        self.writes += 1
+        return super(CountingFile, self).write(b)
+
+def bench_output(scale=1.0, repeat=3, batch_size=100):
+    """
+    Benchmarks the writing of the rows of the "narrow" dataset to a line-buffered text file, as standard output is on
+    a terminal: one `writerow` call per row, one `writerows` call per batch of `batch_size` rows, and a
+    `BufferedOutput` fed batches, as `CSVSed` does. The results also hold the number of write calls made to the
+    file.
+    """
+    from csvsed.output import BufferedOutput
+    params = dict(DATASETS['narrow'], rows=int(DATASETS['narrow']['rows'] * scale) or 1)
+    data = generate_rows(**params)
+    size = sum(text_size(row) for row in data)
+    batches = [data[start:start + batch_size] for start in range(0, len(data), batch_size)]
+    def writerow(f):
+        writer = agate.csv.writer(f)
+        for row in data:
+            writer.writerow(row)
+    def writerows(f):
+        writer = agate.csv.writer(f)
+        for batch in batches:
+            writer.writerows(batch)
+    def buffered(f):
+        with BufferedOutput(f, agate.csv.writer) as output:
+            for batch in batches:
+                output.writerows(batch)
+    results = []
+    for name, write in (('writerow', writerow), ('writerows', writerows), ('buffered', buffered)):
+        files = []
+        def run():
+            raw = CountingFile()
+            files.append(raw)
+            with io.TextIOWrapper(io.BufferedWriter(raw), encoding='utf-8', line_buffering=True) as f:
+                write(f)
+        result = measure('output/%s' % name, run, len(data), size, repeat)
+        result['writes'] = files[-1].writes
+        results.append(result)
+    return results
+
+def bench_construction(scale=1.0, repeat=3, count=1000):
+    """
+    Benchmarks the construction of `count` `CSVModifier` objects with the same modifiers, as a server handling
+    requests does, with the modifier and transform caches (`modifier_cache`, `transform_cache`) cleared before each
+    construction ("cold") or kept ("cached"). The row count of the results is the number of constructions, so that
+    their rate is in constructions/s. The count is not scaled.
+    """
+    modifiers = {0: [MODIFIERS['s-regex'], MODIFIERS['y']], 1: MODIFIERS['s-literal'], 2: u's/^a+$/b/i'}
+    header = [u'c0', u'c1', u'c2']
+    def construct(cold):
+        def run():
+            for _ in range(count):
+                if cold:
+                    modifier_cache.clear()
+                    transform_cache.clear()
+                CSVModifier(iter([header]), modifiers)
+        return run
+    return [measure('construction/%s' % name, construct(name == 'cold'), count, 0, repeat)
+            for name in ('cold', 'cached')]
+
+def bench_frame(scale=1.0, repeat=3):
+    """
+    Benchmarks the modification of the "narrow" dataset, with the same modifiers as `bench_csvmodifier`, as a pandas
+    DataFrame: written to CSV, modified by `CSVModifier` and read back ("csv"), or modified by `modify_frame`
+    ("frame"); and as a list of dicts modified by `modify_records` ("records"). Returns no results if pandas is not
+    installed.
+    """
+    try:
+        import pandas
+    except ImportError:
+        return []
+    from csvsed.frame import modify_frame, modify_records
+    params = dict(DATASETS['narrow'], rows=int(DATASETS['narrow']['rows'] * scale) or 1)
+    data = generate_rows(**params)
+    size = sum(text_size(row) for row in data)
+    column_names = [u'c%i' % col for col in range(params['width'])]
+    modifiers = dict((col, u's/a/A/g') for col in range(0, params['width'], 2))
+    frame = pandas.DataFrame(data, columns=column_names, dtype=object)
+    records = [dict(zip(column_names, row)) for row in data]
+    def csv_round_trip():
+        src = io.StringIO(frame.to_csv(index=False))
+        dst = io.StringIO()
+        writer = agate.csv.writer(dst)
+        writer.writerows(CSVModifier(agate.csv.reader(src), modifiers))
+        dst.seek(0)
+        return pandas.read_csv(dst, dtype=object, keep_default_na=False)
+    results = []
+    for name, func in (('csv', csv_round_trip), ('frame', lambda: modify_frame(frame, modifiers)),
+                       ('records', lambda: modify_records(records, modifiers))):
+        results.append(measure('frame/%s' % name, func, len(data), size, repeat))
+    return results
+
+def slow_digest(value, rounds=200):
+    """
+    A CPU-bound callable modifier, in pure Python: returns a digest of `value`.
+    """
+    digest = 0
+    for _ in range(rounds):
+        for char in value:
+            digest = (digest * 31 + ord(char)) % 1000003
+    return u'%06i' % digest
+
+def bench_processes(scale=1.0, repeat=3, processes=(1, 2, 4)):
+    """
+    Benchmarks `CSVModifier` with the CPU-bound `slow_digest` modifier on two columns of the "narrow" dataset, with
+    each of the numbers of worker `processes` (1 runs it in this process).
+    """
+    params = dict(DATASETS['narrow'], rows=int(DATASETS['narrow']['rows'] * scale / 10) or 1)
+    data = generate_rows(**params)
+    size = sum(text_size(row) for row in data)
+    modifiers = {0: slow_digest, 1: slow_digest}
+    def run(count):
+        return lambda: list(CSVModifier(iter([list(row) for row in data]), modifiers, header=False, processes=count))
+    return [measure('processes/%i' % count, run(count), len(data), size, repeat) for count in processes]
+
+# the command lines whose startup is measured, by name: the common cases handled by `csvsed.main`, and two left to
+# `csvsed.cli.CSVSed`
+STARTUP_COMMANDS = (
+    ('names', ['-n', '{path}']),
+    ('modify', ['-c', '1', '-m', u's/a/A/g', '{path}']),
+    ('help', ['--help']),
+    ('raw', ['--raw', '-c', '1', '-m', u's/a/A/g', '{path}']),
+)
+
+STARTUP_IMPORTS = ('csvsed.sed', 'csvsed.main', 'csvsed.cli')
+
+def bench_startup(scale=1.0, repeat=3):
+    """
+    Benchmarks the startup of the ``csvsed`` command, each run in a new Python process: the `STARTUP_COMMANDS` on a
+    file of 10 rows of the "narrow" dataset, and the import of each of the `STARTUP_IMPORTS`. The row count of the
+    results is the number of runs, so that their rate is in runs/s. The datasets are not scaled.
+    """
+    tmpdir = tempfile.mkdtemp()
+    results = []
+    try:
+        path = os.path.join(tmpdir, 'narrow.csv')
+        with io.open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(generate_csv(**dict(DATASETS['narrow'], rows=10)))
+        size = os.path.getsize(path)
+        with open(os.devnull, 'w') as devnull:
+            def command(args):
+                return lambda: subprocess.check_call(args, stdout=devnull)
+            for name, args in STARTUP_COMMANDS:
+                args = [sys.executable, '-m', 'csvsed'] + [arg.format(path=path) for arg in args]
+                results.append(measure('startup/%s' % name, command(args), 1, size, repeat))
+            for module in STARTUP_IMPORTS:
+                args = [sys.executable, '-c', 'import %s' % module]
+                results.append(measure('import/%s' % module, command(args), 1, 0, repeat))
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+BENCHMARKS = (
+    ('modifier', bench_modifiers),
+    ('csvmodifier', bench_csvmodifier),
+    ('cli', bench_cli),
+    ('transform', lambda scale, repeat: bench_transform(rows=int(20000 * scale) or 1, repeat=repeat)),
+    ('startup', bench_startup),
+    ('output', bench_output),
+    ('construction', bench_construction),
+    ('frame', bench_frame),
+    ('processes', bench_processes),
+)
+
+def run_benchmarks(scale=1.0, repeat=3, groups=None):
+    """
+    Runs the benchmarks of the given `groups` (all of them by default), with the row counts of the datasets multiplied
+    by `scale`, and returns the run: the Python version, the platform and the list of results.
+    """
+    results = []
+    for group, func in BENCHMARKS:
+        if groups is None or group in groups:
+            results.extend(func(scale=scale, repeat=repeat))
+    return dict(python=platform.python_version(), implementation=platform.python_implementation(),
+                platform=platform.platform(), scale=scale, results=results)
+
+def compare(base, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares two runs, as returned by `run_benchmarks`. Returns the (name, base rate, current rate, ratio,
+    regressed) tuples of the benchmarks found in both, where the rates are in rows/s and a benchmark has regressed if
+    its rate dropped by more than the `threshold` fraction.
+    """
+    rates = dict((result['name'], result['rows_per_s']) for result in base['results'])
+    comparison = []
+    for result in current['results']:
+        name = result['name']
+        if name in rates:
+            ratio = result['rows_per_s'] / rates[name]
+            comparison.append((name, rates[name], result['rows_per_s'], ratio, ratio < 1 - threshold))
+    return comparison
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m csvsed.bench', description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--save', metavar='FILE', help='Save the results to this JSON file.')
+    parser.add_argument('--load', metavar='FILE', help='Load the results from this JSON file instead of running the '
+                        'benchmarks, e.g. to compare two saved runs.')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with the run saved in this JSON file, '
+                        'and exit with status 1 if a benchmark regressed.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='The rate drop, as a fraction, above which a benchmark has regressed. Defaults to '
+                        '%(default)s.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiply the row counts of the synthetic datasets by this factor.')
+    parser.add_argument('--repeat', type=int, default=3, help='Keep the best of this many runs of each benchmark.')
+    parser.add_argument('--group', dest='groups', action='append', choices=[group for group, _ in BENCHMARKS],
+                        help='Only run this group of benchmarks. Can be specified several times.')
+    args = parser.parse_args(args)
+
+    if args.load:
+        with open(args.load) as f:
+            run = json.load(f)
+    else:
+        run = run_benchmarks(args.scale, args.repeat, args.groups)
+        for result in run['results']:
+            print('%-28s %12.0f rows/s %9.2f MB/s%s' % (result['name'], result['rows_per_s'], result['mb_per_s'],
+                                                         ' %9i writes' % result['writes'] if 'writes' in result else ''))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        regressions = 0
+        for name, before, after, ratio, regressed in compare(base, run, args.threshold):
+            regressions += regressed
+            print('%-28s %12.0f -> %12.0f rows/s %7.2fx%s'
+                  % (name, before, after, ratio, '  REGRESSION' if regressed else ''))
+        if regressions:
+            print('%i benchmark(s) regressed by more than %i%%' % (regressions, args.threshold * 100))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
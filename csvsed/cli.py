@@ -5,44 +5,234 @@
 Command-line interface to `csvsed.sed`.
 """
 
+import codecs
+import collections
+import concurrent.futures
+import csv
+import io
+import itertools
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import timeit
+
 import agate
-from csvkit.cli import CSVKitUtility
-from csvsed.sed import CSVModifier
+from csvkit.cli import CSVKitUtility, LazyFile, make_default_headers, parse_column_identifiers
+from csvsed import compress
+from csvsed.main import (DESCRIPTION, add_csvsed_arguments, check_arguments, first_input, is_compressed, is_mapped,
+                         modifier_kwargs, open_output)
+from csvsed.mapped import MappedFile
+from csvsed.output import BufferedOutput, default_flush_interval
+from csvsed.parallel import ParallelModifier, has_lone_cr, iter_ranges, read_range
+from csvsed.progress import Checkpoint, CheckpointError, Progress, RecordInput, file_position
+from csvsed.raw import RawModifier, binary_modifier, iter_records, split_lines
+from csvsed.sed import (CSVModifier, ExecutionCache, Statistics, DEFAULT_CACHE_SIZE, InvalidAddress, InvalidModifier,
+                        modifier_as_function, parse_address)
 
 class CSVSed(CSVKitUtility):
 
-    description = 'A stream-oriented CSV modification tool. Like a ' \
-                  ' stripped-down "sed" command, but for tabular data.'
+    description = DESCRIPTION
+    # the input files are opened by `main`, one at a time
+    override_flags = 'f'
+
+    def __init__(self, args=None, output_file=None, error_file=None):
+        if args is None:
+            args = sys.argv[1:]
+        # parsed again by `run_file`, for each input file
+        self.argv = list(args)
+        super(CSVSed, self).__init__(self.argv, output_file, error_file)
+        self.args.input_path = first_input(self.args)
 
     def add_arguments(self):
-        self.argparser.add_argument('-n', '--names', dest='names_only', action='store_true',
-                                    help='Display column names and indices from the input CSV and exit.')
-        self.argparser.add_argument('-c', '--columns', dest='columns',
-                                    help='A comma separated list of column indices or names to be modified.')
-        self.argparser.add_argument('-m', '--modifier', dest='modifier',
-                                    help='If specified, the "sed" modifier to evaluate: currently supports substitution '
-                                      '(s/REGEX/REPL/FLAGS), transliteration (y/SRC/DEST/FLAGS) and execution '
-                                      '(e/REGEX/COMMAND/FLAGS).')
+        add_csvsed_arguments(self.argparser)
+
+    def run(self):
+        # with --checkpoint, the output may be resumed instead: see `open_checkpoint`
+        opened = self.args.output_path and not self.args.checkpoint
+        if opened:
+            self.output_file = open_output(self.args.output_path)
+        try:
+            if self.args.in_place or self.args.checkpoint:
+                # nothing is written to the output, not even the byte order mark: see `run_file`
+                self.main()
+            else:
+                super(CSVSed, self).run()
+        finally:
+            if opened:
+                self.output_file.close()
 
     def main(self):
         if self.args.names_only:
-            self.print_column_names()
+            self.open_input(self.args.input_path)
+            try:
+                self.print_column_names()
+            finally:
+                self.input_file.close()
             return
 
-        if not self.args.columns:
-            self.argparser.error('You must specify at least one column to search using the -c option.')
+        self.modifiers = check_arguments(self.argparser, self.args)
+        if len(self.args.input_paths) > 1 or self.args.in_place:
+            self.main_files(self.args.input_paths)
+            return
 
-        if self.args.modifier is None:
-            self.argparser.error('-m must be specified, unless using the -n option.')
+        self.checkpointer = None
+        self.resumed = None
+        if self.args.checkpoint:
+            self.open_checkpoint()
+        else:
+            self.open_input(self.args.input_path)
+        self.stats = Statistics() if self.args.stats or self.args.stats_file else None
+        self.column_names = None
+        self.row_count = 0
+        # the rows written so far, including those of the run resumed, and the input offset after the last one
+        self.rows_done = self.resumed['rows'] if self.resumed else 0
+        self.offset = self.resumed['offset'] if self.resumed else None
+        self.checkpointing = self.checkpointer is not None
+        self.progress = self.make_progress()
 
         try:
-          # decode if necessary, to work exclusively with unicode modifiers
-          if isinstance(self.args.modifier, str):
-              self.args.modifier = self.args.modifier.decode('utf-8')
-        except AttributeError:
-            # Ignore Python 3 error: 'str' object has no attribute 'decode'
-            pass
+            self.main_modify()
+        finally:
+            self.input_file.close()
+            if self.checkpointer is not None:
+                self.output_file.close()
+            if self.stats is not None:
+                self.report_stats()
+        if self.checkpointer is not None:
+            self.checkpointer.remove()
+        if self.progress is not None:
+            self.progress.report(done=True)
+
+    def open_checkpoint(self):
+        """
+        Opens the input file as a `RecordInput`, which tracks the input offset of the rows, and the --output file,
+        from the last --checkpoint with --resume (the output is then truncated to its size at the checkpoint), or
+        from the start.
+        """
+        path, output_path = self.args.input_path, self.args.output_path
+        self.checkpointer = Checkpoint(self.args.checkpoint, path, output_path, self.args.checkpoint_interval)
+        if self.args.resume:
+            try:
+                self.resumed = self.checkpointer.load()
+            except CheckpointError as e:
+                self.argparser.error(str(e))
+        if self.resumed is None:
+            self.output_file = open_output(output_path)
+            if self.args.add_bom:
+                self.output_file.write(u'\ufeff')
+        else:
+            self.output_file = io.open(output_path, 'r+', encoding='utf-8')
+            self.output_file.seek(self.resumed['output_size'])
+            self.output_file.truncate()
+        kwargs = self.reader_kwargs
+        self.input_file = RecordInput(path, self.args.encoding, self.quotechar(), header=not self.args.no_header_row,
+                                      offset=self.resumed['offset'] if self.resumed else None,
+                                      delimiter=kwargs.get('delimiter', ','), doublequote=kwargs.get('doublequote', True),
+                                      skipinitialspace=kwargs.get('skipinitialspace', False))
+
+    def make_progress(self):
+        """
+        Returns the `Progress` of the --progress options, or None.
+        """
+        if not (self.args.progress or self.args.progress_file):
+            return None
+        path = self.args.input_path
+        total = None
+        if path and path != '-' and os.path.isfile(path) and not is_compressed(path):
+            total = os.path.getsize(path)
+        return Progress(self.error_file, self.args.progress_file, self.args.progress_interval, total,
+                        rows=self.rows_done, start=self.offset or 0)
+
+    def advance(self, rows, output=None, position=None):
+        """
+        Records that `rows` more rows were written to `output` (a `BufferedOutput`), and that the input was read up
+        to the byte `position` (by default, that of the input file), for the --progress reports and the
+        --checkpoint, which is saved if it is time to. No more checkpoints are saved once the offsets of the input
+        records cannot be trusted (see `RecordInput.exact`): the last one still can, and is removed at the end.
+        """
+        self.rows_done += rows
+        if self.checkpointing and rows:
+            if not self.input_file.exact:
+                self.checkpointing = False
+                self.error_file.write('No more checkpoints: the input has a quote character that is neither at the '
+                                      'start of a field nor within a quoted field.\n')
+            else:
+                self.offset = self.input_file.pop_offset(rows)
+                if self.checkpointer.due():
+                    self.save_checkpoint(output)
+        if self.progress is not None:
+            self.progress.update(self.rows_done, file_position(self.input_file) if position is None else position)
+
+    def save_checkpoint(self, output):
+        """
+        Writes the rows buffered by `output` to the --output file and syncs it to disk, before saving the checkpoint
+        of the rows written, so that the checkpoint never gets ahead of the output.
+        """
+        output.flush()
+        fileno = self.output_file.fileno()
+        os.fsync(fileno)
+        self.checkpointer.save(self.offset, self.rows_done, os.fstat(fileno).st_size)
+
+    def open_input(self, path):
+        """
+        Opens the input file `path` (the standard input if None or "-") as `input_file`.
+        """
+        self.args.input_path = path
+        self.input_file = self._open_input_file(path)
+
+    def _open_input_file(self, path, opened=False):
+        fmt = compress.input_compression(path)
+        if fmt is None:
+            return super(CSVSed, self)._open_input_file(path, opened)
+        # found by magic bytes too, and decompressed in a background thread
+        stdin = not path or path == '-'
+        return LazyFile(compress.open_input, sys.stdin.buffer if stdin else path, fmt, self.args.encoding)
+
+    def main_modify(self):
+        if self.parallel_input():
+            self.main_parallel()
+            return
+
+        if self.mapped_input():
+            self.input_file.close()
+            self.input_file = MappedFile(self.args.input_path, self.args.encoding)
+
+        cache = None
+        if self.args.cache_size is not None or self.args.cache_file:
+            cache = ExecutionCache(self.args.cache_size or DEFAULT_CACHE_SIZE, self.args.cache_file)
 
+        try:
+            if self.raw_input():
+                self.main_raw(cache)
+            else:
+                self.main_rows(cache)
+        finally:
+            if cache is not None:
+                cache.close()
+                self.report_cache(cache.hits, cache.misses)
+
+    def modifier_kwargs(self):
+        """
+        Returns the keyword arguments of `CSVModifier` set by the command-line options, except the cache.
+        """
+        return modifier_kwargs(self.args)
+
+    def address(self, column_names):
+        """
+        Returns the `Address` of the --address option, whose column names or indices are looked up in
+        `column_names`, or None.
+        """
+        if not self.args.address:
+            return None
+        try:
+            return parse_address(self.args.address, column_names, self.get_column_offset())
+        except InvalidAddress as e:
+            self.argparser.error(str(e))
+
+    def main_rows(self, cache):
         reader_kwargs = self.reader_kwargs
         writer_kwargs = self.writer_kwargs
         if writer_kwargs.pop('line_numbers', False):
@@ -50,18 +240,387 @@ class CSVSed(CSVKitUtility):
 
         rows, column_names, column_ids = self.get_rows_and_column_names_and_column_ids(**reader_kwargs)
 
-        modifiers = {idx: self.args.modifier for idx in column_ids}
-        reader = CSVModifier(rows, modifiers, header=False)
+        modifiers = {idx: self.modifiers for idx in column_ids}
+        reader = CSVModifier(rows, modifiers, header=False, cache=cache, stats=self.stats,
+                             address=self.address(column_names), **self.modifier_kwargs())
+        self.column_names = column_names
+
+        try:
+            with self.buffered_output(agate.csv.writer, **writer_kwargs) as output:
+                if self.resumed is None:
+                    output.writerow(column_names)
+                write = self.timed_write(output.writerows)
+                for rows in reader.iter_batches(self.args.batch_size):
+                    write(rows)
+                    self.advance(len(rows), output)
+        finally:
+            reader.close()
+        self.row_count = reader.rows
+
+    def main_raw(self, cache):
+        binary = self.bytes_input()
+        if binary:
+            f = self.open_binary_input()
+            # like the csvkit input files, which remove NUL characters and read universal new lines
+            records = iter_records(split_lines(line.replace(b'\0', b'') for line in f), b'"')
+        else:
+            f = None
+            records = iter_records(self.skip_lines())
+
+        try:
+            first = next(records, None)
+            if first is None:
+                agate.csv.writer(self.output_file).writerow([])
+                return
+            if binary and first.startswith(codecs.BOM_UTF8) and codecs.lookup(self.args.encoding).name == 'utf-8-sig':
+                first = first[len(codecs.BOM_UTF8):]
+            records = itertools.chain([first], records)
+
+            column_names = next(agate.csv.reader(io.StringIO(first.decode('utf-8') if binary else first, newline='')))
+            if self.args.no_header_row:
+                column_names = make_default_headers(len(column_names))
+                agate.csv.writer(self.output_file).writerow(column_names)
+            column_ids = parse_column_identifiers(self.args.columns, column_names, self.get_column_offset())
+            self.column_names = column_names
+
+            modifiers = {idx: self.modifiers for idx in column_ids}
+            with RawModifier(records, modifiers, header=not self.args.no_header_row, binary=binary, cache=cache,
+                             stats=self.stats, address=self.address(column_names), **self.modifier_kwargs()) as reader:
+                with self.buffered_output(binary=binary) as output:
+                    write = self.timed_write(output.write)
+                    for text in reader.iter_text(self.args.batch_size):
+                        write(text)
+                        if self.progress is not None:
+                            position = file_position(self.input_file if f is None else f)
+                            self.progress.update(reader.modifier.rows, position)
+            self.row_count = reader.modifier.rows
+        finally:
+            if f is not None and f is not sys.stdin.buffer:
+                f.close()
+
+    def open_binary_input(self):
+        """
+        Returns the input file opened in binary mode, after the lines to skip.
+        """
+        path = self.args.input_path
+        if self.mapped_input():
+            f = MappedFile(path)
+        else:
+            f = sys.stdin.buffer if not path or path == '-' else open(path, 'rb')
+        for _ in range(self.args.skip_lines):
+            f.readline()
+        return f
+
+    def buffered_output(self, writer=None, binary=False, **kwargs):
+        """
+        Returns a `BufferedOutput` of the output file, serializing rows with `writer` and the remaining keyword
+        arguments. If `binary` is true, it takes UTF-8 encoded bytes, written directly to the underlying binary
+        buffer of the output file when it has one. The output of a terminal is still written batch by batch.
+        """
+        f, encoding = self.output_file, None
+        if binary:
+            buffer = getattr(self.output_file, 'buffer', None)
+            if buffer is None:
+                encoding = 'utf-8'
+            else:
+                self.output_file.flush()
+                f = buffer
+        flush_interval = default_flush_interval(self.output_file, self.args.batch_timeout)
+        return BufferedOutput(f, writer, flush_interval=flush_interval, binary=binary, encoding=encoding, **kwargs)
 
-        output = agate.csv.writer(self.output_file, **writer_kwargs)
-        output.writerow(column_names)
+    def report_cache(self, hits, misses):
+        self.error_file.write('e modifier cache: %i hits, %i misses\n' % (hits, misses))
+
+    def timed_write(self, write):
+        """
+        Returns the function `write`, timed as "write" in the statistics if they are enabled.
+        """
+        stats = self.stats
+        if stats is None:
+            return write
+        def timed(data):
+            start = timeit.default_timer()
+            write(data)
+            stats.add_time('write', timeit.default_timer() - start)
+        return timed
+
+    def report_stats(self):
+        """
+        Writes the statistics to the --stats-file as JSON, or to standard error.
+        """
+        report = self.stats.report()
+        for entry in report['modifiers']:
+            if self.column_names and entry['column'] < len(self.column_names):
+                entry['name'] = self.column_names[entry['column']]
+        if self.args.stats_file:
+            with open(self.args.stats_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            return
+
+        self.error_file.write('rows: %i in %.3f s (%.0f rows/s)\n' % (report['rows'], report['seconds'],
+                                                                    report['rows_per_s']))
+        self.error_file.write('time: %s\n' % ', '.join('%s %.3f s' % item for item in report['times'].items()))
+        for entry in report['modifiers']:
+            column = '%i' % (entry['column'] + self.get_column_offset())
+            if 'name' in entry:
+                column += ' (%s)' % entry['name']
+            self.error_file.write(u'column %s, %s: %i calls, %i changed, %.3f s\n'
+                                  % (column, entry['modifier'], entry['calls'], entry['changed'], entry['seconds']))
+
+    def quotechar(self):
+        if self.reader_kwargs.get('quoting') == csv.QUOTE_NONE:
+            return None
+        return self.reader_kwargs.get('quotechar', '"')
+
+    def raw_input(self):
+        """
+        Returns whether the input can be modified by `main_raw`: the raw pass-through must be requested, and the input
+        must be in the dialect of the output (standard CSV), without line numbers.
+        """
+        if not (self.args.raw or self.args.bytes) or self.args.line_numbers:
+            return False
+        kwargs = self.reader_kwargs
+        return (kwargs.get('delimiter', ',') == ',' and kwargs.get('quotechar', '"') == '"'
+                and kwargs.get('quoting', csv.QUOTE_MINIMAL) in (csv.QUOTE_MINIMAL, csv.QUOTE_ALL)
+                and kwargs.get('doublequote', True) and not kwargs.get('escapechar')
+                and not kwargs.get('skipinitialspace'))
+
+    def bytes_input(self):
+        """
+        Returns whether `main_raw` can work on the bytes of the input: this must be requested, the input must be UTF-8
+        (or ASCII) encoded and uncompressed, and all the modifiers must have a `binary_modifier`.
+        """
+        if not self.args.bytes or not self.raw_input():
+            return False
+        if is_compressed(self.args.input_path):
+            return False
+        try:
+            if codecs.lookup(self.args.encoding).name not in ('utf-8', 'utf-8-sig', 'ascii'):
+                return False
+            binary_modifier(self.modifiers)
+        except (LookupError, InvalidModifier):
+            return False
+        # the column of a regular expression address does not matter here
+        return not self.args.address or parse_address(self.args.address).as_binary() is not None
+
+    def mapped_input(self):
+        """
+        Returns whether the input can be read from a memory map (see `MappedFile`). With --checkpoint, it is read as
+        a `RecordInput`.
+        """
+        return is_mapped(self.args) and not self.args.checkpoint
+
+    def parallel_input(self):
+        """
+        Returns whether the input can be modified by `main_parallel`: there must be several processes, and the input
+        must be a non-empty, uncompressed regular file whose new lines and quotes are plain ASCII bytes, and whose
+        lines do not end with lone carriage returns. Options that need the input to be read sequentially, or the
+        result cache file, are not supported.
+        """
+        path = self.args.input_path
+        if self.args.processes < 2 or not path or path == '-':
+            return False
+        if is_compressed(path) or not os.path.isfile(path) or not os.path.getsize(path):
+            return False
+        if self.args.line_numbers or self.args.skip_lines or self.args.escapechar or self.args.cache_file:
+            return False
+        # row numbers, and stopping early, need the input to be read sequentially
+        if self.args.address or self.args.max_rows is not None:
+            return False
+        separators = u'\n' + (self.quotechar() or u'')
+        try:
+            if separators.encode('ascii').decode(self.args.encoding) != separators:
+                return False
+        except (LookupError, UnicodeError):
+            return False
+        # the ranges are split on new lines only
+        return not has_lone_cr(path)
+
+    def main_parallel(self):
+        # the worker processes parse the modifiers again: an invalid one is reported here, before anything is written
+        modifier_as_function(self.modifiers)
+
+        path = self.args.input_path
+        encoding = self.args.encoding
+        quotechar = self.quotechar()
+
+        first_start, first_end = next(iter_ranges(path, 0, 0, quotechar))
+        first_row = next(agate.csv.reader(read_range(path, first_start, first_end, encoding), **self.reader_kwargs))
+        if self.args.no_header_row:
+            column_names = make_default_headers(len(first_row))
+            start = 0
+        else:
+            column_names = first_row
+            start = first_end
+        column_ids = parse_column_identifiers(self.args.columns, column_names, self.get_column_offset())
+        self.column_names = column_names
+
+        modifiers = {idx: self.modifiers for idx in column_ids}
+        cache_size = self.args.cache_size
+        chunks = ParallelModifier(path, modifiers, self.args.processes, start=start, quotechar=quotechar,
+                                  encoding=encoding, reader_kwargs=self.reader_kwargs, writer_kwargs=self.writer_kwargs,
+                                  cache_size=cache_size, field_size_limit=self.args.field_size_limit,
+                                  raw=self.raw_input(), binary=self.bytes_input(), mmap=self.args.mmap,
+                                  stats=self.stats, **self.modifier_kwargs())
+
+        if chunks.range_modifier.raw and not self.args.no_header_row:
+            header = read_range(path, first_start, first_end, encoding).getvalue()
+            self.output_file.write(header if header.endswith('\n') else header + '\n')
+        else:
+            output = agate.csv.writer(self.output_file, **self.writer_kwargs)
+            output.writerow(column_names)
+        with self.buffered_output(binary=chunks.range_modifier.binary) as output:
+            write = self.timed_write(output.write)
+            for text in chunks:
+                write(text)
+                if self.progress is not None:
+                    self.progress.update(chunks.rows, chunks.position)
+        self.row_count = chunks.rows
+
+        if cache_size is not None:
+            self.report_cache(chunks.hits, chunks.misses)
+
+    def main_files(self, paths):
+        """
+        Modifies each of the input files `paths` with `run_file`, writing their outputs one after the other (without
+        the headers that repeat the first one) or, with --in-place, back to each file, and reports the rows and time
+        of each file.
+        """
+        start = timeit.default_timer()
+        tmpdir = None if self.args.in_place else tempfile.mkdtemp(prefix='csvsed-')
+        header = None
+        summary = []
+        try:
+            for idx, (path, output, (column_names, rows, seconds)) in enumerate(self.iter_files(paths, tmpdir)):
+                if output is not None:
+                    if idx == 0:
+                        header = column_names
+                    self.append_output(output, idx > 0 and (not column_names or column_names == header))
+                    os.remove(output)
+                summary.append((path, rows, seconds))
+        finally:
+            if tmpdir is not None:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        self.report_files(summary, timeit.default_timer() - start)
+
+    def iter_files(self, paths, tmpdir):
+        """
+        Generates the input files `paths`, the file their output was written to (in `tmpdir`, None if they were
+        modified in place) and the result of `run_file`, in order. The files are modified in a pool of --processes
+        worker processes, at most two per process pending at any time, or one after the other in this process with a
+        single process (or a --cache-file, which cannot be shared).
+        """
+        outputs = [None if tmpdir is None else os.path.join(tmpdir, '%i.csv' % idx) for idx in range(len(paths))]
+        processes = min(self.args.processes, len(paths))
+        if processes < 2 or self.args.cache_file:
+            for path, output in zip(paths, outputs):
+                # a single file keeps its --processes
+                yield path, output, run_file(self.argv, path, output, self.args.processes if len(paths) == 1 else 1,
+                                             self.error_file)
+            return
+
+        executor = concurrent.futures.ProcessPoolExecutor(processes, initializer=ignore_sigpipe)
+        inflight = collections.deque()
+        try:
+            for path, output in zip(paths, outputs):
+                inflight.append((path, output, executor.submit(run_file, self.argv, path, output)))
+                if len(inflight) >= 2 * processes:
+                    path, output, future = inflight.popleft()
+                    yield path, output, future.result()
+            while inflight:
+                path, output, future = inflight.popleft()
+                yield path, output, future.result()
+        finally:
+            for path, output, future in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def append_output(self, path, skip_header):
+        """
+        Copies the output file `path` written by `run_file` to the output, without its first record if `skip_header`.
+        """
+        with io.open(path, encoding='utf-8', newline='') as f:
+            if skip_header:
+                # read line by line, so that the rest of the file can be copied as is
+                next(iter_records(iter(f.readline, u'')), None)
+            shutil.copyfileobj(f, self.output_file)
+
+    def report_files(self, summary, seconds):
+        """
+        Writes the number of rows and the time of each input file to standard error, given the (path, rows, seconds)
+        `summary` of each of them, and the total time in `seconds`.
+        """
+        for path, rows, file_seconds in summary:
+            self.error_file.write(u'%s: %i rows in %.3f s\n' % (path, rows, file_seconds))
+        self.error_file.write('%i files: %i rows in %.3f s\n' % (len(summary), sum(rows for _, rows, _ in summary),
+                                                                 seconds))
+
+def ignore_sigpipe():
+    """
+    Initializes the worker processes of `CSVSed.main_files`, which only write to files: writing to a closed pipe, such
+    as the standard input of a command that exits without reading it, then raises an error instead of killing them.
+    """
+    if hasattr(signal, 'SIGPIPE'):
+        signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+
+def run_file(argv, path, output_path=None, processes=1, error_file=None):
+    """
+    Runs ``csvsed`` with the command-line arguments `argv` on the single input file `path`, with `processes`
+    processes, writing its output to `output_path` (in UTF-8) or, if None, to a temporary file in the directory of
+    `path` that replaces it once complete. Returns the column names, the number of rows and the time it took. This is
+    how `CSVSed.main_files` modifies each file, in worker processes.
+    """
+    start = timeit.default_timer()
+    # csvkit lets a closed pipe end the process, which is only meant for the standard output (see `ignore_sigpipe`)
+    sigpipe = signal.getsignal(signal.SIGPIPE) if hasattr(signal, 'SIGPIPE') else None
+    utility = CSVSed(argv, error_file=error_file)
+    if sigpipe is not None:
+        signal.signal(signal.SIGPIPE, sigpipe)
+    args = utility.args
+    args.input_paths = [path]
+    args.input_path = path
+    args.in_place = False
+    args.output_path = None
+    args.processes = processes
+
+    if output_path is not None:
+        # the byte order mark is only written once, by `main_files`
+        args.add_bom = False
+        with io.open(output_path, 'w', encoding='utf-8', newline='') as f:
+            utility.output_file = f
+            utility.run()
+    else:
+        path = os.path.realpath(path)
+        fmt = compress.input_compression(path)
+        encoding = args.encoding
+        if codecs.lookup(encoding).name == 'utf-8-sig':
+            # keep the byte order mark, if any
+            with open(path, 'rb') if fmt is None else compress.open_compressed(path, fmt) as f:
+                if f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+                    args.add_bom = True
+            encoding = 'utf-8'
+        fd, tmp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            if fmt is None:
+                f = io.open(fd, 'w', encoding=encoding, newline='')
+            else:
+                # compressed like the input
+                os.close(fd)
+                f = compress.open_output(tmp, fmt, encoding)
+            with f:
+                utility.output_file = f
+                utility.run()
+            shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
 
-        for row in reader:
-            output.writerow(row)
+    return utility.column_names, utility.row_count, timeit.default_timer() - start
 
 def launch_new_instance():
     utility = CSVSed()
-    utility.main()
+    utility.run()
 
 if __name__ == '__main__':
     launch_new_instance()
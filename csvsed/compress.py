@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming compressed input and output: gzip, bz2, xz and, if the
+`zstandard` module is available, zstd. The compression format of an
+input is found by file extension or by magic bytes, and that of an
+output by file extension. Decompression and compression run in a
+background thread (see `ThreadedReader` and `ThreadedWriter`), so that
+they overlap with the modification of the rows: the compression modules
+release the GIL while they work.
+"""
+
+import io
+import os
+import re
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+BLOCK_SIZE = 1024 * 1024
+
+# the number of blocks read ahead of, or waiting to be written behind, the main thread
+QUEUE_SIZE = 4
+
+EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+
+MAGIC = (
+    (re.compile(b'\x1f\x8b'), 'gzip'),
+    # the block header of the first block, or the end of stream marker of an empty stream
+    (re.compile(b'BZh[1-9](?:1AY&SY|\x17rE8P\x90)'), 'bz2'),
+    (re.compile(b'\xfd7zXZ\x00'), 'xz'),
+    (re.compile(re.escape(b'\x28\xb5\x2f\xfd')), 'zstd'),
+)
+
+MAGIC_SIZE = 10
+
+# the formats whose magic bytes are printable, and could as well start a plain text file
+TEXT_MAGIC = ('bz2',)
+
+# the extensions of plain text files, which are only sniffed for the other formats
+TEXT_EXTENSIONS = ('.csv', '.tsv', '.txt')
+
+class CompressionError(Exception):
+    """
+    Raised when a compression format is not supported.
+    """
+
+def sniff(head, text=False):
+    """
+    Returns the compression format whose magic bytes start the bytes `head`, or None. If `text` is true, `head` is
+    known to start a plain text file, and the formats of `TEXT_MAGIC` are not looked for.
+    """
+    for magic, fmt in MAGIC:
+        if text and fmt in TEXT_MAGIC:
+            continue
+        if magic.match(head):
+            return fmt
+    return None
+
+def input_compression(path):
+    """
+    Returns the compression format of the input file `path`, or None if it is not compressed: that of its extension,
+    or else that of its first bytes (see `sniff`, with `text` true for the `TEXT_EXTENSIONS`). For the standard input
+    (`path` None or "-"), only the bytes already available are looked at, without consuming them.
+    """
+    if not path or path == '-':
+        peek = getattr(getattr(sys.stdin, 'buffer', None), 'peek', None)
+        if peek is None or sys.stdin.isatty():
+            return None
+        return sniff(peek(MAGIC_SIZE))
+    extension = os.path.splitext(path)[1]
+    fmt = EXTENSIONS.get(extension)
+    if fmt is not None:
+        return fmt
+    try:
+        with open(path, 'rb') as f:
+            return sniff(f.read(MAGIC_SIZE), text=extension.lower() in TEXT_EXTENSIONS)
+    except (IOError, OSError):
+        # let opening it report the error
+        return None
+
+def output_compression(path):
+    """
+    Returns the compression format of the extension of the output file `path`, or None.
+    """
+    return EXTENSIONS.get(os.path.splitext(path or '')[1])
+
+def open_compressed(f, fmt, mode='rb'):
+    """
+    Returns a binary file decompressing (`mode` "rb") or compressing (`mode` "wb") in the format `fmt` the file `f`:
+    a path, or a binary file object, which is then left open. Raises `CompressionError` for zstd when `zstandard` is
+    not installed.
+    """
+    if fmt == 'gzip':
+        import gzip
+        return gzip.open(f, mode)
+    if fmt == 'bz2':
+        import bz2
+        return bz2.open(f, mode)
+    if fmt == 'xz':
+        import lzma
+        return lzma.open(f, mode)
+    if fmt != 'zstd':
+        raise CompressionError('unknown compression format: %s' % fmt)
+    try:
+        import zstandard
+    except ImportError:
+        raise CompressionError('zstd compression needs the zstandard module')
+    if isinstance(f, six.string_types):
+        return zstandard.open(f, mode)
+    if mode == 'rb':
+        return zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=False)
+    return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Reads the binary file `f` (typically decompressing its input) in a
+    background thread, `block_size` bytes at a time and at most
+    `queue_size` blocks ahead. Errors of the thread are raised by the
+    next read. Closing it stops the thread and closes `f`.
+    """
+    def __init__(self, f, block_size=BLOCK_SIZE, queue_size=QUEUE_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.blocks = queue.Queue(queue_size)
+        self.block = memoryview(b'')
+        self.eof = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self.fill)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def fill(self):
+        try:
+            while not self.stopped:
+                block = self.f.read(self.block_size)
+                self.blocks.put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self.blocks.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.block:
+            if self.eof:
+                return 0
+            block = self.blocks.get()
+            if isinstance(block, Exception):
+                self.eof = True
+                raise block
+            if not block:
+                self.eof = True
+                return 0
+            self.block = memoryview(block)
+        size = min(len(b), len(self.block))
+        b[:size] = self.block[:size]
+        self.block = self.block[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopped = True
+            # unblock the thread, which may be waiting for room in the queue
+            while self.thread.is_alive():
+                try:
+                    self.blocks.get_nowait()
+                except queue.Empty:
+                    self.thread.join(0.01)
+            self.f.close()
+        super(ThreadedReader, self).close()
+
+class ThreadedWriter(io.RawIOBase):
+    """
+    Writes to the binary file `f` (typically compressing its output) in
+    a background thread, with at most `queue_size` writes pending. An
+    error of the thread is raised by the next write, or by `close()`,
+    which waits for the pending writes and closes `f`.
+    """
+    def __init__(self, f, queue_size=QUEUE_SIZE):
+        self.f = f
+        self.writes = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self.drain)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def drain(self):
+        while True:
+            data = self.writes.get()
+            if data is None:
+                return
+            if self.error is None:
+                try:
+                    self.f.write(data)
+                except Exception as e:
+                    # keep emptying the queue, so that the writing thread is not blocked
+                    self.error = e
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.error is not None:
+            raise self.error
+        data = bytes(b)
+        self.writes.put(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.writes.put(None)
+        self.thread.join()
+        try:
+            self.f.close()
+        finally:
+            super(ThreadedWriter, self).close()
+        if self.error is not None:
+            raise self.error
+
+def open_input(f, fmt, encoding, block_size=BLOCK_SIZE):
+    """
+    Returns the text of the file `f` (a path, or a binary file object left open) compressed in the format `fmt`,
+    decompressed in a background thread and decoded from `encoding` with universal new lines.
+    """
+    raw = ThreadedReader(open_compressed(f, fmt, 'rb'), block_size)
+    return io.TextIOWrapper(io.BufferedReader(raw, block_size), encoding=encoding)
+
+def open_output(f, fmt, encoding='utf-8', block_size=BLOCK_SIZE):
+    """
+    Returns a text file writing to the file `f` (a path, or a binary file object left open), encoded in `encoding` and
+    compressed in the format `fmt` in a background thread. Closing it waits for the compression to complete.
+    """
+    raw = ThreadedWriter(open_compressed(f, fmt, 'wb'))
+    return io.TextIOWrapper(io.BufferedWriter(raw, block_size), encoding=encoding)
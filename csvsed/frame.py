@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Modification of tables already in memory, without a round trip through
+CSV: pandas DataFrames, whose columns are modified with the vectorized
+string methods of pandas, and lists of dicts. Both take the modifiers
+accepted by `CSVModifier`, keyed by column name or index. pandas is not
+a dependency of csvsed: it is only imported to modify a DataFrame.
+"""
+
+import collections
+
+import six
+
+from csvsed.sed import ChainModifier, EModifier, SModifier, YModifier, standardize_modifiers
+
+def call_many(mod, values):
+    """
+    Returns the results of the modifier `mod` for the list `values`, through its `call_many()` if it has one.
+    """
+    call_many = getattr(mod, 'call_many', None)
+    if call_many is None:
+        return [mod(value) for value in values]
+    return call_many(values)
+
+def modify_values(mod, values):
+    """
+    Returns the list `values` modified by the modifier `mod`. The commands of "e" modifiers are only run once per
+    distinct value.
+    """
+    if isinstance(mod, ChainModifier):
+        for step in mod.modifiers:
+            values = modify_values(step, values)
+        return values
+    if isinstance(mod, EModifier):
+        distinct = list(collections.OrderedDict.fromkeys(values))
+        results = dict(zip(distinct, call_many(mod, distinct)))
+        return [results[value] for value in values]
+    return call_many(mod, values)
+
+def modify_series(mod, series):
+    """
+    Returns the pandas Series of strings `series` modified by the modifier `mod`, leaving the missing values as they
+    are: "s" modifiers run as `Series.str.replace`, "y" modifiers as `Series.str.translate`, the commands of "e"
+    modifiers once per distinct value, and other modifiers once per value.
+    """
+    if isinstance(mod, ChainModifier):
+        for step in mod.modifiers:
+            series = modify_series(step, series)
+        return series
+    if isinstance(mod, SModifier):
+        count = mod.count or -1
+        if mod.literal is not None and not (mod.literal[0] or mod.literal[2]):
+            return series.str.replace(mod.literal[1], mod.repl, n=count, regex=False)
+        # a compiled regex keeps the Python syntax of the pattern and the replacement
+        return series.str.replace(mod.regex, mod.repl, n=count, regex=True)
+    if isinstance(mod, YModifier):
+        return series.str.translate(mod.table)
+    if isinstance(mod, EModifier):
+        distinct = series.dropna().unique().tolist()
+        return series.map(dict(zip(distinct, call_many(mod, distinct))))
+    return series.map(mod, na_action='ignore')
+
+def column_index(column_names, col):
+    """
+    Returns the index in `column_names` of the column `col` (an index or a name, see `standardize_modifiers`).
+    """
+    if isinstance(col, six.integer_types) and 0 <= col < len(column_names):
+        return col
+    from csvkit.exceptions import ColumnIdentifierError
+    raise ColumnIdentifierError('Column %r is invalid. The columns are %s.' % (col, column_names))
+
+def close_modifiers(modifiers):
+    for mod in modifiers.values():
+        if hasattr(mod, 'close'):
+            mod.close()
+
+def modify_frame(frame, modifiers, inplace=False):
+    """
+    Returns the pandas DataFrame `frame` with its columns modified by `modifiers`, given as for `CSVModifier`: a
+    list of modifiers by column index, or a dict of modifiers keyed by column name or index. The frame is modified
+    in place if `inplace` is true, and a modified copy is returned otherwise.
+
+    The modified columns are converted to strings if they are not, as they would be in CSV, but missing values are
+    kept. Each modifier runs on a whole column at a time (see `modify_series`).
+    """
+    from pandas.api.types import is_string_dtype
+    column_names = list(frame.columns)
+    modifiers = standardize_modifiers(column_names, modifiers)
+    if not inplace:
+        frame = frame.copy()
+    try:
+        for col, mod in modifiers.items():
+            idx = column_index(column_names, col)
+            series = frame.iloc[:, idx]
+            if not is_string_dtype(series):
+                series = series.map(six.text_type, na_action='ignore')
+            frame.isetitem(idx, modify_series(mod, series))
+    finally:
+        close_modifiers(modifiers)
+    return frame
+
+def modify_records(records, modifiers):
+    """
+    Returns a copy of the list of dicts `records` with their values modified by `modifiers`, given as for
+    `CSVModifier`: column indices refer to the keys of the first record, in order. The records lacking a column, or
+    holding None in it, are left as they are. The other values are converted to strings if they are not, as they would
+    be in CSV. Each modifier runs on all the values of its column at once (see `modify_values`).
+    """
+    records = [record.copy() for record in records]
+    if not records:
+        return records
+    column_names = list(records[0])
+    modifiers = standardize_modifiers(column_names, modifiers)
+    try:
+        for col, mod in modifiers.items():
+            # names missing from the first record may still be in the others
+            name = column_names[column_index(column_names, col)] if isinstance(col, six.integer_types) else col
+            selected = [record for record in records if record.get(name) is not None]
+            values = [record[name] if isinstance(record[name], six.text_type) else six.text_type(record[name])
+                      for record in selected]
+            for record, value in zip(selected, modify_values(mod, values)):
+                record[name] = value
+    finally:
+        close_modifiers(modifiers)
+    return records
@@ -0,0 +1,560 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The ``csvsed`` command. Importing csvkit pulls in agate and most of its
+dependencies, which takes longer than modifying a small file, so the
+common cases (``-n`` and modifying standard CSV rows, with a few of
+the csvkit options) are run here with the `csv` module alone.
+Everything else, ``--help`` included, is left to `csvsed.cli.CSVSed`,
+which is only imported then.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import os
+import signal
+import string
+import sys
+
+import six
+
+from csvsed import compress
+from csvsed.output import BufferedOutput, default_flush_interval
+from csvsed.progress import DEFAULT_CHECKPOINT_INTERVAL, DEFAULT_PROGRESS_INTERVAL
+from csvsed.sed import CSVModifier, DEFAULT_BATCH_SIZE, DEFAULT_CACHE_SIZE, InvalidAddress, parse_address
+
+DESCRIPTION = 'A stream-oriented CSV modification tool. Like a  stripped-down "sed" command, but for tabular data.'
+
+QUOTING_CHOICES = sorted(getattr(csv, name) for name in dir(csv) if name.startswith('QUOTE_'))
+
+class NotSimple(Exception):
+    """
+    Raised by `SimpleParser` for the command lines left to `csvsed.cli.CSVSed`.
+    """
+
+class SimpleParser(argparse.ArgumentParser):
+    """
+    The parser of the command lines run without csvkit. It only knows a few of the options csvkit gives every
+    command, so its errors, unknown or abbreviated options and invalid arguments included, raise `NotSimple` while
+    `parse_simple_args` runs instead of exiting: the command line is then parsed, and reported on, by
+    `csvsed.cli.CSVSed`.
+    """
+    parsing = False
+
+    def parse_simple_args(self, argv):
+        """
+        Returns the parsed arguments `argv` and their modifiers (see `check_arguments`, None with ``-n``) if they can
+        be run by `run_simple` (see `is_simple`), or None if they are left to `csvsed.cli.CSVSed`.
+        """
+        self.parsing = True
+        try:
+            args = self.parse_args(argv)
+            args.input_path = first_input(args)
+            if not is_simple(args):
+                return None
+            return args, None if args.names_only else check_arguments(self, args)
+        # like the errors of reading the --modifier-file
+        except (NotSimple, EnvironmentError, ValueError):
+            return None
+        finally:
+            self.parsing = False
+
+    def error(self, message):
+        if self.parsing:
+            raise NotSimple(message)
+        super(SimpleParser, self).error(message)
+
+def add_common_arguments(parser):
+    """
+    Adds the arguments of `csvkit.cli.CSVKitUtility` that the command handles without csvkit to `parser`, as csvkit
+    defines them. The others, ``--help`` included, are left to `csvsed.cli.CSVSed`; the input file is left out, as
+    ``csvsed`` takes several (see `add_csvsed_arguments`).
+    """
+    parser.add_argument(
+        '-d', '--delimiter', dest='delimiter',
+        help='Delimiting character of the input CSV file.')
+    parser.add_argument(
+        '-t', '--tabs', dest='tabs', action='store_true',
+        help='Specify that the input CSV file is delimited with tabs. Overrides "-d".')
+    parser.add_argument(
+        '-q', '--quotechar', dest='quotechar',
+        help='Character used to quote strings in the input CSV file.')
+    parser.add_argument(
+        '-u', '--quoting', dest='quoting', type=int, choices=QUOTING_CHOICES,
+        help='Quoting style used in the input CSV file: 0 quote minimal, 1 quote all, '
+             '2 quote non-numeric, 3 quote none.')
+    parser.add_argument(
+        '-b', '--no-doublequote', dest='doublequote', action='store_false',
+        help='Whether or not double quotes are doubled in the input CSV file.')
+    parser.add_argument(
+        '-p', '--escapechar', dest='escapechar',
+        help='Character used to escape the delimiter if --quoting 3 ("quote none") is specified and to escape '
+             'the QUOTECHAR if --no-doublequote is specified.')
+    parser.add_argument(
+        '-e', '--encoding', dest='encoding', default=os.getenv('PYTHONIOENCODING', 'utf-8-sig'),
+        help='Specify the encoding of the input CSV file.')
+    parser.add_argument(
+        '-S', '--skipinitialspace', dest='skipinitialspace', action='store_true',
+        help='Ignore whitespace immediately following the delimiter.')
+    parser.add_argument(
+        '-H', '--no-header-row', dest='no_header_row', action='store_true',
+        help='Specify that the input CSV file has no header row. Will create default headers (a,b,c,...).')
+    parser.add_argument(
+        '-K', '--skip-lines', dest='skip_lines', type=int, default=0,
+        help='Specify the number of initial lines to skip before the header row (e.g. comments, copyright '
+             'notices, empty rows).')
+    parser.add_argument(
+        '-v', '--verbose', dest='verbose', action='store_true',
+        help='Print detailed tracebacks when errors occur.')
+    parser.add_argument(
+        '--zero', dest='zero_based', action='store_true',
+        help='When interpreting or displaying column numbers, use zero-based numbering instead of the default '
+             '1-based numbering.')
+
+def add_csvsed_arguments(parser):
+    """
+    Adds the arguments specific to ``csvsed`` to `parser`.
+    """
+    parser.add_argument(metavar='FILE', nargs='*', dest='input_paths',
+                        help='The CSV files to operate on. If omitted, will accept input as piped data via '
+                          'STDIN. The outputs of several files are written one after the other, with the '
+                          'header of the first file only (the headers that differ from it are kept), and '
+                          'the rows and time of each file are reported on standard error at the end.')
+    parser.add_argument('-n', '--names', dest='names_only', action='store_true',
+                        help='Display column names and indices from the input CSV and exit.')
+    parser.add_argument('-c', '--columns', dest='columns',
+                        help='A comma separated list of column indices or names to be modified.')
+    parser.add_argument('-m', '--modifier', dest='modifier', action='append',
+                        help='If specified, the "sed" modifier to evaluate: currently supports substitution '
+                          '(s/REGEX/REPL/FLAGS), transliteration (y/SRC/DEST/FLAGS) and execution '
+                          '(e/REGEX/COMMAND/FLAGS). Can be specified several times, in which case the '
+                          'modifiers are applied in order, in a single pass.')
+    parser.add_argument('-f', '--modifier-file', dest='modifier_file',
+                        help='Read modifiers from this file, one per line, and apply them in order after '
+                          'the ones given with -m. Empty lines and lines starting with "#" are ignored.')
+    parser.add_argument('-a', '--address', dest='address',
+                        help='Only modify the rows selected by this sed-like address, and copy the other '
+                          'rows as they are: a row number N (the first row after the header being 1), a '
+                          'range FIRST,LAST (LAST can be "$"), FIRST~STEP for every STEP-th row from row '
+                          'FIRST, or COLUMN/REGEX/ for the rows whose COLUMN cell (a name or index) matches '
+                          'REGEX, case-insensitively with a trailing "I".')
+    parser.add_argument('--quit', dest='quit', action='store_true',
+                        help='Stop reading the input after the last row selected by the --address, like the '
+                          '"q" command of sed. The address must be N or FIRST,LAST.')
+    parser.add_argument('--max-rows', dest='max_rows', type=int,
+                        help='Stop reading the input after this many rows (not counting the header).')
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='The number of rows handed over at once to "e" modifiers with the "b" flag. '
+                          'Defaults to %(default)s.')
+    parser.add_argument('--batch-timeout', dest='batch_timeout', type=float,
+                        help='Hand a partial batch over to "e" modifiers with the "b" flag once its first '
+                          'row has waited for this many seconds.')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='The number of rows (or batches of rows) modified concurrently, mostly useful '
+                          'to run several "e" modifier commands at once. Output order is preserved.')
+    parser.add_argument('--cache-size', dest='cache_size', type=int,
+                        help='Cache the results of "e" modifiers, keeping at most this many results in '
+                          'memory (%s when only --cache-file is given). Hit and miss counts are reported '
+                          'on standard error at the end of the run.' % DEFAULT_CACHE_SIZE)
+    parser.add_argument('--cache-file', dest='cache_file',
+                        help='Also store the results of "e" modifiers in this file, to reuse them across '
+                          'runs.')
+    parser.add_argument('--memoize', dest='memoize', action='store_true',
+                        help='Remember the results of "s" and "y" modifiers for each column, which speeds up '
+                          'columns with few distinct values. Columns with a low hit rate stop doing so.')
+    parser.add_argument('-o', '--output', dest='output_path',
+                        help='Write the output to this file instead of standard output, compressed if its '
+                          'extension is .gz, .bz2, .xz or .zst (with the zstandard module).')
+    parser.add_argument('-i', '--in-place', dest='in_place', action='store_true',
+                        help='Write the output of each input file back to it instead of standard output, '
+                          'through a temporary file in the same directory that replaces it once complete. '
+                          'The file is written in its input encoding, and compressed like the input.')
+    parser.add_argument('-P', '--processes', dest='processes', type=int, default=1,
+                        help='Split the input file into chunks and modify them in this many processes. '
+                          'Only used for uncompressed input files, the standard input is always read '
+                          'sequentially. With several input files, modify this many files at a time '
+                          'instead, each in a single process.')
+    parser.add_argument('--raw', dest='raw', action='store_true',
+                        help='Copy the cells that are not modified (and the header) to the output as they '
+                          'are, instead of parsing and quoting them again, which is much faster on wide '
+                          'files. Only used when the input is standard CSV and without --linenumbers.')
+    parser.add_argument('--bytes', dest='bytes', action='store_true',
+                        help='Like --raw, but work on the UTF-8 bytes of the input without decoding them. '
+                          'Only used for UTF-8 (or ASCII) input that is not compressed, and when all the '
+                          'modifiers give the same results on bytes: "y" modifiers of ASCII characters, '
+                          'and "s" and "e" modifiers without case-insensitive matching, "\\w"-like '
+                          'classes or "." outside of ".*" and ".+".')
+    parser.add_argument('--stats', dest='stats', action='store_true',
+                        help='Report statistics on standard error at the end of the run: the rows read, '
+                          'the time spent reading, writing and running the commands of "e" modifiers, '
+                          'and the calls, changed cells and time of each modifier of each column.')
+    parser.add_argument('--stats-file', dest='stats_file',
+                        help='Write the statistics of --stats to this file, as JSON, instead of standard '
+                          'error.')
+    parser.add_argument('--no-mmap', dest='mmap', action='store_false',
+                        help='Read input files through a stream instead of memory-mapping them. Input files '
+                          'that are not regular files, compressed input and the standard input are always '
+                          'read through a stream.')
+    parser.add_argument('--progress', dest='progress', action='store_true',
+                        help='Report the progress on standard error every --progress-interval seconds: the '
+                          'rows modified and their rate and, for an input file, the bytes read and the '
+                          'estimated time left.')
+    parser.add_argument('--progress-file', dest='progress_file',
+                        help='Write the progress of --progress to this file instead, as JSON, replacing it '
+                          'each time.')
+    parser.add_argument('--progress-interval', dest='progress_interval', type=float,
+                        default=DEFAULT_PROGRESS_INTERVAL,
+                        help='The number of seconds between progress reports. Defaults to %(default)s.')
+    parser.add_argument('--checkpoint', dest='checkpoint', metavar='FILE',
+                        help='Record in this file, every --checkpoint-interval seconds, how far the run is '
+                          'complete: the input offset, the row count and the output size of the last '
+                          'rows written, so that --resume can continue from there if the run is '
+                          'interrupted. The file is removed once the run completes. Needs a single '
+                          'uncompressed input file, and an uncompressed --output file.')
+    parser.add_argument('--checkpoint-interval', dest='checkpoint_interval', type=float,
+                        default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help='The number of seconds between checkpoints. Defaults to %(default)s.')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='Resume the run recorded in the --checkpoint file, if there is one: truncate the '
+                          '--output file to its size at the checkpoint, and continue from the input '
+                          'offset of the checkpoint.')
+
+def make_parser():
+    """
+    Returns the `SimpleParser` of the ``csvsed`` command: the arguments of `csvsed.cli.CSVSed`, but for the csvkit
+    options left to it (see `add_common_arguments`).
+    """
+    parser = SimpleParser(prog='csvsed', description=DESCRIPTION, epilog='', add_help=False, allow_abbrev=False)
+    add_common_arguments(parser)
+    add_csvsed_arguments(parser)
+    return parser
+
+def read_modifier_file(path):
+    """
+    Returns the modifiers listed in the file `path`, one per line, skipping empty lines and "#" comments.
+    """
+    with open(path, 'rb') as f:
+        lines = f.read().decode('utf-8').splitlines()
+    return [line for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+def check_arguments(parser, args):
+    """
+    Checks the modification arguments, exiting with an error from `parser` if they are invalid, and returns the list
+    of modifiers to apply.
+    """
+    if not args.columns:
+        parser.error('You must specify at least one column to search using the -c option.')
+
+    modifiers = args.modifier or []
+    if args.modifier_file:
+        modifiers = modifiers + read_modifier_file(args.modifier_file)
+
+    if not modifiers:
+        parser.error('-m or -f must be specified, unless using the -n option.')
+
+    if args.batch_size < 1:
+        parser.error('--batch-size must be a positive integer.')
+
+    if args.jobs < 1:
+        parser.error('--jobs must be a positive integer.')
+
+    if args.cache_size is not None and args.cache_size < 1:
+        parser.error('--cache-size must be a positive integer.')
+
+    if args.processes < 1:
+        parser.error('--processes must be a positive integer.')
+
+    if args.max_rows is not None and args.max_rows < 0:
+        parser.error('--max-rows must be a non-negative integer.')
+
+    paths = args.input_paths
+    if args.in_place:
+        if not paths or '-' in paths:
+            parser.error('--in-place needs input files, not the standard input.')
+        if args.output_path:
+            parser.error('--in-place and --output cannot be used together.')
+    elif len(paths) > 1 and '-' in paths:
+        parser.error('The standard input cannot be one of several input files.')
+
+    if args.progress_interval <= 0 or args.checkpoint_interval <= 0:
+        parser.error('--progress-interval and --checkpoint-interval must be positive numbers.')
+
+    if (args.progress or args.progress_file) and (len(paths) > 1 or args.in_place):
+        parser.error('--progress needs a single input.')
+
+    if args.resume and not args.checkpoint:
+        parser.error('--resume needs a --checkpoint file.')
+
+    if args.checkpoint:
+        check_checkpoint(parser, args)
+
+    if args.address:
+        try:
+            address = parse_address(args.address)
+        except InvalidAddress as e:
+            parser.error(str(e))
+        if args.quit and address.last is None:
+            parser.error('--quit needs an --address of the form N or FIRST,LAST.')
+    elif args.quit:
+        parser.error('--quit needs an --address.')
+
+    # decode if necessary, to work exclusively with unicode modifiers
+    return [modifier.decode('utf-8') if isinstance(modifier, bytes) else modifier for modifier in modifiers]
+
+def check_checkpoint(parser, args):
+    """
+    Checks that the command can record checkpoints, exiting with an error from `parser` if it cannot.
+    """
+    paths = args.input_paths
+    if len(paths) != 1 or paths[0] == '-' or args.in_place or not os.path.isfile(paths[0]) or is_compressed(paths[0]):
+        parser.error('--checkpoint needs a single uncompressed input file.')
+    if not args.output_path or compress.output_compression(args.output_path) is not None:
+        parser.error('--checkpoint needs an uncompressed --output file.')
+    # rows are numbered from the start of each run
+    if args.address or args.quit or args.max_rows is not None or args.line_numbers:
+        parser.error('--checkpoint cannot be used with --address, --quit, --max-rows or --linenumbers.')
+    if args.raw or args.bytes or args.processes > 1 or args.escapechar:
+        parser.error('--checkpoint cannot be used with --raw, --bytes, --processes or --escapechar.')
+    # records are split on the new line and quote bytes
+    separators = u'\n' + (args.quotechar or u'"')
+    try:
+        ascii_compatible = separators.encode('ascii').decode(args.encoding) == separators
+    except (LookupError, UnicodeError):
+        ascii_compatible = False
+    if not ascii_compatible:
+        parser.error('--checkpoint needs an ASCII --quotechar and an ASCII-compatible --encoding.')
+
+def modifier_kwargs(args):
+    """
+    Returns the keyword arguments of `CSVModifier` set by the command-line arguments, except the cache.
+    """
+    return dict(batch_size=args.batch_size, batch_timeout=args.batch_timeout, jobs=args.jobs, memoize=args.memoize,
+                quit=args.quit, max_rows=args.max_rows)
+
+def first_input(args):
+    """
+    Returns the first input file of the command-line arguments, None for the standard input. It is the `input_path`
+    of csvkit, the only input file unless there are several of them or --in-place is set.
+    """
+    return args.input_paths[0] if args.input_paths else None
+
+def is_compressed(path):
+    """
+    Returns whether the input file `path` (the standard input if None or "-") is compressed, by extension or magic
+    bytes (see `csvsed.compress.input_compression`).
+    """
+    return compress.input_compression(path) is not None
+
+def open_output(path):
+    """
+    Opens the --output file `path`, compressed as its extension says.
+    """
+    fmt = compress.output_compression(path)
+    if fmt is None:
+        return io.open(path, 'w', encoding='utf-8')
+    return compress.open_output(path, fmt)
+
+def is_mapped(args):
+    """
+    Returns whether the input can be read from a memory map (see `MappedFile`): it must be a non-empty, uncompressed
+    regular file.
+    """
+    path = args.input_path
+    if not args.mmap or not path or path == '-' or is_compressed(path):
+        return False
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+def is_simple(args):
+    """
+    Returns whether the command can be run by `run_simple`: listing the column names, or modifying the rows of
+    standard input or of a single file, with the options `CSVModifier` handles by itself. The other options need
+    csvkit or agate.
+    """
+    if six.PY2 or os.name == 'nt':
+        return False
+    if args.names_only:
+        return not args.no_header_row
+    return not (len(args.input_paths) > 1 or args.in_place or args.raw or args.bytes or args.processes > 1
+                or args.cache_size is not None or args.cache_file or args.stats or args.stats_file
+                or args.progress or args.progress_file or args.checkpoint)
+
+def reader_kwargs(args):
+    """
+    Returns the keyword arguments of `csv.reader` set by the command-line arguments, like csvkit.
+    """
+    kwargs = {}
+    if args.tabs:
+        kwargs['delimiter'] = '\t'
+    elif args.delimiter:
+        kwargs['delimiter'] = args.delimiter
+    for arg in ('quotechar', 'quoting', 'doublequote', 'escapechar', 'skipinitialspace'):
+        value = getattr(args, arg)
+        if value is not None:
+            kwargs[arg] = value
+    return kwargs
+
+def open_input(args):
+    """
+    Returns the input file, after the lines to skip, like csvkit opens it: decoded with universal new lines, and
+    with NUL characters removed. Compressed input is decompressed in a background thread.
+    """
+    path = args.input_path
+    stdin = not path or path == '-'
+    fmt = compress.input_compression(path)
+    if fmt is not None:
+        f = NulFilter(compress.open_input(sys.stdin.buffer if stdin else path, fmt, args.encoding))
+    elif stdin:
+        sys.stdin.reconfigure(encoding=args.encoding)
+        f = sys.stdin
+    elif is_mapped(args):
+        from csvsed.mapped import MappedFile
+        f = MappedFile(path, args.encoding)
+    else:
+        f = NulFilter(open(path, 'r', encoding=args.encoding))
+    for _ in range(args.skip_lines):
+        f.readline()
+    return f
+
+class NulFilter(six.Iterator):
+    """
+    Iterates over the lines of the text file `f` with their NUL characters removed, like csvkit's input files.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.f).replace('\0', '')
+
+    def readline(self):
+        return self.f.readline()
+
+    def close(self):
+        self.f.close()
+
+def letter_name(index):
+    # the default column names of agate: a to z, then aa to zz, etc.
+    return string.ascii_lowercase[index % 26] * (index // 26 + 1)
+
+def column_ids(ids, column_names, column_offset):
+    """
+    Returns the indices of the comma-separated column names and indices `ids`, like
+    `csvkit.cli.parse_column_identifiers`, which is only imported for ranges and errors.
+    """
+    indices = []
+    for c in ids.split(','):
+        if not c.isdigit() and c in column_names:
+            indices.append(column_names.index(c))
+        elif c.isdigit() and column_offset <= int(c) < len(column_names) + column_offset:
+            indices.append(int(c) - column_offset)
+        else:
+            from csvkit.cli import parse_column_identifiers
+            return parse_column_identifiers(ids, column_names, column_offset)
+    return indices
+
+def output_rows(rows):
+    """
+    Generates the `rows` with their carriage returns turned into new lines, so that they are quoted, like agate
+    writes them.
+    """
+    for row in rows:
+        if any('\r' in value for value in row if isinstance(value, str)):
+            row = [value.replace('\r', '\n') if isinstance(value, str) else value for value in row]
+        yield row
+
+def install_exception_handler(args):
+    """
+    Installs the uncaught exception handler of csvkit, which only prints the error unless ``--verbose`` is set.
+    """
+    def handler(t, value, traceback):
+        if args.verbose:
+            sys.__excepthook__(t, value, traceback)
+        elif t == UnicodeDecodeError:
+            sys.stderr.write('Your file is not "%s" encoded. Please specify the correct encoding with the --encoding '
+                             'flag. Use the -v flag to see the complete error.\n' % args.encoding)
+        else:
+            sys.stderr.write('%s: %s\n' % (t.__name__, value))
+    sys.excepthook = handler
+
+def run_simple(parser, args, modifiers, output_file):
+    """
+    Runs the command with the arguments and modifiers returned by `SimpleParser.parse_simple_args`, writing to
+    `output_file`.
+    """
+    f = open_input(args)
+    try:
+        column_offset = 0 if args.zero_based else 1
+        rows = csv.reader(f, **reader_kwargs(args))
+        if args.names_only:
+            for idx, name in enumerate(next(rows), column_offset):
+                output_file.write('%3i: %s\n' % (idx, name))
+            return
+
+        first = next(rows, None)
+        if first is None:
+            column_names, ids = [], []
+        elif args.no_header_row:
+            rows = itertools.chain([first], rows)
+            column_names = [letter_name(idx) for idx in range(len(first))]
+            ids = column_ids(args.columns, column_names, column_offset)
+        else:
+            column_names = first
+            ids = column_ids(args.columns, column_names, column_offset)
+
+        address = None
+        if args.address:
+            try:
+                address = parse_address(args.address, column_names, column_offset)
+            except InvalidAddress as e:
+                parser.error(str(e))
+
+        reader = CSVModifier(rows, dict((idx, modifiers) for idx in ids), header=False, address=address,
+                             **modifier_kwargs(args))
+        try:
+            with BufferedOutput(output_file, csv.writer,
+                                flush_interval=default_flush_interval(output_file, args.batch_timeout),
+                                lineterminator='\n') as writer:
+                writer.writerows(output_rows([column_names]))
+                for batch in reader.iter_batches(args.batch_size):
+                    writer.writerows(output_rows(batch))
+        finally:
+            reader.close()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def launch_new_instance(argv=None, output_file=None):
+    """
+    Runs the ``csvsed`` command with the arguments `argv` (those of the process by default), writing to
+    `output_file` (the standard output by default).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = make_parser()
+    parsed = parser.parse_simple_args(argv)
+    if parsed is None:
+        from csvsed.cli import CSVSed
+        CSVSed(argv, output_file=output_file).run()
+        return
+    args, modifiers = parsed
+
+    install_exception_handler(args)
+    # like csvkit, let a closed pipe end the process quietly
+    if hasattr(signal, 'SIGPIPE'):
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    if not args.output_path:
+        run_simple(parser, args, modifiers, output_file or sys.stdout)
+        return
+    output_file = open_output(args.output_path)
+    try:
+        run_simple(parser, args, modifiers, output_file)
+    finally:
+        output_file.close()
+
+if __name__ == '__main__':
+    launch_new_instance()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory-mapped input files: the lines of a regular file are decoded
+straight from the mapped file, one block of lines at a time, instead of
+being read through a buffered stream.
+"""
+
+import codecs
+import io
+import itertools
+import mmap
+import os
+
+import six
+
+BLOCK_SIZE = 64 * 1024
+DROP_SIZE = 4 * 1024 * 1024
+
+def map_file(path):
+    """
+    Returns a read-only memory map of the whole file `path`, or None if it cannot be mapped (e.g. it is empty, or not a
+    regular file).
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            # empty files cannot be mapped
+            return None
+
+def iter_blocks(buf, start=0, end=None, block_size=BLOCK_SIZE):
+    """
+    Generates `memoryview` slices of the buffer `buf` (such as a memory map) covering the byte range [`start`, `end`).
+    Each slice is at least `block_size` bytes long, except for the last one, and ends right after a new line byte. The
+    slices must be released before `buf` is closed.
+
+    If `buf` is a memory map, the pages before the current slice are dropped from it every `DROP_SIZE` bytes, so that
+    they do not add up to the resident memory of the process (they stay in the page cache).
+    """
+    if end is None:
+        end = len(buf)
+    advise = getattr(buf, 'madvise', None)
+    dontneed = getattr(mmap, 'MADV_DONTNEED', None)
+    if advise is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        advise(mmap.MADV_SEQUENTIAL)
+    dropped = start - start % mmap.ALLOCATIONGRANULARITY
+    view = memoryview(buf)
+    try:
+        while start < end:
+            stop = buf.find(b'\n', min(start + block_size, end) - 1, end) + 1 or end
+            yield view[start:stop]
+            start = stop
+            if dontneed is not None and advise is not None and start - dropped >= DROP_SIZE:
+                length = start - start % mmap.ALLOCATIONGRANULARITY - dropped
+                advise(dontneed, dropped, length)
+                dropped += length
+    finally:
+        view.release()
+
+class MappedFile(six.Iterator):
+    """
+    A read-only file object over the byte range [`start`, `end`) of the
+    file `path`, which must be a non-empty regular file, iterating over
+    its lines like the csvkit input files: decoded from the `encoding`
+    with universal new lines, and with NUL characters removed. If
+    `encoding` is None, the lines are bytes, split on new line bytes
+    only, like those of a binary file.
+
+    The lines are decoded `block_size` bytes at a time from `memoryview`
+    slices of a memory map of the file, which saves the read calls and
+    the copies into the buffers of a stream.
+    """
+    def __init__(self, path, encoding=None, start=0, end=None, block_size=BLOCK_SIZE):
+        self.path = path
+        self.encoding = encoding
+        self.map = map_file(path)
+        if self.map is None:
+            raise ValueError('%s cannot be memory-mapped' % path)
+        self.start = start
+        self.end = len(self.map) if end is None else end
+        # the end of the bytes decoded so far, for progress reports
+        self.position = start
+        self.block_size = block_size
+        self.chunks = self.iter_chunks()
+        # lines are split by the C streams, without a Python call per line
+        stream = io.BytesIO if encoding is None else lambda data: io.StringIO(data, newline=None)
+        self.lines = itertools.chain.from_iterable(six.moves.map(stream, self.chunks))
+
+    def iter_chunks(self):
+        """
+        Generates the decoded contents of the file, in chunks of whole lines (except for the last one), with the NUL
+        characters removed.
+        """
+        if self.encoding is None:
+            decode, empty, newline, nul = bytes, b'', b'\n', b'\0'
+        else:
+            decode = codecs.getincrementaldecoder(self.encoding)().decode
+            empty, newline, nul = u'', u'\n', u'\0'
+
+        pending = empty
+        for block in iter_blocks(self.map, self.start, self.end, self.block_size):
+            self.position += len(block)
+            try:
+                data = pending + decode(block)
+            finally:
+                block.release()
+            # keep the last partial line (or a final carriage return, which may be followed by a new line) for the
+            # next chunk
+            cut = data.rfind(newline) + 1
+            data, pending = data[:cut], data[cut:]
+            if data:
+                yield data.replace(nul, empty) if nul in data else data
+
+        if self.encoding is not None:
+            pending += decode(b'', True)
+        if pending:
+            yield pending.replace(nul, empty) if nul in pending else pending
+
+    def __iter__(self):
+        # iterating over the lines themselves is faster
+        return self.lines
+
+    def __next__(self):
+        return next(self.lines)
+
+    def readline(self):
+        return next(self.lines, u'' if self.encoding else b'')
+
+    def close(self):
+        if self.map is not None:
+            self.chunks.close()
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
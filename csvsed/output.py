@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Buffered output: the rows are serialized in batches into an in-memory
+buffer, which is written to the output file in large blocks, so that a
+pipe or a terminal gets a few large writes instead of one per row.
+"""
+
+import io
+import timeit
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+# the number of seconds after which buffered output is written even if the block is not full
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+class BufferedOutput(object):
+    """
+    Buffers the output written to the file `f` in memory, and writes it
+    to `f` (flushing it) once at least `block_size` characters (or
+    bytes) are buffered, or once the oldest buffered output has waited
+    for `flush_interval` seconds (checked whenever output is buffered; 0
+    writes every time, and None never flushes on time), or on `flush()`
+    and `close()`, which leaves `f` open. Using it in a ``with`` block
+    flushes it at the end, even on errors.
+
+    Rows are serialized with `writer`, a function like `csv.writer` or
+    `agate.csv.writer` called with a file and the remaining keyword
+    arguments, by `writerow()` and `writerows()`. Text is written as it
+    is by `write()`. If `binary` is true, the output is bytes instead of
+    text, written to `f` as they are, or decoded from `encoding` if it is
+    set.
+    """
+    def __init__(self, f, writer=None, block_size=DEFAULT_BLOCK_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 binary=False, encoding=None, **kwargs):
+        self.f = f
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.encoding = encoding
+        self.buffer = io.BytesIO() if binary else io.StringIO()
+        self.rows = writer(self.buffer, **kwargs) if writer is not None else None
+        # when the oldest output still in the buffer was written to it
+        self.since = None
+
+    def writerow(self, row):
+        self.rows.writerow(row)
+        self.buffered()
+
+    def writerows(self, rows):
+        self.rows.writerows(rows)
+        self.buffered()
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.buffered()
+
+    def buffered(self):
+        """
+        Flushes the buffer if it is full, or if it waited for too long.
+        """
+        if self.buffer.tell() >= self.block_size:
+            self.flush()
+        elif self.flush_interval is not None:
+            now = timeit.default_timer()
+            if self.since is None:
+                self.since = now
+            if now - self.since >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        data = self.buffer.getvalue()
+        if data:
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.f.write(data.decode(self.encoding) if self.encoding else data)
+        self.f.flush()
+        self.since = None
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def default_flush_interval(f, batch_timeout=None):
+    """
+    Returns the flush interval suited to the output file `f`: 0 for a terminal, whose user watches the rows as they
+    come, or with a `batch_timeout`, which hands partial batches over so that they are not held back by a stalled
+    input, `DEFAULT_FLUSH_INTERVAL` otherwise.
+    """
+    if batch_timeout is not None:
+        return 0
+    isatty = getattr(f, 'isatty', None)
+    return 0 if isatty is not None and isatty() else DEFAULT_FLUSH_INTERVAL
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Parallel modification of CSV files: the input file is split into byte
+ranges that end on record boundaries, each range is modified by a
+`CSVModifier` in a pool of worker processes, and the results are
+returned in input order.
+"""
+
+import collections
+import concurrent.futures
+import csv
+import io
+import os
+import re
+
+import agate
+
+from csvsed.mapped import MappedFile
+from csvsed.raw import RawModifier, iter_records, lone_cr_regex, split_lines
+from csvsed.sed import CSVModifier, ExecutionCache, Statistics
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+def iter_ranges(path, start=0, chunk_size=DEFAULT_CHUNK_SIZE, quotechar='"'):
+    """
+    Generates the (start, end) byte ranges covering the file `path` from
+    offset `start` (which must be a record boundary) to its end. Each
+    range is at least `chunk_size` bytes long, except for the last one,
+    and ends right after a new line that is not within a quoted field.
+    With a `chunk_size` of 0, each range holds exactly one record.
+
+    Quoted fields are found by tracking the parity of the `quotechar`
+    characters (None if fields are never quoted), which assumes that they
+    only appear in quoted fields and are escaped by doubling them, as in
+    RFC 4180.
+    """
+    size = os.path.getsize(path)
+    quote = quotechar.encode('ascii') if quotechar else None
+    separators = re.compile(b'[' + re.escape(quote) + b'\n]' if quote else b'\n')
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        quoted = False
+        while start < size:
+            target = start + chunk_size
+            if target >= size:
+                yield start, size
+                return
+
+            # catch up with the quoting state at `target`
+            while pos < target:
+                block = f.read(min(BLOCK_SIZE, target - pos))
+                if quote and block.count(quote) % 2:
+                    quoted = not quoted
+                pos += len(block)
+
+            # then look for the first new line outside of quotes
+            end = None
+            while end is None:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    end = size
+                    break
+                for match in separators.finditer(block):
+                    if match.group() == quote:
+                        quoted = not quoted
+                    elif not quoted:
+                        end = pos + match.end()
+                        break
+                pos += len(block)
+
+            yield start, end
+            start = end
+            f.seek(end)
+            pos = end
+            quoted = False
+
+def has_lone_cr(path, size=BLOCK_SIZE):
+    """
+    Returns whether the first `size` bytes of the file `path` hold a lone carriage return (one not followed by a new
+    line), which ends a line in text mode, but not a range of `iter_ranges`.
+    """
+    with open(path, 'rb') as f:
+        return lone_cr_regex.search(f.read(size)) is not None
+
+def read_range(path, start, end, encoding):
+    """
+    Returns the text held in the byte range [`start`, `end`) of the file `path`, as a stream suitable for a CSV reader.
+    If `encoding` is None, returns the bytes themselves, as a binary stream.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # like the csvkit input files: universal new lines (in text mode), and NUL characters removed
+    if encoding is None:
+        return io.BytesIO(data.replace(b'\0', b''))
+    return io.StringIO(data.decode(encoding).replace(u'\0', u''), newline=None)
+
+class RangeModifier(object):
+    """
+    Modifies byte ranges of a CSV file without a header, returning the CSV text of the modified rows, with a
+    `RawModifier` if `raw` is true (working on bytes, and returning bytes, if `binary` is true too). The ranges are read
+    from a `MappedFile` if `mmap` is true. If `stats` is true, the `Statistics.report()` of each range is returned too.
+    Instances are sent once to each worker process.
+    """
+    def __init__(self, path, modifiers, encoding='utf-8', reader_kwargs=None, writer_kwargs=None, cache_size=None,
+                 field_size_limit=None, raw=False, binary=False, mmap=True, stats=False, **kwargs):
+        self.path = path
+        self.modifiers = modifiers
+        self.encoding = encoding
+        self.reader_kwargs = reader_kwargs or {}
+        self.writer_kwargs = writer_kwargs or {}
+        self.cache_size = cache_size
+        self.field_size_limit = field_size_limit
+        self.raw = raw
+        self.binary = raw and binary
+        self.mmap = mmap
+        self.stats = stats
+        self.kwargs = kwargs
+        self.cache = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def __call__(self, start, end):
+        if self.field_size_limit is not None:
+            csv.field_size_limit(self.field_size_limit)
+        if self.cache_size and self.cache is None:
+            self.cache = ExecutionCache(self.cache_size)
+        hits, misses = (self.cache.hits, self.cache.misses) if self.cache else (0, 0)
+        stats = Statistics() if self.stats else None
+
+        encoding = None if self.binary else self.encoding
+        # a memory-mapped range is decoded block by block, rather than read and decoded all at once
+        src = MappedFile(self.path, encoding, start, end) if self.mmap else read_range(self.path, start, end, encoding)
+        with src:
+            if self.raw:
+                quotechar = self.reader_kwargs.get('quotechar', '"')
+                if self.binary:
+                    records = iter_records(split_lines(src), quotechar.encode('ascii'))
+                else:
+                    records = iter_records(src, quotechar)
+                with RawModifier(records, self.modifiers, header=False, binary=self.binary, encoding=self.encoding,
+                                 cache=self.cache, stats=stats, **self.kwargs) as reader:
+                    text = (b'' if self.binary else u'').join(reader.iter_text())
+                    rows = reader.modifier.rows
+            else:
+                dst = io.StringIO()
+                rows = agate.csv.reader(src, **self.reader_kwargs)
+                with CSVModifier(rows, self.modifiers, header=False, cache=self.cache, stats=stats,
+                                 **self.kwargs) as reader:
+                    agate.csv.writer(dst, **self.writer_kwargs).writerows(reader)
+                    rows = reader.rows
+                text = dst.getvalue()
+
+        if self.cache:
+            hits, misses = self.cache.hits - hits, self.cache.misses - misses
+        return text, rows, hits, misses, stats.report() if stats else None
+
+# the `RangeModifier` of the current worker process
+worker = None
+
+def init_worker(range_modifier):
+    global worker
+    worker = range_modifier
+
+def modify_range(start, end):
+    return worker(start, end)
+
+class ParallelModifier(object):
+    """
+    Modifies the records of the CSV file `path` from byte offset `start`
+    (which must be a record boundary, typically the end of the header) to
+    its end, with `processes` worker processes. Iterating over it yields
+    the CSV text of the modified rows (bytes with the `raw` and `binary`
+    options), chunk by chunk, in input order; at most two chunks per
+    process are pending at any time.
+
+    The `modifiers` must be picklable, e.g. modifier strings, and must
+    be keyed by column index. The remaining keyword arguments are passed
+    to `RangeModifier`, and from there to `CSVModifier`. With a
+    `cache_size`, each worker process gets its own `ExecutionCache`, and
+    the total hit and miss counts are available in `hits` and `misses`,
+    and the number of rows modified so far in `rows`.
+    With `stats`, a `Statistics` object, the statistics of the worker
+    processes are merged into it (their times add up).
+    """
+    def __init__(self, path, modifiers, processes, start=0, chunk_size=DEFAULT_CHUNK_SIZE, quotechar='"', stats=None,
+                 **kwargs):
+        self.path = path
+        self.processes = processes
+        self.start = start
+        self.chunk_size = chunk_size
+        self.quotechar = quotechar
+        self.stats = stats
+        self.range_modifier = RangeModifier(path, modifiers, stats=stats is not None, **kwargs)
+        self.rows = 0
+        # the end of the input range of the last text yielded
+        self.position = start
+        self.hits = 0
+        self.misses = 0
+
+    def __iter__(self):
+        executor = concurrent.futures.ProcessPoolExecutor(
+            self.processes, initializer=init_worker, initargs=(self.range_modifier,))
+        inflight = collections.deque()
+        try:
+            for start, end in iter_ranges(self.path, self.start, self.chunk_size, self.quotechar):
+                inflight.append((executor.submit(modify_range, start, end), end))
+                if len(inflight) >= 2 * self.processes:
+                    yield self.result(inflight.popleft())
+            while inflight:
+                yield self.result(inflight.popleft())
+        finally:
+            for future, _ in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def result(self, chunk):
+        future, self.position = chunk
+        text, rows, hits, misses, report = future.result()
+        self.rows += rows
+        self.hits += hits
+        self.misses += misses
+        if report is not None:
+            self.stats.merge(report)
+        return text
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Support for long runs of the command line: periodic progress reports
+(`Progress`), and checkpoints recording how far the output is complete,
+from which an interrupted run can resume (`Checkpoint`, `RecordInput`).
+"""
+
+import codecs
+import collections
+import json
+import os
+import re
+import timeit
+
+import six
+
+from csvsed.raw import iter_records
+
+DEFAULT_PROGRESS_INTERVAL = 10.0
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+
+class CheckpointError(Exception):
+    """
+    Raised when a run cannot resume from a checkpoint.
+    """
+    def __init__(self, message):
+        super(CheckpointError, self).__init__('Cannot resume: %s' % message)
+
+def file_position(f):
+    """
+    Returns the number of bytes read so far from the input file `f` (a `MappedFile`, a `RecordInput`, or a binary or
+    text file), counting those read ahead into its buffers, or None if it cannot tell, e.g. for a pipe or a
+    compressed file.
+    """
+    position = getattr(f, 'position', None)
+    if position is not None:
+        return position
+    try:
+        return getattr(f, 'buffer', f).tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+def format_size(size):
+    for unit in ('bytes', 'kB', 'MB', 'GB'):
+        if size < 1000:
+            break
+        size /= 1000.0
+    else:
+        unit = 'TB'
+    return '%i %s' % (size, unit) if unit == 'bytes' else '%.1f %s' % (size, unit)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%i:%02i:%02i' % (hours, minutes, seconds)
+
+def write_json(path, data):
+    """
+    Writes `data` as JSON to the file `path`, atomically replacing it, so that a reader never sees it incomplete.
+    """
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class Progress(object):
+    """
+    Reports the progress of a run every `interval` seconds: the rows
+    done and their rate, and the bytes of input read out of `total`
+    (the input size, if known) with the estimated time left. The report
+    is a line written to the text file `error_file`, or, if `path` is
+    set, the JSON object of `status()` written to that file, replaced
+    each time.
+
+    The rows and bytes done before the run started (when it resumed
+    from a checkpoint) are given by `rows` and `start`, and left out of
+    the rate.
+    """
+    def __init__(self, error_file=None, path=None, interval=DEFAULT_PROGRESS_INTERVAL, total=None, rows=0, start=0):
+        self.error_file = error_file
+        self.path = path
+        self.interval = interval
+        self.total = total
+        self.start_rows = self.rows = rows
+        self.start = self.position = start
+        self.started = self.reported = timeit.default_timer()
+
+    def update(self, rows, position=None):
+        """
+        Records that `rows` rows are done and `position` bytes of input read (None if unknown), and reports the
+        progress if it is time to.
+        """
+        self.rows = rows
+        if position is not None:
+            self.position = position
+        if timeit.default_timer() - self.reported >= self.interval:
+            self.report()
+
+    def status(self, done=False):
+        """
+        Returns the progress as a dict: rows, rows_per_s, bytes, total_bytes (None if unknown), percent and
+        eta_seconds (None if unknown), elapsed_seconds and done.
+        """
+        elapsed = timeit.default_timer() - self.started
+        rate = (self.rows - self.start_rows) / elapsed if elapsed > 0 else 0.0
+        percent = eta = None
+        if self.total:
+            percent = 100.0 * min(self.position, self.total) / self.total
+            if done:
+                eta = 0.0
+            elif self.position > self.start:
+                eta = elapsed * max(self.total - self.position, 0) / (self.position - self.start)
+        return dict(rows=self.rows, rows_per_s=rate, bytes=self.position, total_bytes=self.total, percent=percent,
+                    eta_seconds=eta, elapsed_seconds=elapsed, done=done)
+
+    def report(self, done=False):
+        self.reported = timeit.default_timer()
+        status = self.status(done)
+        if self.path:
+            write_json(self.path, status)
+            return
+        line = 'progress: %i rows (%.0f rows/s), %s' % (status['rows'], status['rows_per_s'],
+                                                        format_size(status['bytes']))
+        if status['total_bytes']:
+            line += ' of %s (%.1f%%)' % (format_size(status['total_bytes']), status['percent'])
+        if status['eta_seconds'] is not None and not done:
+            line += ', ETA %s' % format_duration(status['eta_seconds'])
+        self.error_file.write(line + (', done\n' if done else '\n'))
+        self.error_file.flush()
+
+class Checkpoint(object):
+    """
+    Records, in the JSON file `path`, how far a run modifying the input
+    file `input_path` into the output file `output_path` is complete:
+    the byte `offset` in the input after the last complete row, the
+    number of `rows` modified, and the `output_size` of the output they
+    make. The input size is recorded too, to check that the input did
+    not change when resuming.
+
+    `due()` tells whether `interval` seconds have passed since the last
+    checkpoint, `save()` writes one atomically, and `load()` returns the
+    last one.
+    """
+    def __init__(self, path, input_path, output_path, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        self.interval = interval
+        self.saved = timeit.default_timer()
+
+    def due(self):
+        return timeit.default_timer() - self.saved >= self.interval
+
+    def save(self, offset, rows, output_size):
+        write_json(self.path, dict(input=self.input_path, input_size=os.path.getsize(self.input_path),
+                                   output=self.output_path, offset=offset, rows=rows, output_size=output_size))
+        self.saved = timeit.default_timer()
+
+    def load(self):
+        """
+        Returns the last checkpoint, as a dict, or None if there is none. Raises `CheckpointError` if it is not one of
+        this input and output, if the input changed, or if the output is shorter.
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (IOError, OSError):
+            if os.path.exists(self.path):
+                raise
+            return None
+        except ValueError:
+            raise CheckpointError('%s is not a checkpoint file' % self.path)
+        if state.get('input') != self.input_path or state.get('output') != self.output_path:
+            raise CheckpointError('%s is a checkpoint of %s into %s' % (self.path, state.get('input'),
+                                                                       state.get('output')))
+        if os.path.getsize(self.input_path) != state['input_size']:
+            raise CheckpointError('%s changed since the checkpoint' % self.input_path)
+        if not os.path.exists(self.output_path) or os.path.getsize(self.output_path) < state['output_size']:
+            raise CheckpointError('%s is shorter than at the checkpoint' % self.output_path)
+        return state
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def record_regex(delimiter=',', quotechar='"', doublequote=True, skipinitialspace=False):
+    """
+    Returns a regular expression matching the CSV records (as text) whose quote characters are all at the start of a
+    field or within a quoted field, the only records whose `quotechar` characters tell where they end (see
+    `iter_records`).
+    """
+    d, q = re.escape(delimiter), re.escape(quotechar)
+    quoted = u'%s(?:[^%s]%s)*%s' % (q, q, u'|%s%s' % (q, q) if doublequote else u'', q)
+    field = u'%s(?:%s|[^%s%s\n]*)' % (u' *' if skipinitialspace else u'', quoted, d, q)
+    return re.compile(u'%s(?:%s%s)*\n?' % (field, d, field))
+
+class RecordInput(six.Iterator):
+    """
+    A text input file over the regular file `path`, which iterates over
+    whole CSV records instead of lines (see `iter_records`), decoded
+    from the `encoding`, which must be ASCII-compatible, with universal
+    new lines and without NUL characters, and which keeps track of the
+    byte offset in the file of the end of each record.
+
+    If `offset` is set, the first record (the header, if `header` is
+    true) is read as usual, and the records then continue from this
+    byte offset, the end of a record read by an earlier run.
+
+    The records are those of the csv module as long as the quote
+    characters are where the dialect (`quotechar`, `delimiter`,
+    `doublequote` and `skipinitialspace`) allows them: `exact` is
+    set to False from the first record where one is not, e.g. in the
+    middle of an unquoted field, after which a record may hold several
+    rows, or a row several records, and the offsets cannot be trusted.
+    """
+    def __init__(self, path, encoding, quotechar='"', header=True, offset=None, delimiter=',', doublequote=True,
+                 skipinitialspace=False):
+        self.f = open(path, 'rb')
+        self.decoder = codecs.lookup(encoding).name
+        self.quotechar = quotechar.encode('ascii') if quotechar else None
+        self.header = header
+        self.resume = offset
+        self.exact = True
+        self.regex = record_regex(delimiter, quotechar, doublequote, skipinitialspace) if quotechar else None
+        # the end of the last line read
+        self.position = 0
+        # the end offsets of the records returned, but for the header
+        self.ends = collections.deque()
+        self.records = self.iter_records()
+
+    def iter_lines(self):
+        for line in self.f:
+            self.position += len(line)
+            yield line
+
+    def iter_records(self):
+        records = iter_records(self.iter_lines(), self.quotechar)
+        if self.resume is not None:
+            if self.header:
+                yield self.decode_record(next(records))
+            self.f.seek(self.resume)
+            self.position = self.resume
+            records = iter_records(self.iter_lines(), self.quotechar)
+        elif self.header:
+            header = next(records, None)
+            if header is None:
+                return
+            yield self.decode_record(header)
+        for record in records:
+            self.ends.append(self.position)
+            yield self.decode_record(record)
+
+    def decode(self, data):
+        text = data.decode(self.decoder)
+        if self.decoder == 'utf-8-sig':
+            # only the start of the file has a byte order mark
+            self.decoder = 'utf-8'
+        if u'\r' in text:
+            text = text.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+        return text.replace(u'\0', u'') if u'\0' in text else text
+
+    def decode_record(self, data):
+        text = self.decode(data)
+        if self.exact and self.quotechar and self.quotechar in data and not self.regex.fullmatch(text):
+            self.exact = False
+        return text
+
+    def readline(self):
+        """
+        Reads a line to skip, before the records.
+        """
+        line = self.f.readline()
+        self.position += len(line)
+        return self.decode(line)
+
+    def pop_offset(self, rows):
+        """
+        Returns the end offset of the `rows`-th record returned after the last one popped, forgetting about those
+        before.
+        """
+        for _ in range(rows - 1):
+            self.ends.popleft()
+        return self.ends.popleft()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.records)
+
+    def close(self):
+        self.records.close()
+        self.f.close()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Raw pass-through modification of CSV text: each record is only
+tokenized as far as the last modified column, the fields that are not
+modified are copied to the output as they are, and only the modified
+cells are quoted again. In binary mode, the records are UTF-8 encoded
+bytes that are never decoded, and so are the cells handed over to the
+modifiers (see `Modifier.as_binary()`).
+"""
+
+import collections
+import csv
+import io
+import re
+
+import six
+
+from csvsed.sed import CSVModifier, DEFAULT_BATCH_SIZE, InvalidAddress, InvalidModifier, modifier_as_function
+
+def iter_records(lines, quotechar='"'):
+    """
+    Generates the raw text of the CSV records read from `lines` (an iterable of text lines, such as a text file),
+    joining lines as long as they hold an odd number of `quotechar` characters (None if fields are never quoted). Like
+    `csvsed.parallel.iter_ranges`, this assumes that quote characters only appear in quoted fields. A quoted field
+    left open at the end of the input is closed. The lines can also be bytes, in which case `quotechar` must be bytes
+    too.
+    """
+    lines = iter(lines)
+    for record in lines:
+        if quotechar and record.count(quotechar) % 2:
+            parts = [record]
+            quoted = True
+            for line in lines:
+                parts.append(line)
+                if line.count(quotechar) % 2:
+                    quoted = not quoted
+                    if not quoted:
+                        break
+            else:
+                # like the csv module, close the last field at the end of the input
+                parts.append(quotechar)
+            record = record[:0].join(parts)
+        yield record
+
+# a carriage return that does not start a Windows new line
+lone_cr_regex = re.compile(b'\r(?!\n)')
+
+def split_lines(lines):
+    """
+    Generates the binary `lines` (such as those of a binary file, which only end with a new line), split after their
+    lone carriage returns too, like the universal new lines of text mode, but keeping the line endings.
+    """
+    for line in lines:
+        if b'\r' not in line or not lone_cr_regex.search(line):
+            yield line
+            continue
+        start = 0
+        for match in lone_cr_regex.finditer(line):
+            yield line[start:match.end()]
+            start = match.end()
+        if start < len(line):
+            yield line[start:]
+
+def quote_cell(value, delimiter=',', quotechar='"'):
+    """
+    Returns the CSV text of the cell `value`, quoted only if needed, as `agate.csv.writer` would write it. If
+    `delimiter` and `quotechar` are bytes, so is the result.
+    """
+    binary = isinstance(delimiter, bytes)
+    if value is None:
+        return delimiter[:0]
+    if isinstance(value, (six.text_type, bytes)):
+        # like agate, which turns embedded Mac line endings into new lines
+        value = value.replace(b'\r', b'\n') if binary else value.replace(u'\r', u'\n')
+    else:
+        value = six.text_type(value)
+        if binary:
+            value = value.encode('utf-8')
+    if delimiter in value or quotechar in value or (b'\n' if binary else u'\n') in value:
+        return quotechar + value.replace(quotechar, quotechar * 2) + quotechar
+    return value
+
+def cell_quoter(delimiter=',', quotechar='"'):
+    """
+    Returns a function equivalent to `quote_cell` with the given `delimiter` and `quotechar`, faster on cells of the
+    same type as them.
+    """
+    native = type(delimiter)
+    cr, newline = (b'\r', b'\n') if native is bytes else (u'\r', u'\n')
+    double = quotechar * 2
+    # membership tests on bytes are much faster with int needles
+    has_cr, has_delimiter, has_quotechar, has_newline = (
+        (ord(c) for c in (cr, delimiter, quotechar, newline)) if native is bytes else (cr, delimiter, quotechar, newline))
+    def quote(value):
+        if type(value) is not native:
+            return quote_cell(value, delimiter, quotechar)
+        if has_cr in value:
+            value = value.replace(cr, newline)
+        if has_delimiter in value or has_quotechar in value or has_newline in value:
+            return quotechar + value.replace(quotechar, double) + quotechar
+        return value
+    return quote
+
+def binary_modifier(modifier):
+    """
+    Returns the modifier (in any of the forms accepted by `modifier_as_function`) working on UTF-8 encoded bytes
+    instead of text. Raises `InvalidModifier` if there is none.
+    """
+    mod = modifier_as_function(modifier)
+    binary = mod.as_binary() if hasattr(mod, 'as_binary') else None
+    if binary is None:
+        raise InvalidModifier('`%s` cannot be applied to bytes' % (modifier,))
+    return binary
+
+def binary_modifiers(modifiers):
+    """
+    Returns the `binary_modifier` of each of the `modifiers`, a dict or a sequence like those given to `CSVModifier`,
+    as a dict. Raises `InvalidModifier` if one of them cannot be applied to bytes.
+    """
+    if not hasattr(modifiers, 'items'):
+        modifiers = dict(enumerate(modifiers))
+    return dict((col, binary_modifier(mod)) for col, mod in modifiers.items())
+
+class RawModifier(six.Iterator):
+    """
+    Modifies raw CSV records, as generated by `iter_records`, and returns
+    the CSV text of the modified records. Only the fields up to the last
+    modified column are tokenized: the cells to modify are extracted from
+    the record text, passed through a `CSVModifier`, and only the cells
+    whose value changed are written back, quoted if needed. Everything
+    else, including the header, is copied as is, so that the output keeps
+    the quoting of the input wherever nothing changed.
+
+    Records whose fields cannot be tokenized (e.g. a quote character in
+    an unquoted field) are fully parsed with the `csv` module and written
+    back like `agate.csv.writer` would. Each record ends with a new line.
+
+    The `modifiers` must be keyed by column index, or by column name if
+    `header` is true; the remaining keyword arguments are passed to the
+    `CSVModifier`; the cells its `address` looks at are extracted along
+    with the modified ones. `delimiter` and `quotechar` are used for both
+    the input and the output.
+
+    If `binary` is true, the records are bytes in the `encoding`, which
+    must be UTF-8 or ASCII, as is the output, and the `delimiter` and
+    `quotechar` must be ASCII characters. The modifiers are replaced by
+    their `binary_modifier` (and the address by `Address.as_binary()`),
+    so that cells are only decoded to parse records the expression
+    cannot tokenize (and the header, for the column names). New lines
+    within fields are not translated, except in the modified cells.
+    """
+    def __init__(self, records, modifiers, header=True, delimiter=',', quotechar='"', binary=False, encoding='utf-8',
+                 **kwargs):
+        self.records = iter(records)
+        self.binary = binary
+        self.encoding = encoding
+        self.text_delimiter = delimiter
+        self.text_quotechar = quotechar
+        if binary:
+            delimiter, quotechar = delimiter.encode('ascii'), quotechar.encode('ascii')
+            modifiers = binary_modifiers(modifiers)
+            self.newline, self.crlf = b'\n', b'\r\n'
+        else:
+            self.newline, self.crlf = u'\n', u'\r\n'
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.empty = delimiter[:0]
+        self.quote = cell_quoter(delimiter, quotechar)
+        self.header = header
+        # the raw record of each row handed over to the modifier, popped as the modified rows come back in order
+        self.sources = collections.deque()
+        self.modifier = CSVModifier(self.iter_rows(), modifiers, header=header, **kwargs)
+        self.column_names = self.modifier.column_names
+        for col in self.modifier.modifiers:
+            if not isinstance(col, six.integer_types):
+                from csvkit.exceptions import ColumnIdentifierError
+                raise ColumnIdentifierError("Column %r is invalid. It is neither an integer nor a column name." % col)
+        columns = set(self.modifier.modifiers)
+        address = self.modifier.address
+        if address is not None:
+            # the cells the address looks at are extracted too, and left as they are
+            columns.update(address.columns)
+            if binary:
+                # the rows are only read once iterating, so the address can still be replaced
+                self.modifier.address = address.as_binary()
+                if self.modifier.address is None:
+                    raise InvalidAddress('the address cannot be applied to bytes')
+        self.targets = sorted(columns)
+        self.fields = self.compile_fields(self.targets)
+
+    def compile_fields(self, targets):
+        """
+        Returns the regular expression matching the start of a record up to the last of the `targets` columns, with a
+        group spanning each of them.
+        """
+        delimiter, quote = re.escape(self.text_delimiter), re.escape(self.text_quotechar)
+        field = u'%s(?:[^%s]|%s%s)*%s|[^%s%s\r\n]*' % (quote, quote, quote, quote, quote, delimiter, quote)
+        end = u'(?=%s|\r|\n|$)' % delimiter
+        parts = []
+        previous = -1
+        for col in targets:
+            skip = u'(?:(?:%s)%s){%i}' % (field, delimiter, col - previous - 1)
+            parts.append(u'%s(%s)%s' % (skip, field, end))
+            previous = col
+        pattern = delimiter.join(parts)
+        return re.compile(pattern.encode('ascii') if self.binary else pattern)
+
+    def parse(self, record):
+        """
+        Fully parses `record` with the `csv` module, returning the list of its rows.
+        """
+        text = record.decode(self.encoding) if self.binary else record
+        rows = csv.reader(io.StringIO(text, newline=u''), delimiter=self.text_delimiter,
+                          quotechar=self.text_quotechar)
+        if self.binary:
+            return [[value.encode(self.encoding) for value in row] for row in rows]
+        return list(rows)
+
+    def iter_rows(self):
+        """
+        Generates the rows handed over to the `CSVModifier`: lists holding the values of the modified columns (and
+        None elsewhere), or the fully parsed row if the record cannot be tokenized.
+        """
+        if self.header:
+            record = next(self.records, None)
+            if record is None:
+                return
+            self.sources.append((record, None, None))
+            # the column names are text in any case
+            text = record.decode(self.encoding) if self.binary else record
+            yield next(csv.reader(io.StringIO(text, newline=u''), delimiter=self.text_delimiter,
+                                  quotechar=self.text_quotechar))
+
+        quote = self.quotechar
+        double = quote * 2
+        binary, newline, crlf = self.binary, self.newline, self.crlf
+        cr = crlf[:1]
+        blank = (newline, crlf, cr)
+        match_fields, append = self.fields.match, self.sources.append
+        targets = self.targets
+        width = targets[-1] + 1
+        for record in self.records:
+            match = match_fields(record)
+            if match is None or (not match.end() and record in blank):
+                # not tokenizable: let the csv module parse it, maybe into several rows
+                for row in self.parse(record):
+                    append((None, None, None))
+                    yield row
+                continue
+            values = [value[1:-1].replace(double, quote) if value.startswith(quote) else value
+                      for value in match.groups()]
+            if binary and cr in record:
+                # like the universal new lines of text mode
+                values = [value.replace(crlf, newline).replace(cr, newline) for value in values]
+            row = [None] * width
+            for col, value in zip(targets, values):
+                row[col] = value
+            append((record, match, values))
+            yield row
+
+    def format(self, row, source):
+        """
+        Returns the CSV text of the modified `row`, given the `source` of its raw record: the record, its match by the
+        `fields` expression and the original values of the modified cells (all None if the record was fully parsed).
+        """
+        record, match, values = source
+        newline = self.newline
+        if record is None:
+            if row == [self.empty]:
+                # like the csv module, which quotes a lone empty field so that it is not read as an empty line
+                return self.quotechar * 2 + newline
+            return self.delimiter.join(map(self.quote, row)) + newline
+        if match is not None:
+            pieces = []
+            pos = 0
+            for idx, col in enumerate(self.targets):
+                value = row[col]
+                # keep the input text of unchanged cells, including their quotes
+                if value == values[idx]:
+                    continue
+                start, end = match.span(idx + 1)
+                pieces.append(record[pos:start])
+                pieces.append(self.quote(value))
+                pos = end
+            if pieces:
+                pieces.append(record[pos:])
+                record = self.empty.join(pieces)
+                if record in (self.empty, newline, self.crlf, self.crlf[:1]):
+                    return self.quotechar * 2 + newline
+        if record.endswith(newline):
+            if record.endswith(self.crlf):
+                return record[:-2] + newline
+            return record
+        if record.endswith(self.crlf[:1]):
+            # a lone carriage return (see `split_lines`)
+            return record[:-1] + newline
+        return record + newline
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self.modifier)
+        return self.format(row, self.sources.popleft())
+
+    def iter_text(self, size=DEFAULT_BATCH_SIZE):
+        """
+        Generates the CSV text (or bytes) of the modified records, `size` records at a time (see
+        `CSVModifier.iter_batches`).
+        """
+        for rows in self.modifier.iter_batches(size):
+            sources = [self.sources.popleft() for _ in rows]
+            yield self.empty.join(map(self.format, rows, sources))
+
+    def close(self):
+        self.modifier.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
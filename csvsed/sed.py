@@ -6,17 +6,41 @@ A stream-oriented CSV modification tool. Like a stripped-down "sed"
 command, but for tabular data.
 """
 
+import collections
+import copy
+import os
 import re
-import subprocess
 import sys
-
-from csvkit.exceptions import ColumnIdentifierError
+import threading
+import time
+import timeit
+import types
 
 import six
+from six.moves import queue
+
+# the modules needed only by some features (threads, "e" modifiers, the cache file, errors), and csvkit, whose import
+# pulls in agate, are imported where they are used, to keep the startup of the command line short
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_MEMO_SIZE = 4096
+DEFAULT_MODIFIER_CACHE_SIZE = 1024
+
+# the message is formatted by `__str__`, so that the exceptions raised in worker processes are pickled back unchanged
 
 class InvalidModifier(Exception):
-    def __init__(self, message):
-        super(InvalidModifier, self).__init__('Invalid modifier: %s' % message)
+    def __str__(self):
+        return 'Invalid modifier: %s' % self.args[0]
+
+class InvalidAddress(Exception):
+    def __str__(self):
+        return 'Invalid address: %s' % self.args[0]
 
 class CSVModifier(six.Iterator):
     """
@@ -41,6 +65,8 @@ class CSVModifier(six.Iterator):
 
       * function : takes a single string argument and returns a string
       * string : a sed-like modifier
+      * list or tuple : a chain of functions and/or sed-like modifiers,
+        applied in order
 
       Currently supported modification modifiers:
 
@@ -85,6 +111,22 @@ class CSVModifier(six.Iterator):
         * u: enables unicode escape sequences
         * x: `REGEX` uses verbose descriptors & comments
 
+        The following flags control how `COMMAND` is run:
+
+        * c: coprocess mode -- `COMMAND` is started once and kept
+          alive for the whole stream; it receives one matching cell
+          per line on its standard input and must write exactly one
+          line back for each of them (flushing its output after every
+          record). `COMMAND` cannot use back-references in this mode.
+        * b: batch mode -- matching cells are collected (see
+          `batch_size` and `batch_timeout`) and `COMMAND` is run once
+          per batch, receiving one cell per line on its standard input
+          and writing exactly one line back for each of them. Cells
+          whose back-references expand to different commands are run
+          in separate batches.
+        * z: records exchanged with a coprocess or a batch command are
+          separated by NUL characters instead of new lines
+
       Note that the "/" character can be any character as long as it
       is used consistently and not used within the modifier,
       e.g. ``s|a|b|`` is equivalent to ``s/a/b/``.
@@ -92,12 +134,120 @@ class CSVModifier(six.Iterator):
     header : bool, optional, default: true
 
       If truthy (the default), then the first row will not be modified.
+
+    batch_size : int, optional, default: 1000
+
+      The number of rows collected before being handed over to `e`
+      modifiers with the `b` flag.
+
+    batch_timeout : float, optional
+
+      If set, a batch is also handed over once this many seconds have
+      elapsed since its first row was read, even if it is not full and
+      the input stalls: the rows are then read in a background thread.
+
+    jobs : int, optional, default: 1
+
+      The number of rows (or batches of rows, see `batch_size`) that
+      are modified concurrently, each in its own thread. This mostly
+      benefits `e` modifiers, which spend their time waiting for
+      external commands. Rows are still returned in input order, and
+      at most `jobs` rows (or batches) are held in memory at a time.
+
+    cache : ExecutionCache, optional
+
+      If set, the results of the `e` modifiers are looked up in, and
+      stored into, this cache, so that a command is only run once for
+      a given expanded command and cell value.
+
+    memoize : bool, optional, default: false
+
+      If truthy, the results of the `s` and `y` modifiers (and of
+      chains made only of those) are remembered per column, which pays
+      off for columns with few distinct values. Each column checks its
+      hit rate regularly and stops memoizing if it is too low; see
+      `MemoizedModifier` and `memo_stats()`.
+
+    stats : Statistics, optional
+
+      If set, the rows read (and the time spent reading them), and the
+      calls, changed cells and time of each modifier of each column
+      (each step of a chain separately) are recorded into it, as well
+      as the time spent running the commands of `e` modifiers. Without
+      it, the modifiers are called directly, at no cost.
+
+    address : { Address, str }, optional
+
+      If set, only the rows selected by this address (or sed-like
+      address string, see `parse_address()`) are modified, the other
+      rows are returned as they are, without calling any modifier.
+
+    quit : bool, optional, default: false
+
+      If truthy, stop reading rows after the last row that `address`
+      can select, like sed's "q" command. The address must have a last
+      row.
+
+    max_rows : int, optional
+
+      If set, stop reading rows after this many rows (not counting the
+      header).
+
+    processes : int, optional, default: 1
+
+      If greater than one, the modifiers that are plain callables (not
+      strings, nor chains) and can be pickled are run in a pool of this
+      many worker processes, which pays off for CPU-bound Python
+      functions. The rows are sent to the workers in chunks of
+      `batch_size` rows (or of the size given to `iter_batches()`), at
+      most twice as many chunks as processes at a time, and come back
+      in input order. The other modifiers still run in this process,
+      while the workers run, and `jobs` does not apply. The statistics
+      of the remote modifiers are not recorded.
     """
-    def __init__(self, reader, modifiers, header=True):
+    def __init__(self, reader, modifiers, header=True, batch_size=DEFAULT_BATCH_SIZE, batch_timeout=None, jobs=1,
+                 cache=None, memoize=False, stats=None, address=None, quit=False, max_rows=None, processes=1):
         self.reader = reader
         self.header = header
         self.column_names = next(reader) if header else None
+        if stats is not None:
+            self.reader = stats.timed_rows(self.reader)
+        self.address = parse_address(address, self.column_names) if isinstance(address, six.string_types) else address
+        if self.address is not None and not all(isinstance(col, six.integer_types) for col in self.address.columns):
+            raise InvalidAddress('column names need a header row')
+        self.last_row = max_rows
+        if quit:
+            if self.address is None or self.address.last is None:
+                raise InvalidAddress('quitting needs an address with a last row')
+            self.last_row = self.address.last if max_rows is None else min(max_rows, self.address.last)
+        # whether each row read is selected by the address, popped as the rows are modified, in order
+        self.selected = None
+        if self.address is not None or self.last_row is not None:
+            self.selected = collections.deque()
+            self.reader = self.iter_addressed(self.reader)
         self.modifiers = standardize_modifiers(self.column_names, modifiers)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.memoize = memoize
+        self.stats = stats
+        self.functions = dict((col, self.wrap(mod, cache, col)) for col, mod in self.modifiers.items())
+        self.transform = compile_transform(self.functions)
+        self.modify_row = self.transform if self.selected is None else self.modify_selected
+        self.batched = any(getattr(mod, 'batch', False) for mod in self.modifiers.values())
+        self.jobs = jobs
+        self.processes = processes
+        # the modifiers run by the worker processes, by column, and the functions of the other columns
+        self.remote = {}
+        if processes > 1:
+            self.remote = dict((col, mod) for col, mod in self.modifiers.items() if is_remote(mod))
+        self.local_functions = dict((col, func) for col, func in self.functions.items() if col not in self.remote)
+        self.pending = collections.deque()
+        self.chunks = None
+        # the rows read ahead by a background thread, with a batch timeout
+        self.queue = None
+        self.read_done = False
+        # the number of rows returned so far, not counting the header
+        self.rows = 0
 
     def __iter__(self):
         return self
@@ -106,11 +256,834 @@ class CSVModifier(six.Iterator):
         if self.header:
             self.header = False
             return self.column_names
-        row = next(self.reader)
-        for col, mod in self.modifiers.items():
-            row[col] = mod(row[col])
+        if self.batched or self.jobs > 1 or self.remote:
+            while not self.pending:
+                if self.chunks is None:
+                    self.chunks = self.iter_chunks(self.batch_size if self.batched or self.remote else 1)
+                self.pending.extend(next(self.chunks))
+            row = self.pending.popleft()
+        else:
+            row = self.modify_row(next(self.reader))
+        self.rows += 1
         return row
 
+    def iter_addressed(self, rows):
+        """
+        Generates the `rows` up to `last_row`, recording whether the `address` selects them.
+        """
+        address, last_row, append = self.address, self.last_row, self.selected.append
+        if last_row is not None and last_row < 1:
+            return
+        for number, row in enumerate(rows, 1):
+            append(address is None or address(number, row))
+            yield row
+            if number == last_row:
+                # stop reading
+                return
+
+    def modify_selected(self, row):
+        return self.transform(row) if self.selected.popleft() else row
+
+    def pop_selected(self, count):
+        """
+        Returns whether each of the next `count` rows read is selected by the address, or None without address.
+        """
+        if self.selected is None:
+            return None
+        popleft = self.selected.popleft
+        return [popleft() for _ in range(count)]
+
+    def wrap(self, mod, cache, column=None):
+        """
+        Returns the function actually called to modify the cells of `column` handled by the modifier `mod`.
+        """
+        if cache is not None and isinstance(mod, EModifier):
+            return self.instrument(CachedModifier(mod, cache), mod, column)
+        if cache is not None and isinstance(mod, ChainModifier):
+            return ChainModifier([self.wrap(step, cache, column) for step in mod.modifiers])
+        if self.memoize and is_deterministic(mod):
+            # timed around the memoization, so that the hits count as calls
+            return self.instrument(MemoizedModifier(mod), mod, column)
+        return self.instrument(mod, mod, column)
+
+    def instrument(self, function, mod, column):
+        """
+        Returns `function`, called for the modifier `mod` of `column`, recording its statistics if `stats` is set.
+        """
+        if self.stats is None:
+            return function
+        if function is mod and isinstance(mod, ChainModifier):
+            return ChainModifier([self.instrument(step, step, column) for step in mod.modifiers])
+        if isinstance(mod, EModifier):
+            mod.stats = self.stats
+        return self.stats.timed(function, mod, column)
+
+    def memo_stats(self):
+        """
+        Returns a dict, keyed by column, of the statistics of the memoized columns (see `MemoizedModifier.stats()`).
+        """
+        stats = {}
+        for col, mod in self.functions.items():
+            if isinstance(mod, TimedModifier):
+                mod = mod.function
+            if isinstance(mod, MemoizedModifier):
+                stats[col] = mod.stats()
+        return stats
+
+    def iter_batches(self, size=DEFAULT_BATCH_SIZE):
+        """
+        Generates the rows in lists of up to `size` rows, each modified
+        column by column (see `modify_rows`), which saves a lot of Python
+        calls for modifiers supporting `call_many`. The header, if it
+        was not returned yet, is prepended to the first list, so that the
+        flattened lists hold the same rows as iterating over this object.
+
+        Rows modified concurrently keep their usual grouping: lists of
+        `batch_size` rows with `e` modifiers in batch mode, or single rows
+        with several `jobs`.
+        """
+        head = []
+        if self.header:
+            self.header = False
+            head.append(self.column_names)
+        head.extend(self.pending)
+        self.rows += len(self.pending)
+        self.pending.clear()
+
+        if self.chunks is None:
+            if self.batched:
+                size = self.batch_size
+            elif self.jobs > 1 and not self.remote:
+                size = 1
+            self.chunks = self.iter_chunks(size)
+        for rows in self.chunks:
+            self.rows += len(rows)
+            if head:
+                rows = head + rows
+                head = []
+            yield rows
+        if head:
+            yield head
+
+    def read_rows(self, size, wait=True):
+        """
+        Reads up to `size` rows from the reader, returning early once `batch_timeout` seconds have elapsed since the
+        first one arrived. Returns an empty list once the reader is exhausted. If `wait` is false and `batch_timeout`
+        is set, returns None if no row arrives within `batch_timeout` seconds.
+        """
+        if self.batch_timeout is None:
+            rows = []
+            for row in self.reader:
+                rows.append(row)
+                if len(rows) >= size:
+                    break
+            return rows
+
+        if self.queue is None:
+            self.queue = queue.Queue(2 * size)
+            thread = threading.Thread(target=self.read_ahead)
+            thread.daemon = True
+            thread.start()
+        rows = []
+        timeout = None if wait else self.batch_timeout
+        deadline = None
+        while len(rows) < size and not self.read_done:
+            if deadline is not None:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+            try:
+                row, error = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is None:
+                self.read_done = True
+                if error is not None:
+                    six.reraise(*error)
+                break
+            rows.append(row)
+            if deadline is None:
+                deadline = time.time() + self.batch_timeout
+        if not rows and not self.read_done:
+            return None
+        return rows
+
+    def read_ahead(self):
+        """
+        Reads the rows into the `queue`, in a background thread: each item is a row and None, then None and None at
+        the end, or None and the `sys.exc_info()` of the error raised by the reader.
+        """
+        put = self.queue.put
+        try:
+            for row in self.reader:
+                put((row, None))
+        except Exception:
+            put((None, sys.exc_info()))
+        else:
+            put((None, None))
+
+    def iter_chunks(self, size):
+        """
+        Generates lists of up to `size` modified rows, in input order. If `jobs` is greater than one, up to `jobs`
+        lists are modified concurrently, and each is yielded once it and all the lists before it are done.
+        """
+        if self.remote:
+            for rows in self.iter_remote(size):
+                yield rows
+            return
+        if self.jobs <= 1:
+            while True:
+                rows = self.read_rows(size)
+                if not rows:
+                    return
+                yield self.modify_rows(rows, self.pop_selected(len(rows)))
+
+        import concurrent.futures
+        executor = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        inflight = collections.deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(inflight) < self.jobs:
+                    rows = self.read_rows(size, wait=not inflight)
+                    if rows is None:
+                        # the input stalls: hand over the rows already modified first
+                        break
+                    if rows:
+                        inflight.append(executor.submit(self.modify_rows, rows, self.pop_selected(len(rows))))
+                    else:
+                        exhausted = True
+                if not inflight:
+                    return
+                yield inflight.popleft().result()
+        finally:
+            for future in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def iter_remote(self, size):
+        """
+        Generates lists of up to `size` modified rows, in input order, the columns of the `remote` modifiers being
+        modified by a pool of `processes` worker processes, with at most twice as many lists in flight, while this
+        process modifies the other columns.
+        """
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(self.processes, initializer=init_worker,
+                                                          initargs=(self.remote,))
+        inflight = collections.deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(inflight) < 2 * self.processes:
+                    rows = self.read_rows(size, wait=not inflight)
+                    if rows is None:
+                        break
+                    if not rows:
+                        exhausted = True
+                        break
+                    selected = self.pop_selected(len(rows))
+                    indices = [idx for idx, flag in enumerate(selected or [True] * len(rows)) if flag]
+                    columns = dict((col, [rows[idx][col] for idx in indices]) for col in self.remote)
+                    inflight.append((rows, selected, indices, executor.submit(call_columns, columns)))
+                if not inflight:
+                    return
+                rows, selected, indices, future = inflight.popleft()
+                rows = self.modify_rows(rows, selected, self.local_functions)
+                for col, values in future.result().items():
+                    for idx, value in zip(indices, values):
+                        rows[idx][col] = value
+                yield rows
+        finally:
+            for _, _, _, future in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def modify_rows(self, rows, selected=None, functions=None):
+        """
+        Modifies a list of rows column by column, so that modifiers supporting `call_many` see all the values of their
+        column at once. Returns the modified rows, which are new lists when most columns are modified (the rows are
+        then transposed as a whole, which is cheaper than gathering and scattering each column). If `selected` is set,
+        only the rows for which it holds a true value are modified. If `functions` is set, only its columns are
+        modified, with its functions.
+        """
+        if functions is None:
+            functions = self.functions
+        if selected is not None and not all(selected):
+            indices = [idx for idx, flag in enumerate(selected) if flag]
+            for idx, row in zip(indices, self.modify_rows([rows[idx] for idx in indices], functions=functions)):
+                rows[idx] = row
+            return rows
+        if not rows or not functions:
+            return rows
+        width = len(rows[0])
+        if 2 * len(functions) > width and all(len(row) == width for row in rows):
+            columns = list(zip(*rows))
+            for col, mod in functions.items():
+                call_many = getattr(mod, 'call_many', None)
+                columns[col] = call_many(columns[col]) if call_many else [mod(value) for value in columns[col]]
+            return [list(row) for row in zip(*columns)]
+
+        for col, mod in functions.items():
+            call_many = getattr(mod, 'call_many', None)
+            if call_many is None:
+                for row in rows:
+                    row[col] = mod(row[col])
+            else:
+                values = call_many([row[col] for row in rows])
+                for row, value in zip(rows, values):
+                    row[col] = value
+        return rows
+
+    def close(self):
+        """
+        Releases the resources held by the modifiers, such as the coprocesses started by `e` modifiers with the `c` flag.
+        """
+        if self.chunks is not None:
+            self.chunks.close()
+        for mod in self.modifiers.values():
+            if hasattr(mod, 'close'):
+                mod.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def is_remote(mod):
+    """
+    Returns whether the modifier `mod` can run in a worker process of a `CSVModifier`: whether it is a plain callable,
+    not a modifier object built from a string (whose commands, coprocesses and caches belong to this process) nor a
+    chain, and can be pickled.
+    """
+    if isinstance(mod, (Modifier, ChainModifier)):
+        return False
+    import pickle
+    try:
+        pickle.dumps(mod)
+    except Exception:
+        return False
+    return True
+
+# the modifiers of the worker processes of a `CSVModifier`, by column (see `init_worker()`)
+worker_modifiers = {}
+
+def init_worker(modifiers):
+    """
+    Initializes a worker process of a `CSVModifier`, which then runs the `modifiers` (a dict keyed by column).
+    """
+    worker_modifiers.clear()
+    worker_modifiers.update(modifiers)
+
+def call_columns(columns):
+    """
+    Runs in a worker process: returns the dict of lists of values `columns`, keyed by column, modified by the modifiers
+    of their columns.
+    """
+    results = {}
+    for col, values in columns.items():
+        mod = worker_modifiers[col]
+        call_many = getattr(mod, 'call_many', None)
+        results[col] = call_many(values) if call_many else [mod(value) for value in values]
+    return results
+
+def compile_transform(functions):
+    """
+    Given a dict of functions keyed by column, returns a function that modifies a row in place with all of them and
+    returns it. The function is generated for these specific columns, so that modifying a row only costs one Python
+    call on top of the calls to the modifiers themselves. The code generated for the same columns and chain lengths
+    is only compiled once (see `transform_cache`).
+    """
+    namespace = {}
+    lines = ['def transform(row):']
+    for col, function in functions.items():
+        # chains are unrolled into nested calls
+        steps = function.modifiers if isinstance(function, ChainModifier) else [function]
+        expression = 'row[%r]' % (col,)
+        for step in steps:
+            name = 'f%i' % len(namespace)
+            # call the bound __call__ of callable objects directly, skipping the type slot lookup
+            if not isinstance(step, (types.FunctionType, types.BuiltinFunctionType, types.MethodType)):
+                step = step.__call__
+            namespace[name] = step
+            expression = '%s(%s)' % (name, expression)
+        lines.append('    row[%r] = %s' % (col, expression))
+    lines.append('    return row')
+    source = '\n'.join(lines)
+    code = transform_cache.lookup(source)
+    if code is None:
+        code = compile(source, '<transform>', 'exec')
+        transform_cache.store(source, code)
+    exec(code, namespace)
+    return namespace['transform']
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most `maxsize` entries, which evicts the least recently used entry when full
+    and counts lookup hits and misses. Subclasses can override `load()` and `save()` to back it with another store.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key):
+        """
+        Returns the value stored for `key`, or None if there is none.
+        """
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is None:
+                value = self.load(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.insert(key, value)
+            return value
+
+    def count_hits(self, count):
+        """
+        Counts `count` more hits, for lookups answered without the cache.
+        """
+        with self.lock:
+            self.hits += count
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.insert(key, value)
+            self.save(key, value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def insert(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def load(self, key):
+        return None
+
+    def save(self, key, value):
+        pass
+
+class ExecutionCache(LRUCache):
+    """
+    A cache of `e` modifier results, keyed on the expanded command and the cell value.
+
+    :Parameters:
+
+    maxsize : int, optional, default: 10000
+
+      The maximum number of results kept in memory.
+
+    path : str, optional
+
+      If set, the results are also stored in this dbm file, and looked
+      up there when missing from memory, so that they can be reused
+      across runs. The file is created if needed.
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, path=None):
+        super(ExecutionCache, self).__init__(maxsize)
+        self.path = path
+        self.db = None
+        if path:
+            try:
+                import dbm
+            except ImportError:
+                import anydbm as dbm
+            self.db = dbm.open(path, 'c')
+
+    def db_key(self, key):
+        # keys of modifiers working on bytes (see `Modifier.as_binary()`) are stored as is, i.e. UTF-8 encoded too
+        if isinstance(key[1], bytes):
+            return b'\0'.join(key)
+        return u'\0'.join(key).encode('utf-8')
+
+    def load(self, key):
+        if self.db is None:
+            return None
+        try:
+            value = self.db[self.db_key(key)]
+        except KeyError:
+            return None
+        return value if isinstance(key[1], bytes) else value.decode('utf-8')
+
+    def save(self, key, value):
+        if self.db is not None:
+            self.db[self.db_key(key)] = value if isinstance(value, bytes) else value.encode('utf-8')
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+def is_deterministic(mod):
+    """
+    Returns whether the result of the modifier `mod` only depends on the modified value.
+    """
+    if isinstance(mod, ChainModifier):
+        return all(is_deterministic(step) for step in mod.modifiers)
+    return isinstance(mod, (SModifier, YModifier))
+
+class MemoizedModifier(object):
+    """
+    Wraps a deterministic modifier, remembering up to `maxsize` of its
+    most recent results (the oldest entry is evicted when full).
+
+    Every `window` lookups, the hit rate over the window is checked: if
+    it is below `min_hit_rate`, the remembered results are dropped and
+    the modifier is called directly from then on, so that columns with
+    many distinct values do not pay for memoization.
+
+    It can be called from several threads: the modifier is called
+    outside of the lock guarding the remembered results.
+    """
+    def __init__(self, modifier, maxsize=DEFAULT_MEMO_SIZE, window=1000, min_hit_rate=0.5):
+        self.modifier = modifier
+        self.maxsize = maxsize
+        self.window = window
+        self.min_hit_rate = min_hit_rate
+        self.entries = {}
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.window_hits = 0
+        self.window_lookups = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        if not self.enabled:
+            return self.modifier(value)
+        with self.lock:
+            result = self.entries.get(value)
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = self.modifier(value)
+        with self.lock:
+            if self.enabled:
+                entries = self.entries
+                entries[value] = result
+                if len(entries) > self.maxsize:
+                    del entries[next(iter(entries))]
+                # only misses can lower the hit rate, so there is no need to check on hits
+                if self.hits + self.misses - self.window_lookups >= self.window:
+                    self.check()
+        return result
+
+    def check(self):
+        lookups = self.hits + self.misses
+        if self.hits - self.window_hits < self.min_hit_rate * (lookups - self.window_lookups):
+            self.enabled = False
+            self.entries = {}
+        self.window_hits = self.hits
+        self.window_lookups = lookups
+
+    def stats(self):
+        """
+        Returns a dict with the `hits` and `misses` counts, the current `size` and whether memoization is still
+        `enabled`.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'enabled': self.enabled}
+
+class CachedModifier(object):
+    """
+    Wraps an `EModifier` so that its results are looked up in, and stored into, an `ExecutionCache`.
+    """
+    def __init__(self, modifier, cache):
+        self.modifier = modifier
+        self.cache = cache
+
+    def __call__(self, value):
+        command = self.modifier.expand(value)
+        if command is None:
+            return value
+        key = (command, value)
+        result = self.cache.lookup(key)
+        if result is None:
+            result = self.modifier.execute(command, value)
+            self.cache.store(key, result)
+        return result
+
+    def call_many(self, values):
+        results = list(values)
+        misses = collections.OrderedDict()
+        repeats = 0
+        for idx, value in enumerate(values):
+            command = self.modifier.expand(value)
+            if command is None:
+                continue
+            key = (command, value)
+            if key in misses:
+                # computed once for the whole batch: a hit
+                misses[key].append(idx)
+                repeats += 1
+                continue
+            result = self.cache.lookup(key)
+            if result is None:
+                misses[key] = [idx]
+            else:
+                results[idx] = result
+        if repeats:
+            self.cache.count_hits(repeats)
+
+        if misses:
+            computed = self.modifier.call_many([value for command, value in misses])
+            for (key, indices), result in zip(misses.items(), computed):
+                self.cache.store(key, result)
+                for idx in indices:
+                    results[idx] = result
+        return results
+
+class Statistics(object):
+    """
+    Statistics of a run, recorded by the `CSVModifier` objects it is
+    given to: the number of rows read and the time spent reading them,
+    the calls, changed cells and time of each modifier of each column
+    (see `TimedModifier`), and the other times added with `add_time()`
+    (`e` modifiers add the time spent running their commands as
+    "subprocess"). `report()` returns them all, with the rows per
+    second since the creation of the object.
+    """
+    def __init__(self):
+        self.started = timeit.default_timer()
+        self.rows = 0
+        self.times = collections.OrderedDict((name, 0.0) for name in ('read', 'write', 'subprocess'))
+        self.modifiers = []
+        self.reports = []
+        self.lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def timed_rows(self, rows):
+        """
+        Generates the `rows`, counting them and timing their reading.
+        """
+        rows = iter(rows)
+        clock = timeit.default_timer
+        times = self.times
+        while True:
+            start = clock()
+            row = next(rows, None)
+            # only the thread reading the rows updates this time, so there is no need to lock
+            times['read'] += clock() - start
+            if row is None:
+                return
+            self.rows += 1
+            yield row
+
+    def timed(self, function, mod, column):
+        """
+        Returns a `TimedModifier` wrapping `function`, called for the modifier `mod` of `column`.
+        """
+        timed = TimedModifier(function, column, describe_modifier(mod))
+        self.modifiers.append(timed)
+        return timed
+
+    def merge(self, report):
+        """
+        Adds the statistics of another `report()`, e.g. from another process, to those of this object.
+        """
+        with self.lock:
+            self.reports.append(report)
+
+    def report(self):
+        """
+        Returns the statistics as a dict holding the `rows` count, the elapsed `seconds` and `rows_per_s`, the `times`
+        by name in seconds, and the `modifiers` statistics as a list of dicts with the `column`, the `modifier`
+        expression, and its `calls`, `changed` and `seconds`, in the order the modifiers were first seen.
+        """
+        seconds = timeit.default_timer() - self.started
+        rows = self.rows
+        times = collections.OrderedDict(self.times)
+        modifiers = collections.OrderedDict()
+        entries = [dict(column=mod.column, modifier=mod.expression, calls=mod.calls, changed=mod.changed,
+                        seconds=mod.seconds) for mod in self.modifiers]
+        with self.lock:
+            for report in self.reports:
+                rows += report['rows']
+                for name, value in report['times'].items():
+                    times[name] = times.get(name, 0.0) + value
+                entries.extend(report['modifiers'])
+        for entry in entries:
+            key = (entry['column'], entry['modifier'])
+            if key in modifiers:
+                for name in ('calls', 'changed', 'seconds'):
+                    modifiers[key][name] += entry[name]
+            else:
+                modifiers[key] = dict(entry)
+        return dict(rows=rows, seconds=seconds, rows_per_s=rows / seconds if seconds else 0.0, times=times,
+                    modifiers=list(modifiers.values()))
+
+class TimedModifier(object):
+    """
+    Wraps the function called for a modifier, counting its calls and the values it changed, and timing them (see
+    `Statistics`).
+    """
+    def __init__(self, function, column, expression):
+        self.function = function
+        self.column = column
+        self.expression = expression
+        self.calls = 0
+        self.changed = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def batch(self):
+        return getattr(self.function, 'batch', False)
+
+    def __call__(self, value):
+        start = timeit.default_timer()
+        result = self.function(value)
+        seconds = timeit.default_timer() - start
+        with self.lock:
+            self.calls += 1
+            self.changed += result != value
+            self.seconds += seconds
+        return result
+
+    def call_many(self, values):
+        call_many = getattr(self.function, 'call_many', None)
+        start = timeit.default_timer()
+        results = call_many(values) if call_many else [self.function(value) for value in values]
+        seconds = timeit.default_timer() - start
+        changed = sum(1 for value, result in zip(values, results) if result != value)
+        with self.lock:
+            self.calls += len(values)
+            self.changed += changed
+            self.seconds += seconds
+        return results
+
+def describe_modifier(mod):
+    """
+    Returns a short description of the modifier `mod`: its expression for sed-like modifiers, or its name.
+    """
+    expression = getattr(mod, 'expression', None)
+    if expression is not None:
+        return expression
+    if isinstance(mod, ChainModifier):
+        return u'; '.join(describe_modifier(step) for step in mod.modifiers)
+    return getattr(mod, '__name__', None) or repr(mod)
+
+class Address(object):
+    """
+    Selects the rows modified by a `CSVModifier`: called with the number
+    of a row (the first row after the header being row 1) and the row,
+    returns whether the row is selected. `last` is the number of the
+    last row it can select (None if there is no such row), and `columns`
+    the indices of the cells it looks at.
+    """
+    last = None
+    columns = ()
+
+    def __call__(self, number, row):
+        raise NotImplementedError()
+
+    def as_binary(self):
+        """
+        Returns an equivalent address for rows of UTF-8 encoded bytes, or None if there is none.
+        """
+        return self
+
+class RangeAddress(Address):
+    """
+    Selects the rows `first` to `last` (to the end if None), inclusive.
+    """
+    def __init__(self, first, last=None):
+        self.first = first
+        self.last = last
+
+    def __call__(self, number, row):
+        return number >= self.first and (self.last is None or number <= self.last)
+
+class StepAddress(Address):
+    """
+    Selects every `step`-th row from row `first`, like GNU sed's "FIRST~STEP" (only row `first` if `step` is 0).
+    """
+    def __init__(self, first, step):
+        self.first = first
+        self.step = step
+        if not step:
+            self.last = first
+
+    def __call__(self, number, row):
+        if not self.step:
+            return number == self.first
+        return number >= self.first and not (number - self.first) % self.step
+
+class RegexAddress(Address):
+    """
+    Selects the rows whose cell in `column` (an index) matches the regular expression `regex` anywhere.
+    """
+    def __init__(self, column, regex):
+        self.column = column
+        self.columns = (column,)
+        self.regex = regex
+
+    def __call__(self, number, row):
+        return self.column < len(row) and self.regex.search(row[self.column]) is not None
+
+    def as_binary(self):
+        if not is_byte_safe(self.regex):
+            return None
+        return RegexAddress(self.column, re.compile(self.regex.pattern.encode('utf-8'), self.regex.flags & ~re.UNICODE))
+
+address_regex = re.compile(r'^(?:(?P<first>\d+)(?:(?P<sep>[,~])(?P<second>\d+|\$))?|(?P<column>[^/]+)/(?P<regex>.*)/(?P<flags>I?))$', re.S)
+
+def parse_address(address, column_names=None, column_offset=0):
+    """
+    Returns the `Address` described by the sed-like `address` string, one of:
+
+    * N: row N, the first row after the header being row 1
+    * FIRST,LAST: rows FIRST to LAST, inclusive; LAST can be "$" for the last row
+    * FIRST~STEP: every STEP-th row from row FIRST
+    * COLUMN/REGEX/FLAGS: the rows whose cell in COLUMN matches REGEX, case-insensitively with the "I" flag; COLUMN is
+      one of the `column_names`, or an index counted from `column_offset`
+
+    Raises `InvalidAddress` if it is none of those, or if COLUMN is not found. Without `column_names`, a COLUMN that
+    is not an index is kept as is in the `columns` of the address.
+    """
+    match = address_regex.match(address)
+    if match is None:
+        raise InvalidAddress('expected N, FIRST,LAST, FIRST~STEP or COLUMN/REGEX/, got `%s`' % address)
+    if match.group('first') is not None:
+        first, sep, second = int(match.group('first')), match.group('sep'), match.group('second')
+        if sep == '~':
+            if second == '$':
+                raise InvalidAddress('expected a number after `~` in `%s`' % address)
+            return StepAddress(first, int(second))
+        if sep == ',':
+            return RangeAddress(first, None if second == '$' else int(second))
+        return RangeAddress(first, first)
+
+    column = match.group('column')
+    if column_names is not None and column in column_names:
+        column = list(column_names).index(column)
+    elif column.isdigit() and int(column) >= column_offset:
+        column = int(column) - column_offset
+    elif column_names is not None:
+        raise InvalidAddress('unknown column `%s` in `%s`' % (column, address))
+    try:
+        regex = re.compile(match.group('regex'), re.IGNORECASE if match.group('flags') else 0)
+    except re.error as e:
+        raise InvalidAddress('%s in `%s`' % (e, address))
+    return RegexAddress(column, regex)
+
 def standardize_modifiers(column_names, modifiers):
     """
     Given modifiers in any of the permitted input forms, return a dict whose keys
@@ -119,44 +1092,79 @@ def standardize_modifiers(column_names, modifiers):
     returned dictionary will have those keys replaced with the integer position of
     that value in column_names
     """
-    try:
-        # Dictionary of modifiers
-        modifiers = dict((k, modifier_as_function(v)) for k, v in modifiers.items())
-        if not column_names:
-            return modifiers
-        p2 = {}
-        for k in modifiers:
-            if k in column_names:
-                idx = column_names.index(k)
-                if idx in modifiers:
-                    raise ColumnIdentifierError("Column %s has index %i which already has a pattern." % (k, idx))
-                p2[idx] = modifiers[k]
-            else:
-                p2[k] = modifiers[k]
-        return p2
-    except AttributeError:
+    if not hasattr(modifiers, 'items'):
         # Sequence of modifiers
-        return dict((idx, modifier_as_function(x)) for idx, x in enumerate(modifiers.values()))
+        return dict((idx, modifier_as_function(x)) for idx, x in enumerate(modifiers))
+
+    # Dictionary of modifiers
+    modifiers = dict((k, modifier_as_function(v)) for k, v in modifiers.items())
+    if not column_names:
+        return modifiers
+    p2 = {}
+    for k in modifiers:
+        if k in column_names:
+            idx = column_names.index(k)
+            if idx in modifiers:
+                from csvkit.exceptions import ColumnIdentifierError
+                raise ColumnIdentifierError("Column %s has index %i which already has a pattern." % (k, idx))
+            p2[idx] = modifiers[k]
+        else:
+            p2[k] = modifiers[k]
+    return p2
+
+# the code objects of the functions generated by `compile_transform`, by source
+transform_cache = LRUCache(DEFAULT_MODIFIER_CACHE_SIZE)
+
+# the modifier classes, by modifier type (see `register_modifier()`)
+modifier_types = collections.OrderedDict()
+
+# the modifiers built from strings by `modifier_as_function`, by string, when they can be shared (see `Modifier.shared`)
+modifier_cache = LRUCache(DEFAULT_MODIFIER_CACHE_SIZE)
+
+def register_modifier(modifier_type, modifier_class):
+    """
+    Registers `modifier_class` for the modifier strings starting with the character `modifier_type`, replacing the
+    class registered for it, if any. The class is called with the modifier string, and is typically a subclass of
+    `Modifier`. Clears the `modifier_cache`.
+    """
+    if len(modifier_type) != 1:
+        raise ValueError('modifier types are single characters, got `%s`' % modifier_type)
+    modifier_types[modifier_type] = modifier_class
+    modifier_cache.clear()
 
 def modifier_as_function(modifier):
     """
-    Given a modifier (string or callable), return a callable modifier. If the modifier is a string, return the
-    appropriate callable modifier by examinating the modifier type (first character).
+    Given a modifier (string, callable, or list or tuple of those), return a callable modifier. If the modifier is a
+    string, return the appropriate callable modifier by examinating the modifier type (first character), which must
+    have been registered with `register_modifier()`; the modifiers which can be shared are kept in the
+    `modifier_cache`, and returned again for the same string. If it is a list or tuple, return a modifier applying
+    all of them in order, combining them where possible.
     """
     # modifier is a callable modifier
     if hasattr(modifier, '__call__'):
         callable_modifier = modifier
 
+    # modifier is a chain of modifiers
+    elif isinstance(modifier, (list, tuple)):
+        if not modifier:
+            raise InvalidModifier('empty chain of modifiers')
+        callable_modifier = ChainModifier(modifier)
+        if len(callable_modifier.modifiers) == 1:
+            callable_modifier = callable_modifier.modifiers[0]
+
     # modifier is a string modifier
     else:
-        supported_modifier_types = ['s', 'y', 'e']
         if not modifier:
             raise InvalidModifier('empty modifier')
-        modifier_type = modifier[0]
-        if modifier_type not in supported_modifier_types:
-            raise InvalidModifier('unsupported type `%s` in modifier `%s`; supported modifier types are %s' % (modifier_type, modifier, ', '.join(supported_modifier_types)))
-        # perform dispatch
-        callable_modifier = eval('%sModifier' % modifier_type.upper())(modifier)
+        callable_modifier = modifier_cache.lookup(modifier)
+        if callable_modifier is None:
+            modifier_type = modifier[0]
+            if modifier_type not in modifier_types:
+                raise InvalidModifier('unsupported type `%s` in modifier `%s`; supported modifier types are %s' % (modifier_type, modifier, ', '.join(modifier_types)))
+            # perform dispatch
+            callable_modifier = modifier_types[modifier_type](modifier)
+            if getattr(callable_modifier, 'shared', False):
+                modifier_cache.store(modifier, callable_modifier)
 
     return callable_modifier
 
@@ -164,12 +1172,18 @@ class Modifier(object):
     """
     Abstract modifier class, from which all modifier classes shall inherit. Perform common checks on the supplied modifier,
     to ease the subsequent operations in subclasses.
+
+    Subclasses whose instances are not changed once built, and hold no resource, set `shared` to true: the same
+    instance is then returned for all the uses of the same modifier string (see `modifier_as_function`).
     """
+    shared = False
+
     def __init__(self, modifier):
         if len(modifier) < 4:
             raise InvalidModifier('modifier is too short: `%s`' % modifier)
 
         modifier_type = modifier[0]
+        self.expression = modifier
 
         ref_modifier_type = self.modifier_form[0] if len(self.modifier_form) > 0 else None
         if modifier_type != ref_modifier_type:
@@ -202,6 +1216,19 @@ class Modifier(object):
                 raise InvalidModifier(message)
         self.modifier_flags = flags
 
+    def call_many(self, values):
+        """
+        Applies the modifier to a list of values and returns the list of results.
+        """
+        return [self(value) for value in values]
+
+    def as_binary(self):
+        """
+        Returns an equivalent modifier working on UTF-8 encoded bytes instead of text, or None if the modifier could
+        give different results on bytes.
+        """
+        return None
+
 class SModifier(Modifier):
     """
     The "substitution" modifier ("s/REGEX/REPL/FLAGS").
@@ -222,6 +1249,8 @@ class SModifier(Modifier):
       is used consistently and not used within the modifier,
       e.g. ``s|a|b|`` is equivalent to ``s/a/b/``.
     """
+    shared = True
+
     def __init__(self, modifier):
         self.modifier_form = 's/REGEX/REPL/FLAGS'
         self.supported_flags = ['i', 'g', 'l', 'm', 's', 'u', 'x']
@@ -236,14 +1265,232 @@ class SModifier(Modifier):
 
         try:
             self.regex = re.compile(self.modifier_lhs, re_flags)
-        except re.error as e:
-            raise InvalidModifier('%s in `%s`' % (e.message, modifier))
+            # checked here, as the cells that cannot match never get to `regex.sub`
+            sre_parse.parse_template(self.repl, self.regex)
+        except (re.error, IndexError) as e:
+            raise InvalidModifier('%s in `%s`' % (e, modifier))
 
         self.count = 0 if 'g' in self.modifier_flags else 1
+        self.newline = u'\n'
+
+        self.literal = None
+        if not set('ilx') & set(self.modifier_flags) and '\\' not in self.repl:
+            self.literal = split_literal(self.modifier_lhs, multiline='m' in self.modifier_flags)
+        self.prepare()
+
+    def prepare(self):
+        """
+        Picks the cheapest way of computing the same result as `regex.sub`.
+        """
+        self.required = None
+        if self.literal is not None:
+            self.substitute = self.literal_substitute
+            start, literal, end = self.literal
+            if not (start or end):
+                # the most common case gets a closure, to save attribute lookups
+                repl, count = self.repl, self.count or -1
+                self.substitute = lambda value: value.replace(literal, repl, count)
+        else:
+            self.required = required_substring(self.regex)
+            self.substitute = self.checked_substitute if self.required else self.regex_substitute
+
+    def as_binary(self):
+        if not is_byte_safe(self.regex):
+            return None
+        binary = copy.copy(self)
+        binary.regex = re.compile(self.regex.pattern.encode('utf-8'), self.regex.flags & ~re.UNICODE)
+        binary.repl = self.repl.encode('utf-8')
+        binary.newline = b'\n'
+        if self.literal is not None:
+            start, literal, end = self.literal
+            binary.literal = (start, literal.encode('utf-8'), end)
+        binary.prepare()
+        if binary.required and len(binary.required) == 1:
+            # membership tests on bytes are much faster with an int needle
+            binary.required = binary.required[0]
+        return binary
 
     def __call__(self, value):
+        return self.substitute(value)
+
+    def regex_substitute(self, value):
         return self.regex.sub(self.repl, value, count=self.count)
 
+    def call_many(self, values):
+        if self.literal is not None:
+            substitute = self.substitute
+            return [substitute(value) for value in values]
+        sub, repl, count, required = self.regex.sub, self.repl, self.count, self.required
+        if required:
+            return [sub(repl, value, count) if required in value else value for value in values]
+        return [sub(repl, value, count) for value in values]
+
+    def checked_substitute(self, value):
+        # cells that do not contain the required substring cannot match
+        if self.required not in value:
+            return value
+        return self.regex.sub(self.repl, value, count=self.count)
+
+    def literal_substitute(self, value):
+        start, literal, end = self.literal
+        if start and end:
+            if value == literal:
+                return self.repl
+            if value == literal + self.newline:
+                return self.repl + self.newline
+            return value
+        if start:
+            if value.startswith(literal):
+                return self.repl + value[len(literal):]
+            return value
+        if end:
+            # like "$", also match right before a trailing new line
+            if value.endswith(literal):
+                return value[:-len(literal)] + self.repl
+            if value.endswith(literal + self.newline):
+                return value[:-len(literal) - 1] + self.repl + self.newline
+            return value
+        return value.replace(literal, self.repl, self.count or -1)
+
+regex_metacharacters = '.^$*+?{}[]|()'
+
+def split_literal(pattern, multiline=False):
+    """
+    If the regular expression `pattern` only matches a fixed, non-empty
+    string, optionally anchored at the start ("^") and/or at the end
+    ("$") of the value, returns a (start, literal, end) tuple, where
+    `start` and `end` tell whether the corresponding anchor is used.
+    Otherwise, returns None. Escaped punctuation (e.g. "\\.") is
+    treated as literal, any other escape sequence is not.
+
+    Anchors are not supported in `multiline` mode, nor together with a
+    literal containing a new line, since "$" can also match right
+    before a trailing new line.
+    """
+    start = pattern.startswith('^')
+    idx = 1 if start else 0
+    end = False
+    chars = []
+    while idx < len(pattern):
+        c = pattern[idx]
+        idx += 1
+        if c == '\\':
+            if idx == len(pattern) or pattern[idx].isalnum() or pattern[idx] == '_' or ord(pattern[idx]) > 127:
+                return None
+            c = pattern[idx]
+            idx += 1
+        elif c == '$' and idx == len(pattern):
+            end = True
+            continue
+        elif c in regex_metacharacters:
+            return None
+        chars.append(c)
+
+    literal = ''.join(chars)
+    if not literal:
+        return None
+    if (start or end) and (multiline or '\n' in literal):
+        return None
+    return start, literal, end
+
+def required_substring(regex):
+    """
+    Returns the longest literal string that every match of the compiled `regex` contains, or an empty string if none
+    was found. Only literals outside of alternations and optional repetitions are considered, and case-insensitive
+    patterns have none.
+    """
+    if regex.flags & re.IGNORECASE:
+        return regex.pattern[:0]
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return regex.pattern[:0]
+
+    runs = [[]]
+    def visit(items):
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                runs[-1].append(av)
+                continue
+            runs.append([])
+            if op is sre_parse.SUBPATTERN and not (len(av) == 4 and av[1] & re.IGNORECASE):
+                visit(av[-1])
+                runs.append([])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+                visit(av[2])
+                runs.append([])
+    visit(parsed)
+
+    longest = max(runs, key=len)
+    if isinstance(regex.pattern, bytes):
+        return bytes(bytearray(longest))
+    return u''.join(six.unichr(c) for c in longest)
+
+def is_byte_safe(regex):
+    """
+    Returns whether the compiled text `regex`, once encoded in UTF-8, finds the same matches in UTF-8 encoded values
+    as it does in the values themselves. This is checked conservatively: the pattern may only use literals, classes of
+    ASCII characters, anchors (but not word boundaries), groups, alternations, back-references and repetitions, where
+    "." is only allowed in greedy open-ended repetitions such as ".*" or ".+" that end the pattern or are followed by a
+    literal or an anchor, so that they cannot stop within a multi-byte character. Patterns matching case-insensitively
+    or depending on the locale are not byte-safe.
+    """
+    if regex.flags & (re.IGNORECASE | re.LOCALE):
+        return False
+    try:
+        # check the encoded pattern, in which a multi-byte character is a sequence of byte literals
+        parsed = sre_parse.parse(regex.pattern.encode('utf-8'), regex.flags & ~re.UNICODE)
+    except Exception:
+        return False
+
+    def safe_class(items):
+        return all((op is sre_parse.LITERAL and av < 128) or (op is sre_parse.RANGE and av[1] < 128)
+                   for op, av in items)
+
+    def safe(items, follow=None):
+        # `follow` is the op of the item following `items`, None at the end of the pattern
+        items = list(items)
+        for idx, (op, av) in enumerate(items):
+            following = items[idx + 1][0] if idx + 1 < len(items) else follow
+            if op is sre_parse.LITERAL or op is sre_parse.GROUPREF:
+                continue
+            if op is sre_parse.AT:
+                if av in (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY):
+                    return False
+            elif op is sre_parse.IN:
+                if not safe_class(av):
+                    return False
+            elif op is sre_parse.SUBPATTERN:
+                if len(av) == 4 and av[1] & (re.IGNORECASE | re.LOCALE):
+                    return False
+                if not safe(av[-1], following):
+                    return False
+            elif op is sre_parse.BRANCH:
+                if not all(safe(branch, following) for branch in av[1]):
+                    return False
+            elif op is sre_parse.GROUPREF_EXISTS:
+                if not all(safe(branch, following) for branch in av[1:] if branch is not None):
+                    return False
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                low, high, body = av
+                body = list(body)
+                if len(body) == 1 and body[0][0] is sre_parse.ANY:
+                    if op is not sre_parse.MAX_REPEAT or high != sre_parse.MAXREPEAT or low > 1:
+                        return False
+                    # another repetition could take the bytes it gives back
+                    if following not in (None, sre_parse.LITERAL, sre_parse.AT):
+                        return False
+                elif len(body) == 1 and body[0][0] is sre_parse.LITERAL and body[0][1] > 127:
+                    # only the last byte of a multi-byte character is repeated
+                    return False
+                elif not safe(body, op):
+                    return False
+            else:
+                return False
+        return True
+
+    return safe(parsed)
+
 def cranges(pattern):
     """
     Given a pattern, expands it to a range of characters (crange).
@@ -292,6 +1539,8 @@ class YModifier(Modifier):
       is used consistently and not used within the modifier,
       e.g. ``s|a|b|`` is equivalent to ``s/a/b/``.
     """
+    shared = True
+
     def __init__(self, modifier):
         self.modifier_form = 'y/SRC/DST/FLAGS'
         self.supported_flags = ['i']
@@ -301,7 +1550,7 @@ class YModifier(Modifier):
         dst = cranges(self.modifier_rhs)
 
         if len(src) != len(dst):
-            raise InvalidModifier('expecting source and destination to have the same length, but %i != %i, got `%s`' % (src, dst, modifier))
+            raise InvalidModifier('expecting source and destination to have the same length, but %i != %i, got `%s`' % (len(src), len(dst), modifier))
 
         if 'i' in self.modifier_flags:
             src = src.lower() + src.upper()
@@ -312,6 +1561,92 @@ class YModifier(Modifier):
     def __call__(self, value):
         return value.translate(self.table)
 
+    def call_many(self, values):
+        table = self.table
+        return [value.translate(table) for value in values]
+
+    def as_binary(self):
+        # only ASCII characters are single bytes in UTF-8
+        if any(src > 127 or dst > 127 for src, dst in self.table.items()):
+            return None
+        binary = copy.copy(self)
+        binary.table = bytes(bytearray(self.table.get(byte, byte) for byte in range(256)))
+        return binary
+
+    def is_identity(self):
+        return all(src == dst for src, dst in self.table.items())
+
+    def fuse(self, other):
+        """
+        Returns a modifier equivalent to applying this modifier, then the `YModifier` `other`, with a single
+        translation table.
+        """
+        fused = copy.copy(self)
+        fused.expression = u'%s; %s' % (self.expression, other.expression)
+        fused.table = {}
+        for src in set(self.table) | set(other.table):
+            dst = self.table.get(src, src)
+            fused.table[src] = other.table.get(dst, dst)
+        return fused
+
+class ChainModifier(object):
+    """
+    Applies a sequence of modifiers (strings, callables or modifier objects) in order.
+
+    Adjacent `y` modifiers are fused into a single translation table, and `y` modifiers translating each character to
+    itself are dropped.
+    """
+    def __init__(self, modifiers):
+        self.modifiers = []
+        for mod in modifiers:
+            mod = modifier_as_function(mod)
+            if isinstance(mod, ChainModifier):
+                for step in mod.modifiers:
+                    self.append(step)
+            else:
+                self.append(mod)
+
+    def append(self, mod):
+        if isinstance(mod, YModifier):
+            if self.modifiers and isinstance(self.modifiers[-1], YModifier):
+                mod = self.modifiers.pop().fuse(mod)
+            if mod.is_identity():
+                return
+        self.modifiers.append(mod)
+
+    @property
+    def batch(self):
+        return any(getattr(mod, 'batch', False) for mod in self.modifiers)
+
+    def __call__(self, value):
+        for mod in self.modifiers:
+            value = mod(value)
+        return value
+
+    def call_many(self, values):
+        for mod in self.modifiers:
+            call_many = getattr(mod, 'call_many', None)
+            if call_many is None:
+                values = [mod(value) for value in values]
+            else:
+                values = call_many(values)
+        return values
+
+    def as_binary(self):
+        steps = [mod.as_binary() if hasattr(mod, 'as_binary') else None for mod in self.modifiers]
+        if None in steps:
+            return None
+        binary = copy.copy(self)
+        binary.modifiers = steps
+        return binary
+
+    def close(self):
+        for mod in self.modifiers:
+            if hasattr(mod, 'close'):
+                mod.close()
+
+backreference_regex = re.compile(r'\\([1-9]|g<)')
+
 class EModifier(Modifier):
     """
     The "execute" external program modifier ("s/REGEX/COMMAND/FLAGS").
@@ -329,13 +1664,29 @@ class EModifier(Modifier):
       * u: enables unicode escape sequences
       * x: `REGEX` uses verbose descriptors & comments
 
+      The following flags control how `COMMAND` is run:
+
+      * c: coprocess mode -- `COMMAND` is started once, on the first
+        matching cell, and kept alive until `close()` is called. Each
+        matching cell is written to its standard input followed by the
+        record separator, and one record is read back from its standard
+        output as the result. `COMMAND` must flush its output after each
+        record and cannot use back-references.
+      * b: batch mode -- `call_many()` runs `COMMAND` once for all the
+        matching cells it is given (once per distinct command when
+        back-references are used), writing them to its standard input
+        each followed by the record separator, and splits its standard
+        output back into one record per cell.
+      * z: use NUL instead of new line as the coprocess or batch record
+        separator
+
     Note that the "/" character can be any character as long as it
     is used consistently and not used within the modifier,
     e.g. ``s|a|b|`` is equivalent to ``s/a/b/``.
     """
     def __init__(self, modifier):
         self.modifier_form = 'e/REGEX/COMMAND/FLAGS'
-        self.supported_flags = ['i', 'l', 'm', 's', 'u', 'x']
+        self.supported_flags = ['i', 'l', 'm', 's', 'u', 'x', 'c', 'b', 'z']
         super(EModifier, self).__init__(modifier)
 
         re_flags = 0
@@ -345,27 +1696,233 @@ class EModifier(Modifier):
         try:
             self.regex = re.compile(self.modifier_lhs, re_flags)
         except re.error as e:
-            raise InvalidModifier('%s in `%s`' % (e.message, modifier))
+            raise InvalidModifier('%s in `%s`' % (e, modifier))
 
         self.command = self.modifier_rhs
 
+        self.coprocess = 'c' in self.modifier_flags
+        if self.coprocess and backreference_regex.search(self.command):
+            raise InvalidModifier('back-references are not supported with the `c` flag in `%s`' % modifier)
+        self.batch = 'b' in self.modifier_flags
+        if self.batch and self.coprocess:
+            raise InvalidModifier('flags `b` and `c` cannot be combined in `%s`' % modifier)
+        self.separator = '\0' if 'z' in self.modifier_flags else '\n'
+        self.binary = False
+        # the `Statistics` recording the time spent running commands, if any (see `CSVModifier`)
+        self.stats = None
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def as_binary(self):
+        if not is_byte_safe(self.regex):
+            return None
+        binary = copy.copy(self)
+        binary.regex = re.compile(self.regex.pattern.encode('utf-8'), self.regex.flags & ~re.UNICODE)
+        # back-references expand into the command, which is then bytes too
+        binary.command = self.command.encode('utf-8')
+        binary.binary = True
+        binary.proc = None
+        binary.lock = threading.Lock()
+        return binary
+
+    def encode(self, value):
+        return value if self.binary else value.encode('utf-8')
+
+    def result(self, out):
+        """
+        Returns the result of a command given its output `out`, stripped of new lines.
+        """
+        if self.binary:
+            return out.replace(b'\n', b'')
+        return out.decode('utf-8').replace('\n', '')
+
     def __call__(self, value):
-        match = self.regex.match(value)
-        if not match:
+        command = self.expand(value)
+        if command is None:
             return value
+        return self.execute(command, value)
 
-        command = match.expand(self.command)
-
+    def expand(self, value):
+        """
+        Returns the command run for `value`, or None if `value` does not match `REGEX`.
+        """
+        match = self.regex.match(value)
+        if not match:
+            return None
+        if self.coprocess:
+            return self.command
+        return match.expand(self.command)
+
+    def execute(self, command, value):
+        """
+        Runs `command`, as returned by `expand()`, for the matching cell `value` and returns the result.
+        """
+        if self.coprocess:
+            return self.communicate(value)
+
+        if self.batch:
+            return self.execute_batch(command, [value])[0]
+
+        import subprocess
+        start = self.start_timer()
         proc = subprocess.Popen(
             command, shell=True,
             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-        out, err = proc.communicate(value.encode('utf-8'))
-        out = out.decode('utf-8')
-        err = err.decode('utf-8')
+        out, err = proc.communicate(self.encode(value))
+        self.stop_timer(start)
         if proc.returncode != 0:
-            sys.stderr.write('command `%s` failed: %s' % (command, err))
-            sys.exit(1)
+            self.fail(command, err.decode('utf-8'))
+        return self.result(out)
+
+    def call_many(self, values):
+        if not self.batch:
+            return super(EModifier, self).call_many(values)
+
+        results = list(values)
+        batches = collections.OrderedDict()
+        for idx, value in enumerate(values):
+            command = self.expand(value)
+            if command is not None:
+                batches.setdefault(command, []).append(idx)
+
+        for command, indices in batches.items():
+            outs = self.execute_batch(command, [values[idx] for idx in indices])
+            for idx, out in zip(indices, outs):
+                results[idx] = out
+        return results
+
+    def execute_batch(self, command, values):
+        """
+        Runs `command` once over all `values` and returns one result per value.
+        """
+        separator = self.separator.encode('utf-8')
+        data = []
+        for value in values:
+            encoded = self.encode(value)
+            if separator in encoded:
+                self.fail(command, 'cell contains the record separator: %r\n' % value)
+            data.append(encoded + separator)
+
+        import subprocess
+        start = self.start_timer()
+        proc = subprocess.Popen(
+            command, shell=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-        out = out.replace('\n', '')
-        return out
\ No newline at end of file
+        out, err = proc.communicate(b''.join(data))
+        self.stop_timer(start)
+        if proc.returncode != 0:
+            self.fail(command, err.decode('utf-8'))
+
+        if out.endswith(separator):
+            out = out[:-len(separator)]
+        records = out.split(separator)
+        if len(records) != len(values):
+            self.fail(command, 'expected %i output records, got %i\n' % (len(values), len(records)))
+
+        return [self.result(record) for record in records]
+
+    def start_timer(self):
+        return timeit.default_timer() if self.stats is not None else None
+
+    def stop_timer(self, start):
+        if start is not None:
+            self.stats.add_time('subprocess', timeit.default_timer() - start)
+
+    def fail(self, command, err):
+        if isinstance(command, bytes):
+            command = command.decode('utf-8', 'replace')
+        sys.stderr.write('command `%s` failed: %s' % (command, err))
+        sys.exit(1)
+
+    def communicate(self, value):
+        """
+        Sends `value` to the coprocess, starting it if needed, and returns the record it writes back.
+        """
+        separator = self.separator.encode('utf-8')
+        data = self.encode(value)
+        if separator in data:
+            self.fail(self.command, 'cell contains the record separator: %r\n' % value)
+
+        with self.lock:
+            start = self.start_timer()
+            if self.proc is None:
+                import subprocess
+                import tempfile
+                self.buffer = b''
+                self.errors = tempfile.TemporaryFile()
+                self.proc = subprocess.Popen(
+                    self.command, shell=True,
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.errors)
+                # written by `exchange`, as much as the pipe takes at a time
+                os.set_blocking(self.proc.stdin.fileno(), False)
+
+            if not self.exchange(data + separator, separator):
+                self.terminate()
+                self.fail(self.command, 'coprocess exited before answering\n')
+            out, self.buffer = self.buffer.split(separator, 1)
+            self.stop_timer(start)
+
+        return self.result(out)
+
+    def exchange(self, data, separator):
+        """
+        Writes `data` to the coprocess while reading its output into the buffer, so that neither of them blocks on a
+        full pipe, until all of `data` is written and the buffer holds a record. Returns False if the coprocess exited
+        before that.
+        """
+        import selectors
+        stdin, stdout = self.proc.stdin.fileno(), self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(stdin, selectors.EVENT_WRITE)
+            selector.register(stdout, selectors.EVENT_READ)
+            while data or separator not in self.buffer:
+                for key, _ in selector.select():
+                    if key.fd == stdout:
+                        chunk = os.read(stdout, 65536)
+                        if not chunk:
+                            return False
+                        self.buffer += chunk
+                        continue
+                    try:
+                        data = data[os.write(stdin, data):]
+                    except BlockingIOError:
+                        continue
+                    except (IOError, OSError):
+                        # the coprocess went away; report it through the end of its output
+                        data = b''
+                    if not data:
+                        selector.unregister(stdin)
+        return True
+
+    def terminate(self):
+        """
+        Closes the standard input of the coprocess and waits for it, failing if it exited with a non-zero status.
+        """
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        proc.stdout.read()
+        proc.stdout.close()
+        returncode = proc.wait()
+        self.errors.seek(0)
+        err = self.errors.read().decode('utf-8')
+        self.errors.close()
+        if returncode != 0:
+            self.fail(self.command, err)
+
+    def close(self):
+        """
+        Shuts down the coprocess, if any. The modifier can still be used afterwards, in which case a new coprocess
+        will be started.
+        """
+        with self.lock:
+            if self.proc is not None:
+                self.terminate()
+
+register_modifier('s', SModifier)
+register_modifier('y', YModifier)
+register_modifier('e', EModifier)
@@ -6,21 +6,110 @@ try:
 except ImportError:
     import unittest
 
+import bz2
+import codecs
+import io
+import json
+import os
+import pickle
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
 import agate
 import six
 
-from csvsed.sed import CSVModifier, cranges, modifier_as_function
+from csvsed import bench, compress
+from csvsed.cli import CSVSed
+from csvsed.main import is_simple, launch_new_instance, make_parser
+from csvsed.frame import modify_frame, modify_records
+from csvsed.output import BufferedOutput, default_flush_interval
+from csvsed.mapped import MappedFile, iter_blocks, map_file
+from csvsed.parallel import ParallelModifier, iter_ranges
+from csvsed.progress import Checkpoint, CheckpointError, Progress, RecordInput, record_regex
+from csvsed.raw import RawModifier, binary_modifier, iter_records
+try:
+    import pandas
+except ImportError:
+    pandas = None
+try:
+    import asyncio
+    from csvsed import aio
+except (ImportError, SyntaxError):
+    # Python 2
+    aio = None
+from csvsed.sed import ChainModifier, CSVModifier, ExecutionCache, InvalidAddress, InvalidModifier, MemoizedModifier, Modifier, RangeAddress, Statistics, compile_transform, cranges, is_byte_safe, modifier_as_function, modifier_cache, modifier_types, parse_address, register_modifier
 
-def run(source, modifiers, header=True):
+def run(source, modifiers, header=True, **kwargs):
     src = six.StringIO(source)
     dst = six.StringIO()
     reader = agate.csv.reader(src)
-    reader = CSVModifier(reader, modifiers, header=header)
+    reader = CSVModifier(reader, modifiers, header=header, **kwargs)
     writer = agate.csv.writer(dst)
     for row in reader:
         writer.writerow(row)
     return dst.getvalue()
 
+def run_cli(args, error_file=None, output_file=None):
+    dst = output_file or six.StringIO()
+    # csvkit restores the default SIGPIPE handler, which would kill the test run on the next broken pipe
+    sigpipe = signal.getsignal(signal.SIGPIPE)
+    try:
+        CSVSed(args, output_file=dst, error_file=error_file or six.StringIO()).run()
+    finally:
+        signal.signal(signal.SIGPIPE, sigpipe)
+    return dst.getvalue() if output_file is None else None
+
+def launch(args):
+    dst = six.StringIO()
+    sigpipe, excepthook = signal.getsignal(signal.SIGPIPE), sys.excepthook
+    try:
+        launch_new_instance(args, output_file=dst)
+    finally:
+        signal.signal(signal.SIGPIPE, sigpipe)
+        sys.excepthook = excepthook
+    return dst.getvalue()
+
+def checksum(value):
+    # a picklable modifier, as run by worker processes
+    if value == u'boom':
+        raise ValueError(value)
+    return u'%s:%i' % (value, sum(ord(char) for char in value) % 97)
+
+class AsyncRows(object):
+    # an async row source, written without the async syntax so that this module still compiles on Python 2
+    def __init__(self, rows):
+        self.rows = iter(rows)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        for row in self.rows:
+            return asyncio.sleep(0, result=row)
+        raise StopAsyncIteration
+
+def run_async(reader):
+    loop = asyncio.new_event_loop()
+    rows = []
+    try:
+        while True:
+            try:
+                rows.append(loop.run_until_complete(reader.__anext__()))
+            except StopAsyncIteration:
+                break
+    finally:
+        try:
+            loop.run_until_complete(reader.aclose())
+        finally:
+            loop.close()
+    return rows
+
 class TestSed(unittest.TestCase):
 
     baseCSV = """\
@@ -253,4 +342,1280 @@ b,B,"{first : b, last : a}",β,Β,"{first : β, last : α}"
 g,G,"{first : g, last : a}",γ,Γ,"{first : γ, last : α}"
 """
         self.assertMultiLineEqual(
-            run(self.baseCSVUnicode, {i: u'e/^(.).*(.)$/echo "{first : \\1, last : \\2}"/' for i in range(6)}), chk)
\ No newline at end of file
+            run(self.baseCSVUnicode, {i: u'e/^(.).*(.)$/echo "{first : \\1, last : \\2}"/' for i in range(6)}), chk)
+
+    def test_modifier_e_coprocess(self):
+        mod = modifier_as_function(u'e/^[^0-9]/while read -r l; do echo "$l$l"; done/c')
+        try:
+            self.assertEqual(mod(u'ab'), u'abab')
+            self.assertEqual(mod(u'1b'), u'1b')
+            pid = mod.proc.pid
+            self.assertEqual(mod(u'άλφα'), u'άλφαάλφα')
+            self.assertEqual(mod.proc.pid, pid)
+        finally:
+            mod.close()
+        self.assertIsNone(mod.proc)
+
+    def test_modifier_e_coprocess_large(self):
+        # larger than the pipe buffers: cat writes its output back while the cell is still being written
+        mod = modifier_as_function(u'e/./cat/c')
+        try:
+            value = u'ab' * 100000
+            self.assertEqual(mod(value), value)
+            self.assertEqual(mod(u'c'), u'c')
+        finally:
+            mod.close()
+
+    def test_modifier_e_coprocess_nul(self):
+        mod = modifier_as_function(u'e/./xargs -0 -n1 printf "%s!\\0"/cz')
+        try:
+            self.assertEqual(mod(u'a\nb'), u'ab!')
+            self.assertEqual(mod(u'c'), u'c!')
+        finally:
+            mod.close()
+
+    def test_modifier_e_coprocess_csv(self):
+        chk = """\
+header 1,header 2,header 3,header 4,header 5
+field 1.1,field 1.2,field 1.3,FIELD 1.4,field 1.5
+field 2.1,field 2.2,field 2.3,FIELD 2.4,field 2.5
+field 3.1,field 3.2,field 3.3,FIELD 3.4,field 3.5
+"""
+        self.assertMultiLineEqual(
+            run(self.baseCSV, {3: u'e/./while read -r l; do echo "$l" | tr a-z A-Z; done/c'}), chk)
+
+    def test_modifier_e_coprocess_failure(self):
+        mod = modifier_as_function(u'e/./cat; exit 3/c')
+        self.assertEqual(mod(u'a'), u'a')
+        self.assertRaises(SystemExit, mod.close)
+        mod = modifier_as_function(u'e/./exit 3/c')
+        self.assertRaises(SystemExit, mod, u'a')
+        mod = modifier_as_function(u'e/./cat/c')
+        try:
+            self.assertRaises(SystemExit, mod, u'a\nb')
+        finally:
+            mod.close()
+
+    def test_modifier_e_coprocess_backref(self):
+        self.assertRaises(InvalidModifier, modifier_as_function, u'e/(.)/echo \\1/c')
+
+    def test_modifier_e_batch(self):
+        mod = modifier_as_function(u'e|^[^0-9]|sed "s/.*/<&>/"|b')
+        self.assertEqual(mod.call_many([u'a', u'1', u'βήτα', u'c']), [u'<a>', u'1', u'<βήτα>', u'<c>'])
+        self.assertEqual(mod(u'a'), u'<a>')
+        self.assertEqual(mod.call_many([]), [])
+
+    def test_modifier_e_batch_backref(self):
+        mod = modifier_as_function(u'e|^(.)|sed "s/^/\\1:/"|b')
+        self.assertEqual(mod.call_many([u'ab', u'ba', u'ac']), [u'a:ab', u'b:ba', u'a:ac'])
+
+    def test_modifier_e_batch_nul(self):
+        mod = modifier_as_function(u'e/./xargs -0 printf "%s!\\\\0"/bz')
+        self.assertEqual(mod.call_many([u'a\nb', u'c']), [u'ab!', u'c!'])
+
+    def test_modifier_e_batch_failure(self):
+        self.assertRaises(SystemExit, modifier_as_function(u'e/./head -n 1/b').call_many, [u'a', u'b'])
+        self.assertRaises(SystemExit, modifier_as_function(u'e/./cat; exit 2/b').call_many, [u'a'])
+        self.assertRaises(InvalidModifier, modifier_as_function, u'e/./cat/bc')
+
+    def test_modifier_e_batch_csv(self):
+        chk = """\
+header 1,header 2,header 3,header 4,header 5
+field 1.1,field 1.2,field 1.3,FIELD 1.4,field 1.5
+field 2.1,field 2.2,field 2.3,FIELD 2.4,field 2.5
+field 3.1,field 3.2,field 3.3,FIELD 3.4,field 3.5
+"""
+        for batch_size in (1, 2, 10):
+            src = six.StringIO(self.baseCSV)
+            reader = CSVModifier(agate.csv.reader(src), {3: u'e/./tr a-z A-Z/b', 0: u's/x/y/'}, batch_size=batch_size)
+            dst = six.StringIO()
+            agate.csv.writer(dst).writerows(reader)
+            self.assertMultiLineEqual(dst.getvalue(), chk)
+
+    def test_modifier_e_batch_timeout(self):
+        # a partial batch is handed over on time while the input stalls
+        for jobs in (1, 2):
+            resume = threading.Event()
+            def rows():
+                yield [u'name']
+                yield [u'a']
+                yield [u'b']
+                resume.wait(10)
+                yield [u'c']
+            reader = CSVModifier(rows(), {0: u'e/./tr a-z A-Z/b'}, batch_size=10, batch_timeout=0.05, jobs=jobs)
+            with reader:
+                self.assertEqual(next(reader), [u'name'])
+                start = time.time()
+                self.assertEqual([next(reader), next(reader)], [[u'A'], [u'B']])
+                self.assertTrue(time.time() - start < 5)
+                resume.set()
+                self.assertEqual(list(reader), [[u'C']])
+
+        # errors of the reader are raised as usual
+        def failing():
+            yield [u'name']
+            yield [u'a']
+            raise ValueError('bad row')
+        reader = CSVModifier(failing(), {0: u'e/./tr a-z A-Z/b'}, batch_size=10, batch_timeout=0.05)
+        with reader:
+            self.assertRaises(ValueError, list, reader)
+
+    def test_jobs(self):
+        src = ''.join('%i,%i\n' % (i, i) for i in range(50))
+        chk = ''.join('%i,%i\n' % (i, i * 2) for i in range(50))
+        for modifier in (u'e/./read n; sleep 0.0$((n % 3)); echo $((n * 2))/',
+                         u'e/./while read n; do echo $((n * 2)); done/b'):
+            for batch_size in (1, 7):
+                reader = CSVModifier(agate.csv.reader(six.StringIO(src)), {1: modifier}, header=False,
+                                     batch_size=batch_size, jobs=4)
+                dst = six.StringIO()
+                with reader:
+                    agate.csv.writer(dst).writerows(reader)
+                self.assertMultiLineEqual(dst.getvalue(), chk)
+
+    def test_jobs_failure(self):
+        src = ''.join('%i\n' % i for i in range(20))
+        reader = CSVModifier(agate.csv.reader(six.StringIO(src)), {0: u'e/^13$/exit 1/'}, header=False, jobs=4)
+        with reader:
+            self.assertEqual(next(reader), ['0'])
+            self.assertRaises(SystemExit, list, reader)
+
+    def test_modifier_e_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            log = os.path.join(tmpdir, 'log')
+            src = 'a\nb\na\nc\nb\na\n'
+            chk = 'A\nB\nA\nC\nB\nA\n'
+            for flags, kwargs, misses, hits, runs in (('', {}, 5, 1, 5), ('b', {'batch_size': 4}, 4, 2, 2)):
+                open(log, 'w').close()
+                cache = ExecutionCache(2)
+                modifier = u'e#.#echo run >> %s; tr a-z A-Z#%s' % (log, flags)
+                self.assertMultiLineEqual(run(src, {0: modifier}, header=False, cache=cache, **kwargs), chk)
+                self.assertEqual((cache.misses, cache.hits), (misses, hits))
+                self.assertEqual(len(open(log).read().split()), runs)
+                self.assertEqual(len(cache), 2)
+            # every lookup is a hit or a miss, including the repeats within a batch
+            cache = ExecutionCache()
+            src = ''.join('%i\n' % (idx % 5) for idx in range(30))
+            self.assertMultiLineEqual(run(src, {0: u'e/.*/cat/b'}, header=False, cache=cache, batch_size=30), src)
+            self.assertEqual((cache.hits, cache.misses), (25, 5))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_modifier_e_cache_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            log = os.path.join(tmpdir, 'log')
+            path = os.path.join(tmpdir, 'cache')
+            modifier = u'e#.#echo run >> %s; tr a-z A-Z#' % log
+            open(log, 'w').close()
+            cache = ExecutionCache(path=path)
+            self.assertMultiLineEqual(run('a\nb\na\n', {0: modifier}, header=False, cache=cache), 'A\nB\nA\n')
+            cache.close()
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+            cache = ExecutionCache(path=path)
+            self.assertMultiLineEqual(run('b\na\n', {0: modifier}, header=False, cache=cache), 'B\nA\n')
+            cache.close()
+            self.assertEqual((cache.hits, cache.misses), (2, 0))
+            self.assertEqual(len(open(log).read().split()), 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_modifier_chain(self):
+        mod = modifier_as_function([u's/,//g', u'y/a-z/A-Z/', u'y/A/4/', u'y/4/a/', u's/^(.)/<\\1>/', len])
+        self.assertIsInstance(mod, ChainModifier)
+        self.assertEqual(len(mod.modifiers), 4)
+        self.assertEqual(mod.modifiers[1].table[ord(u'a')], ord(u'a'))
+        self.assertEqual(mod.modifiers[1].table[ord(u'A')], ord(u'a'))
+        self.assertEqual(mod.modifiers[1].table[ord(u'b')], ord(u'B'))
+        self.assertEqual(mod(u'a,b,c'), 5)
+        self.assertEqual(mod.call_many([u'a,b,c', u'']), [5, 0])
+        self.assertEqual(modifier_as_function([u'y/ab/ba/', u'y/ab/ba/']).modifiers, [])
+        self.assertEqual(modifier_as_function([u'y/ab/ba/', u'y/ab/ba/'])(u'abc'), u'abc')
+        self.assertEqual(modifier_as_function([u'y/a/b/', [u'y/b/c/', u'y/c/d/']])(u'abc'), u'ddd')
+        self.assertRaises(InvalidModifier, modifier_as_function, [])
+
+    def test_modifier_chain_csv(self):
+        chk = """\
+header 1,header 2,header 3,header 4,header 5
+FIELD-1.1,field 1.2,f..eld 1.3,field 1.4,field 1.5
+FIELD-2.1,field 2.2,f..eld 2.3,field 2.4,field 2.5
+FIELD-3.1,field 3.2,f..eld 3.3,field 3.4,field 3.5
+"""
+        self.assertMultiLineEqual(run(self.baseCSV, {0: [u'y/a-z/A-Z/', u's/ /-/'], 2: (u's/i/../',)}), chk)
+        self.assertMultiLineEqual(run(self.baseCSV, [[u'y/a-z/A-Z/', u's/ /-/'], u'y/a/a/', (u's/i/../',)]), chk)
+        # the invalid regular expressions of a dict are reported as such
+        for modifier in (u's/(/x/', u'e/(/cat/', [u'y/a/b/', u's/(/x/']):
+            with self.assertRaises(InvalidModifier) as cm:
+                run(self.baseCSV, {u'header 1': modifier})
+            self.assertIn(u'unterminated subpattern', str(cm.exception))
+
+    def test_modifier_registry(self):
+        # the modifiers which can be shared are built once per string
+        self.assertIs(modifier_as_function(u's/a/b/g'), modifier_as_function(u's/a/b/g'))
+        self.assertIs(modifier_as_function(u'y/ab/AB/'), modifier_as_function([u'y/ab/AB/']))
+        self.assertIsNot(modifier_as_function(u's/a/b/'), modifier_as_function(u's/a/b/g'))
+        # "e" modifiers hold a process and statistics of their own
+        self.assertIsNot(modifier_as_function(u'e/a/cat/c'), modifier_as_function(u'e/a/cat/c'))
+        self.assertRaises(InvalidModifier, modifier_as_function, u'q/a/b/')
+
+        class QModifier(Modifier):
+            # quotes the matching cells
+            shared = True
+            def __init__(self, modifier):
+                self.modifier_form = 'q/CHARS/QUOTE/FLAGS'
+                self.supported_flags = []
+                super(QModifier, self).__init__(modifier)
+            def __call__(self, value):
+                return self.modifier_rhs + value + self.modifier_rhs if self.modifier_lhs in value else value
+
+        chk = modifier_as_function(u's/a/b/')
+        register_modifier('q', QModifier)
+        try:
+            self.assertIsNot(modifier_as_function(u's/a/b/'), chk)
+            self.assertIsInstance(modifier_as_function(u'q/a/"/'), QModifier)
+            self.assertEqual(modifier_as_function([u'q|a|*|', u'y/*/_/'])(u'bar'), u'_bar_')
+            self.assertMultiLineEqual(run(self.baseCSV, {'header 2': u'q/2/!/'}).splitlines()[2],
+                                      u'field 2.1,!field 2.2!,field 2.3,field 2.4,field 2.5')
+            self.assertRaises(InvalidModifier, modifier_as_function, u'q/a/b/i')
+        finally:
+            del modifier_types['q']
+            modifier_cache.clear()
+        self.assertRaises(InvalidModifier, modifier_as_function, u'q/a/b/')
+        self.assertRaises(ValueError, register_modifier, 'qq', QModifier)
+
+        size = modifier_cache.maxsize
+        modifier_cache.maxsize = 2
+        try:
+            for modifier in (u's/1/2/', u's/2/3/', u's/3/4/'):
+                modifier_as_function(modifier)
+            self.assertEqual(list(modifier_cache.entries), [u's/2/3/', u's/3/4/'])
+        finally:
+            modifier_cache.maxsize = size
+
+    def test_cli_modifier_chain(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with open(path, 'w') as f:
+                f.write(self.baseCSV)
+            script = os.path.join(tmpdir, 'script.sed')
+            with open(script, 'w') as f:
+                f.write('# upper case\ny/a-z/A-Z/\n\ns/ /-/\n')
+            chk = self.baseCSV.replace('field 1.1', 'FIELD-1.1').replace('field 2.1', 'FIELD-2.1').replace(
+                'field 3.1', 'FIELD-3.1')
+            self.assertMultiLineEqual(run_cli(['-c', '1', '-m', 'y/a-z/A-Z/', '-m', 's/ /-/', path]), chk)
+            self.assertMultiLineEqual(run_cli(['-c', '1', '-f', script, path]), chk)
+            self.assertMultiLineEqual(run_cli(['-c', '1', '-m', 's/ /+/', '-f', script, '-m', 'y/A-Z/a-z/', path]),
+                                      chk.replace('-', '+'))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_modifier_s_fastpaths(self):
+        patterns = [u'a', u'ab', u'^ab', u'ab$', u'^ab$', u'a\\.b', u'a\\$', u'\\^a', u'^$', u'a.b', u'x(ab)+c',
+                    u'(?:ab|c)d', u'a*b', u'\\d+b(c)?', u'(?i:ab)c', u'(?i)ab', u'π$', u'a b # comment']
+        values = [u'', u'a', u'ab', u'abab', u'xab', u'abx', u'ab\n', u'ab\n\n', u'\nab', u'AB', u'a.b', u'a$', u'^a',
+                  u'xababcd', u'12bc', u'xabc', u'ABc', u'κάππα π', u'ab\nab']
+        for pattern in patterns:
+            for repl in (u'', u'X', u'<\\g<0>>', u'π'):
+                for flags in (u'', u'g', u'i', u'm', u'gm', u's', u'x', u'gx', u'u'):
+                    mod = modifier_as_function(u's/%s/%s/%s' % (pattern, repl, flags))
+                    for value in values:
+                        self.assertEqual(mod(value), mod.regex_substitute(value), (pattern, repl, flags, value))
+        self.assertIsNotNone(modifier_as_function(u's/N.A//g').required)
+        self.assertEqual(modifier_as_function(u's/^N\\.A$//g').literal, (True, u'N.A', True))
+        # invalid replacements are reported whatever the cells, even those the fast paths skip
+        for modifier in (u's/N.A/\\1/', u's/(a)b/\\g<x>/', u's/a/b\\/', u's/ab/\\2/'):
+            self.assertRaises(InvalidModifier, modifier_as_function, modifier)
+        self.assertEqual(modifier_as_function(u's/(a)b/\\1\\g<0>\\n/')(u'xab'), u'xaab\n')
+
+    def test_memoize(self):
+        src = ''.join('%s,%i\n' % (u'αβγ'[i % 3], i) for i in range(3000))
+        chk = ''.join('%s,%i\n' % (u'ABG'[i % 3], i + 1) for i in range(3000))
+        rows = agate.csv.reader(six.StringIO(src))
+        reader = CSVModifier(rows, {0: [u'y/αβγ/abg/', u'y/a-z/A-Z/'], 1: lambda v: str(int(v) + 1)}, header=False,
+                             memoize=True)
+        dst = six.StringIO()
+        agate.csv.writer(dst).writerows(reader)
+        self.assertMultiLineEqual(dst.getvalue(), chk)
+        self.assertEqual(reader.memo_stats(), {0: {'hits': 2997, 'misses': 3, 'size': 3, 'enabled': True}})
+
+        mod = MemoizedModifier(modifier_as_function(u's/a/b/'), maxsize=10, window=100, min_hit_rate=0.5)
+        for i in range(99):
+            self.assertEqual(mod(u'a%i' % (i % 10)), u'b%i' % (i % 10))
+        self.assertEqual(mod.stats(), {'hits': 89, 'misses': 10, 'size': 10, 'enabled': True})
+        for i in range(200):
+            self.assertEqual(mod(u'a%i' % i), u'b%i' % i)
+        self.assertEqual(mod.stats(), {'hits': 99, 'misses': 111, 'size': 0, 'enabled': False})
+
+        # the hits count as calls in the statistics
+        stats = Statistics()
+        reader = CSVModifier(agate.csv.reader(six.StringIO(src)), {0: u'y/αβγ/abg/'}, header=False, memoize=True,
+                             stats=stats, jobs=4)
+        self.assertEqual(len(list(reader)), 3000)
+        self.assertEqual([(entry['calls'], entry['changed']) for entry in stats.report()['modifiers']], [(3000, 3000)])
+        self.assertEqual(reader.memo_stats()[0]['hits'] + reader.memo_stats()[0]['misses'], 3000)
+
+    def test_memoize_threads(self):
+        # concurrent lookups, insertions and evictions
+        mod = MemoizedModifier(modifier_as_function(u's/a/b/'), maxsize=8, window=10 ** 9)
+        errors = []
+        def run():
+            try:
+                for i in range(5000):
+                    if mod(u'a%i' % (i % 50)) != u'b%i' % (i % 50):
+                        errors.append(i)
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        stats = mod.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 40000)
+        self.assertTrue(stats['size'] <= 8)
+
+    def test_compile_transform(self):
+        transform = compile_transform({2: modifier_as_function(u's/a/b/'), 0: len, 'key': lambda value: value * 2})
+        row = {0: u'abc', 2: u'aa', 'key': u'k'}
+        self.assertIs(transform(row), row)
+        self.assertEqual(row, {0: 3, 2: u'ba', 'key': u'kk'})
+        self.assertEqual(compile_transform({})([u'a']), [u'a'])
+
+    def test_iter_batches(self):
+        modifiers = {1: u's/field/F/', 2: [u'y/0-9/a-j/', u's/^(f)(.*)$/\\2\\1/'], 3: lambda value: value.upper()}
+        chk = list(agate.csv.reader(six.StringIO(run(self.baseCSV, modifiers))))
+        for size, lengths in ((1, [2, 1, 1]), (2, [3, 1]), (10, [4])):
+            reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), modifiers)
+            batches = list(reader.iter_batches(size))
+            self.assertEqual([len(rows) for rows in batches], lengths)
+            self.assertEqual([row for rows in batches for row in rows], chk)
+        # most columns modified: the rows are transposed
+        modifiers = {0: u's/field/F/', 1: u's/ 1/ one/g', 2: u'y/ /_/', 3: u's/^/>/'}
+        reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), modifiers)
+        chk = list(agate.csv.reader(six.StringIO(run(self.baseCSV, modifiers))))
+        self.assertEqual([row for rows in reader.iter_batches() for row in rows], chk)
+        # mixed with plain iteration
+        reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), modifiers)
+        self.assertEqual(next(reader), chk[0])
+        self.assertEqual(next(reader), chk[1])
+        self.assertEqual(list(reader.iter_batches(1)), [[row] for row in chk[2:]])
+
+    def test_stats(self):
+        modifiers = {0: u's/1/one/', 1: [u'y/f/F/', u'y/i/I/', u'e/.*2\\.2/tr a-z A-Z/b'], 'header 5': six.text_type.upper}
+        for kwargs in ({}, {'memoize': True}, {'cache': ExecutionCache(10)}, {'jobs': 2}):
+            stats = Statistics()
+            reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), modifiers, stats=stats, **kwargs)
+            rows = [row for rows in reader.iter_batches(2) for row in rows]
+            self.assertEqual(rows[1:], [row for row in agate.csv.reader(six.StringIO(run(self.baseCSV, modifiers)))][1:])
+            report = stats.report()
+            self.assertEqual(report['rows'], 3)
+            self.assertTrue(report['times']['read'] > 0 and report['times']['subprocess'] > 0)
+            self.assertEqual([(entry['column'], entry['modifier'], entry['calls'], entry['changed'])
+                              for entry in report['modifiers']],
+                             [(0, u's/1/one/', 3, 3), (1, u'y/f/F/; y/i/I/', 3, 3),
+                              (1, u'e/.*2\\.2/tr a-z A-Z/b', 3, 1), (4, u'upper', 3, 3)])
+        stats.merge(report)
+        self.assertEqual(stats.report()['modifiers'][0]['calls'], 6)
+
+    def test_cli_stats(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with open(path, 'w') as f:
+                f.write(self.baseCSV)
+            stats_path = os.path.join(tmpdir, 'stats.json')
+            for args in ([], ['--raw'], ['-P', '2']):
+                err = six.StringIO()
+                run_cli(['-c', '2', '--stats', '-m', u's/field/F/', path] + args, error_file=err)
+                self.assertTrue(err.getvalue().startswith('rows: 3 in '))
+                self.assertTrue(u'\ncolumn 2 (header 2), s/field/F/: 3 calls, 3 changed, ' in err.getvalue())
+                run_cli(['-c', '2', '--stats-file', stats_path, '-m', u's/field/F/', path] + args)
+                with open(stats_path) as f:
+                    report = json.load(f)
+                self.assertEqual(report['rows'], 3)
+                self.assertEqual(report['modifiers'], [dict(report['modifiers'][0], column=1, name=u'header 2',
+                                                            modifier=u's/field/F/', calls=3, changed=3)])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_address(self):
+        def modified(address, **kwargs):
+            reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), {1: u's/field/F/'}, address=address,
+                                 **kwargs)
+            return [row[1] for row in reader][1:]
+        self.assertEqual(modified(u'2'), [u'field 1.2', u'F 2.2', u'field 3.2'])
+        self.assertEqual(modified(u'2,$'), [u'field 1.2', u'F 2.2', u'F 3.2'])
+        self.assertEqual(modified(u'1~2'), [u'F 1.2', u'field 2.2', u'F 3.2'])
+        self.assertEqual(modified(u'0~0'), [u'field 1.2', u'field 2.2', u'field 3.2'])
+        self.assertEqual(modified(u'header 3/3\\.3$/'), [u'field 1.2', u'field 2.2', u'F 3.2'])
+        self.assertEqual(modified(u'header 3/FIELD 1/I'), [u'F 1.2', u'field 2.2', u'field 3.2'])
+        self.assertEqual(modified(RangeAddress(1, 2)), [u'F 1.2', u'F 2.2', u'field 3.2'])
+        self.assertEqual(modified(u'2', quit=True), [u'field 1.2', u'F 2.2'])
+        self.assertEqual(modified(None, max_rows=1), [u'F 1.2'])
+        self.assertEqual(modified(u'1,3', quit=True, max_rows=2), [u'F 1.2', u'F 2.2'])
+        self.assertRaises(InvalidAddress, modified, u'1~2', quit=True)
+        self.assertRaises(InvalidAddress, modified, u'nope/x/')
+        # batches, concurrent or not, select the same rows
+        for kwargs in ({}, {'jobs': 2}):
+            reader = CSVModifier(agate.csv.reader(six.StringIO(self.baseCSV)), {1: u's/field/F/'}, address=u'1~2',
+                                 **kwargs)
+            self.assertEqual([row[1] for rows in reader.iter_batches(1) for row in rows][1:],
+                             [u'F 1.2', u'field 2.2', u'F 3.2'])
+        # no row is read after the last one
+        def rows():
+            yield [u'a']
+            for idx in range(10):
+                read.append(idx)
+                yield [u'x']
+        read = []
+        self.assertEqual(list(CSVModifier(rows(), {0: u'y/x/y/'}, address=u'2', quit=True)), [[u'a'], [u'x'], [u'y']])
+        self.assertEqual(read, [0, 1])
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address(u'3,5').last, 5)
+        self.assertEqual(parse_address(u'3,$').last, None)
+        self.assertEqual(parse_address(u'b/x/', [u'a', u'b']).columns, (1,))
+        self.assertEqual(parse_address(u'2/x/', column_offset=1).columns, (1,))
+        self.assertEqual(parse_address(u'b/x/').columns, (u'b',))
+        for address in (u'', u'a', u'1,', u'1~$', u'$', u'c/x/', u'a/(/', u'a/x/g'):
+            self.assertRaises(InvalidAddress, parse_address, address, [u'a', u'b'])
+
+    def test_cli_address(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with open(path, 'w') as f:
+                f.write(self.baseCSV)
+            args = ['-c', '2', '-m', u's/field/F/', path]
+            chk = run(self.baseCSV, {1: u's/field/F/'}, address=u'2,3')
+            for mode in ([], ['--raw'], ['--bytes'], ['-j', '2']):
+                self.assertMultiLineEqual(run_cli(['-a', '2,3'] + mode + args), chk)
+                self.assertMultiLineEqual(run_cli(['-a', '4/2/', '--max-rows', '2'] + mode + args),
+                                          run(self.baseCSV, {1: u's/field/F/'}, address=u'3/2/', max_rows=2))
+                self.assertMultiLineEqual(run_cli(['-a', '2', '--quit'] + mode + args),
+                                          run(self.baseCSV, {1: u's/field/F/'}, address=u'2', quit=True))
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestParallel(unittest.TestCase):
+
+    source = (
+        u'id,text,value\r\n'
+        u'1,"multi\r\nline, ""quoted""",α\r\n'
+        u'2,plain,β\r\n'
+        u'3,"",γ\r\n'
+        u'4,"""\n""",δ\r\n'
+        u'5,"a\n\nb",ε'
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'input.csv')
+        with open(self.path, 'wb') as f:
+            f.write(self.source.encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_ranges(self):
+        data = self.source.encode('utf-8')
+        records = [data[start:end] for start, end in iter_ranges(self.path, 0, 0)]
+        self.assertEqual(b''.join(records), data)
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records[1], u'1,"multi\r\nline, ""quoted""",α\r\n'.encode('utf-8'))
+        for chunk_size in range(1, len(data) + 1):
+            ranges = list(iter_ranges(self.path, 15, chunk_size))
+            self.assertEqual(ranges[0][0], 15)
+            self.assertEqual(ranges[-1][1], len(data))
+            for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, next_start)
+                self.assertEqual(data[end - 1:end], b'\n')
+                self.assertTrue(end - start >= chunk_size)
+
+    def test_parallel_modifier(self):
+        serial = run_cli(['-c', 'text,value', '-m', u's/[aeiouε"]/_/g', self.path])
+        header, start = serial.split('\n', 1)[0], len(self.source.split(u'\n', 1)[0]) + 1
+        for chunk_size in (0, 1, 20, 1000):
+            chunks = ParallelModifier(self.path, {1: u's/[aeiouε"]/_/g', 2: u's/[aeiouε"]/_/g'}, 2,
+                                      start=start, chunk_size=chunk_size)
+            self.assertMultiLineEqual(header + '\n' + ''.join(chunks), serial)
+
+    def test_modifier_processes(self):
+        rows = [[u'id', u'a', u'b', u'c']] + [[six.text_type(idx), u'a%i' % idx, u'b%i' % idx, u'c%i' % (idx % 7)]
+                                           for idx in range(500)]
+        modifiers = {u'a': checksum, u'b': [checksum, u'y/b/B/'], u'c': u's/c/C/', u'id': lambda value: value * 2}
+        for kwargs in ({}, {'address': u'2~3'}, {'address': u'a/5$/', 'max_rows': 300}):
+            chk = list(CSVModifier(iter([list(row) for row in rows]), modifiers, **kwargs))
+            for processes, batch_size in ((2, 7), (3, 1000)):
+                reader = CSVModifier(iter([list(row) for row in rows]), modifiers, batch_size=batch_size,
+                                     processes=processes, **kwargs)
+                with reader:
+                    # the lambda and the chain stay here
+                    self.assertEqual(list(reader.remote), [1])
+                    self.assertEqual(list(reader), chk)
+                reader = CSVModifier(iter([list(row) for row in rows]), modifiers, processes=processes, **kwargs)
+                with reader:
+                    self.assertEqual([row for batch in reader.iter_batches(33) for row in batch], chk)
+                    self.assertEqual(reader.rows, len(chk) - 1)
+        # errors of the workers are raised by the iteration
+        reader = CSVModifier(iter([[u'boom']]), [checksum], header=False, processes=2)
+        with reader:
+            self.assertRaises(ValueError, list, reader)
+
+    def test_cli_processes(self):
+        for args in (['-c', '2', '-m', u'y/a-z/A-Z/'], ['-c', 'b', '-H', '-m', u'e/./rev/'],
+                     ['-c', '1', '--cache-size', '10', '-m', u'e/./rev/b']):
+            self.assertMultiLineEqual(run_cli(args + ['-P', '2', self.path]), run_cli(args + [self.path]))
+            self.assertMultiLineEqual(run_cli(args + ['-P', '2', '--raw', self.path]),
+                                      run_cli(args + ['--raw', self.path]))
+            self.assertMultiLineEqual(run_cli(args + ['-P', '2', '--bytes', self.path]),
+                                      run_cli(args + ['--bytes', self.path]))
+
+    def test_cli_processes_mac(self):
+        # lines ending with lone carriage returns are read sequentially
+        with open(self.path, 'wb') as f:
+            f.write(b'a,b\rfoo,bar\rbaz,qux\r')
+        args = ['-c', 'b', '-m', u's/a/A/', self.path]
+        for mode in ([], ['--raw'], ['--bytes']):
+            self.assertMultiLineEqual(run_cli(['-P', '2'] + mode + args), u'a,b\nfoo,bAr\nbaz,qux\n')
+
+    def test_cli_processes_invalid_modifier(self):
+        # reported before the header is written, with its message formatted once
+        dst = six.StringIO()
+        with self.assertRaises(InvalidModifier) as cm:
+            run_cli(['-P', '2', '-c', 'id', '-m', u'q/1/x/', self.path], output_file=dst)
+        self.assertEqual(dst.getvalue(), u'')
+        self.assertEqual(str(cm.exception).count(u'Invalid modifier'), 1)
+        error = pickle.loads(pickle.dumps(cm.exception))
+        self.assertEqual(str(error), str(cm.exception))
+        self.assertEqual(str(pickle.loads(pickle.dumps(InvalidAddress(u'x')))), u'Invalid address: x')
+
+class TestFiles(unittest.TestCase):
+
+    sources = (
+        u'id,name\n1,alpha\n2,beta\n',
+        u'id,name\n3,gamma\n',
+        u'name,id\ndelta,4\n',
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for idx, source in enumerate(self.sources):
+            path = os.path.join(self.tmpdir, 'input%i.csv' % idx)
+            with open(path, 'wb') as f:
+                f.write(source.encode('utf-8'))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cli_files(self):
+        # the repeated header is left out, the one that differs is kept
+        chk = u'id,name\n1,Alpha\n2,betA\n3,gAmma\nname,id\ndeltA,4\n'
+        for mode in ([], ['-P', '2'], ['-P', '3', '--raw'], ['--bytes']):
+            err = six.StringIO()
+            self.assertMultiLineEqual(run_cli(['-c', 'name', '-m', u's/a/A/'] + mode + self.paths, err), chk)
+            lines = err.getvalue().splitlines()
+            self.assertEqual([line.split(' in ')[0] for line in lines],
+                             ['%s: 2 rows' % self.paths[0], '%s: 1 rows' % self.paths[1], '%s: 1 rows' % self.paths[2],
+                              '3 files: 4 rows'])
+        self.assertMultiLineEqual(run_cli(['-H', '-c', '2', '-m', u's/a/A/'] + self.paths[:2]),
+                                  u'a,b\nid,nAme\n1,Alpha\n2,betA\nid,nAme\n3,gAmma\n')
+        self.assertRaises(SystemExit, run_cli, ['-c', '1', '-m', u's/a/b/', self.paths[0], '-'])
+
+    def test_cli_in_place(self):
+        os.chmod(self.paths[0], 0o640)
+        with open(self.paths[1], 'wb') as f:
+            f.write(codecs.BOM_UTF8 + self.sources[1].encode('utf-8'))
+        err = six.StringIO()
+        self.assertEqual(run_cli(['-i', '-P', '2', '-c', 'id', '-m', u's/$/0/'] + self.paths, err), u'')
+        self.assertEqual(len(err.getvalue().splitlines()), 4)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['input0.csv', 'input1.csv', 'input2.csv'])
+        self.assertEqual(os.stat(self.paths[0]).st_mode & 0o777, 0o640)
+        with open(self.paths[0], 'rb') as f:
+            self.assertEqual(f.read(), b'id,name\n10,alpha\n20,beta\n')
+        with open(self.paths[1], 'rb') as f:
+            self.assertEqual(f.read(), codecs.BOM_UTF8 + b'id,name\n30,gamma\n')
+        with open(self.paths[2], 'rb') as f:
+            self.assertEqual(f.read(), b'name,id\ndelta,40\n')
+
+        # a failure leaves the file as it was
+        self.assertRaises(SystemExit, run_cli, ['-i', '-c', 'id', '-m', u'e/.*/read x; exit 1/', self.paths[2]])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['input0.csv', 'input1.csv', 'input2.csv'])
+        with open(self.paths[2], 'rb') as f:
+            self.assertEqual(f.read(), b'name,id\ndelta,40\n')
+        self.assertRaises(SystemExit, run_cli, ['-i', '-c', 'id', '-m', u's/a/b/'])
+
+class TestCompress(unittest.TestCase):
+
+    source = u'id,name\n1,alpha\n2,bêta\n' * 100
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def compressed(self, name, fmt):
+        path = os.path.join(self.tmpdir, name)
+        with compress.open_compressed(path, fmt, 'wb') as f:
+            f.write(self.source.encode('utf-8'))
+        return path
+
+    def test_threaded(self):
+        for fmt in ('gzip', 'bz2', 'xz'):
+            path = self.compressed('input', fmt)
+            self.assertEqual(compress.input_compression(path), fmt)
+            # small blocks, so that the thread waits for room in the queue
+            with compress.open_input(path, fmt, 'utf-8', block_size=7) as f:
+                self.assertMultiLineEqual(f.read(), self.source)
+            with compress.open_input(path, fmt, 'utf-8', block_size=7) as f:
+                self.assertEqual(f.readline(), u'id,name\n')
+            with compress.open_output(path + '.out', fmt) as f:
+                f.write(self.source)
+            with compress.open_compressed(path + '.out', fmt) as f:
+                self.assertEqual(f.read().decode('utf-8'), self.source)
+        self.assertEqual(compress.input_compression(path + '.gz'), 'gzip')
+        self.assertEqual(compress.sniff(bz2.compress(b'')), 'bz2')
+        self.assertEqual(compress.sniff(bz2.compress(b'')[:4] + b'1AY&SY'), 'bz2')
+        self.assertEqual(compress.sniff(bz2.compress(b''), text=True), None)
+        self.assertEqual(compress.sniff(b'BZh_code,name\n'), None)
+        self.assertEqual(compress.output_compression('out.csv.bz2'), 'bz2')
+        self.assertEqual(compress.output_compression('out.csv'), None)
+
+        # errors of the thread are raised by the reads
+        with open(path, 'wb') as f:
+            f.write(b'\x1f\x8b' + b'garbage' * 10)
+        with compress.open_input(path, 'gzip', 'utf-8') as f:
+            self.assertRaises(Exception, f.read)
+
+    def test_cli_compressed(self):
+        plain = os.path.join(self.tmpdir, 'input.csv')
+        with open(plain, 'wb') as f:
+            f.write(self.source.encode('utf-8'))
+        chk = run_cli(['-c', 'name', '-m', u's/a/A/', plain])
+        # found by magic bytes
+        for path in (self.compressed('gzip.csv', 'gzip'), self.compressed('input.csv.xz', 'xz')):
+            for mode in ([], ['--raw'], ['--bytes'], ['-P', '2']):
+                self.assertMultiLineEqual(run_cli(['-c', 'name', '-m', u's/a/A/', path] + mode), chk)
+            self.assertMultiLineEqual(launch(['-c', 'name', '-m', u's/a/A/', path]), chk)
+
+        for name, fmt in (('out.csv.gz', 'gzip'), ('out.bz2', 'bz2'), ('out.csv', None)):
+            output = os.path.join(self.tmpdir, name)
+            self.assertEqual(run_cli(['-c', 'name', '-m', u's/a/A/', '-o', output, plain]), u'')
+            with open(output, 'rb') if fmt is None else compress.open_compressed(output, fmt) as f:
+                self.assertMultiLineEqual(f.read().decode('utf-8'), chk)
+
+        # plain CSV looking like bz2
+        for name, head in (('bzh.csv', b'BZh_code'), ('bzh', b'BZh_code'), ('bzh9.csv', b'BZh91AY&SY')):
+            path = os.path.join(self.tmpdir, name)
+            with open(path, 'wb') as f:
+                f.write(head + self.source.encode('utf-8'))
+            self.assertEqual(compress.input_compression(path), None)
+            self.assertMultiLineEqual(run_cli(['-c', 'name', '-m', u's/a/A/', path]), head.decode('ascii') + chk)
+
+        path = self.compressed('input.csv.gz', 'gzip')
+        run_cli(['-i', '-c', 'name', '-m', u's/a/A/', path])
+        with compress.open_compressed(path, 'gzip') as f:
+            self.assertMultiLineEqual(f.read().decode('utf-8'), chk)
+
+class WriteLog(six.StringIO):
+    # a text file recording its writes
+    def __init__(self):
+        six.StringIO.__init__(self)
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+        return six.StringIO.write(self, data)
+
+class TestOutput(unittest.TestCase):
+
+    rows = [[u'id', u'name'], [u'1', u'alpha'], [u'2', u'bêta, "quoted"'], [u'3', u'multi\nline']]
+
+    def csv(self, rows):
+        dst = six.StringIO()
+        agate.csv.writer(dst).writerows(rows)
+        return dst.getvalue()
+
+    def test_buffered(self):
+        chk = self.csv(self.rows)
+        # everything is written at once at the end
+        dst = WriteLog()
+        with BufferedOutput(dst, agate.csv.writer, flush_interval=None) as output:
+            output.writerow(self.rows[0])
+            output.writerows(self.rows[1:])
+            self.assertEqual(dst.writes, [])
+        self.assertEqual(dst.writes, [chk])
+        # full blocks are written as soon as they are
+        dst = WriteLog()
+        with BufferedOutput(dst, agate.csv.writer, block_size=20, flush_interval=None) as output:
+            for row in self.rows:
+                output.writerow(row)
+        self.assertEqual(u''.join(dst.writes), chk)
+        self.assertTrue(len(dst.writes) > 1)
+        self.assertTrue(all(len(data) >= 20 for data in dst.writes[:-1]))
+        # and so is everything with no flush interval, as on a terminal
+        dst = WriteLog()
+        with BufferedOutput(dst, agate.csv.writer, flush_interval=0) as output:
+            output.writerows(self.rows[:2])
+            self.assertEqual(dst.writes, [self.csv(self.rows[:2])])
+        self.assertEqual(default_flush_interval(dst), 1.0)
+        self.assertEqual(default_flush_interval(dst, batch_timeout=0.5), 0)
+        # bytes, decoded for a text file
+        dst = WriteLog()
+        with BufferedOutput(dst, binary=True, encoding='utf-8') as output:
+            output.write(chk.encode('utf-8'))
+        self.assertEqual(dst.writes, [chk])
+
+    def test_cli_output(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with io.open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(self.csv(self.rows * 100))
+            for args in ([], ['-l'], ['--raw'], ['--bytes'], ['-P', '2']):
+                args = args + ['-c', 'name', '-m', u's/a/A/', path]
+                dst = WriteLog()
+                run_cli(args, output_file=dst)
+                self.assertMultiLineEqual(dst.getvalue(), run_cli(args))
+                self.assertTrue(len(dst.writes) < 10)
+            lines = run_cli(['-l', '-c', 'name', '-m', u's/a/A/', path]).splitlines()
+            self.assertEqual(lines[:3], [u'line_numbers,id,name', u'1,1,Alpha', u'2,2,"bêtA, ""quoted"""'])
+            self.assertMultiLineEqual(launch(['-l', '-c', 'name', '-m', u's/a/A/', path]), u'\n'.join(lines) + u'\n')
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestFrame(unittest.TestCase):
+
+    modifiers = {0: u's/([a-z]+) ([a-z]+)/\\2 \\1/g', 1: u's/ab/AB/', 2: [u'y/a-z/A-Z/', u's/^A/-/'],
+                 'c3': u's/^[0-9]+$/N/m', 'c4': u's/X/y/gi', 5: u's/b$/B/'}
+
+    def setUp(self):
+        self.rows = bench.generate_rows(rows=200, width=6, cell_size=6, quoting=0.3, unicode=0.2, seed=3)
+        self.column_names = [u'c%i' % col for col in range(6)]
+        rows = [list(self.column_names)] + [list(row) for row in self.rows]
+        self.chk = list(CSVModifier(iter(rows), self.modifiers))[1:]
+
+    def count_calls(self, path):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return len(f.readlines())
+
+    def test_records(self):
+        records = [dict(zip(self.column_names, row)) for row in self.rows]
+        modified = modify_records(records, self.modifiers)
+        self.assertEqual([[record[name] for name in self.column_names] for record in modified], self.chk)
+        self.assertEqual(records[0], dict(zip(self.column_names, self.rows[0])))
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            calls = os.path.join(tmpdir, 'calls')
+            records = [{u'a': u'x'}, {u'a': u'y', u'b': u'1'}, {u'a': None, u'b': u'2'}, {u'a': u'x'}, {u'b': u'3'}]
+            modified = modify_records(records, {0: u'e|.|echo >> %s; tr a-z A-Z|' % calls, u'b': u'y/123/abc/'})
+            self.assertEqual(modified, [{u'a': u'X'}, {u'a': u'Y', u'b': u'a'}, {u'a': None, u'b': u'b'}, {u'a': u'X'},
+                                        {u'b': u'c'}])
+            # once per distinct value
+            self.assertEqual(self.count_calls(calls), 2)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(modify_records([], [u's/a/b/']), [])
+        records = [{u'a': 1, u'b': 1.5}, {u'a': None, u'b': 10}, {u'a': 21, u'b': None}]
+        self.assertEqual(modify_records(records, {u'a': u's/1/2/', u'b': u's/1/one/'}),
+                         [{u'a': u'2', u'b': u'one.5'}, {u'a': None, u'b': u'one0'}, {u'a': u'22', u'b': None}])
+
+    @unittest.skipIf(pandas is None, 'pandas is not installed')
+    def test_frame(self):
+        frame = pandas.DataFrame(self.rows, columns=self.column_names)
+        modified = modify_frame(frame, self.modifiers)
+        self.assertEqual(modified.values.tolist(), self.chk)
+        self.assertEqual(frame.values.tolist(), self.rows)
+        self.assertIs(modify_frame(frame, [u'y/a/A/'], inplace=True), frame)
+        self.assertEqual(frame[u'c0'].tolist(), [row[0].replace(u'a', u'A') for row in self.rows])
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            calls = os.path.join(tmpdir, 'calls')
+            frame = pandas.DataFrame({u'a': [u'x', u'y', None, u'x'], u'n': [1, 2, None, 12]})
+            modified = modify_frame(frame, {u'a': u'e|.|echo >> %s; tr a-z A-Z|' % calls, 1: [u's/1/one/', len]})
+            self.assertEqual(modified[u'a'].tolist()[:2] + modified[u'a'].tolist()[3:], [u'X', u'Y', u'X'])
+            self.assertTrue(pandas.isna(modified[u'a'][2]))
+            self.assertEqual(self.count_calls(calls), 2)
+            # numbers are modified as text, as in CSV
+            self.assertEqual(modified[u'n'].tolist()[:2], [5, 3])
+            self.assertTrue(pandas.isna(modified[u'n'][2]))
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestRaw(unittest.TestCase):
+
+    source = (
+        u'id,"text",value\r\n'
+        u'1,"multi\r\nline, ""quoted""",alpha\r\n'
+        u'"2",plain,beta\r\n'
+        u'3,,"gamma"\r\n'
+        u'4,"a"b,delta\r\n'
+        u'5,"a\n\nb",epsilon'
+    )
+
+    def raw(self, source, modifiers, header=True, **kwargs):
+        with RawModifier(iter_records(six.StringIO(source, newline=None)), modifiers, header=header,
+                         **kwargs) as reader:
+            return u''.join(reader)
+
+    def test_iter_records(self):
+        self.assertEqual(list(iter_records(six.StringIO(self.source, newline=None))), [
+            u'id,"text",value\n', u'1,"multi\nline, ""quoted""",alpha\n', u'"2",plain,beta\n', u'3,,"gamma"\n',
+            u'4,"a"b,delta\n', u'5,"a\n\nb",epsilon'])
+        self.assertEqual(list(iter_records([u'a,"b\n', u'c'])), [u'a,"b\nc"'])
+
+    def test_pass_through(self):
+        # untouched cells keep their quotes, modified ones are quoted as needed
+        self.assertMultiLineEqual(self.raw(self.source, {'value': u's/a$/a,/'}), (
+            u'id,"text",value\n'
+            u'1,"multi\nline, ""quoted""","alpha,"\n'
+            u'"2",plain,"beta,"\n'
+            u'3,,"gamma,"\n'
+            u'4,ab,"delta,"\n'
+            u'5,"a\n\nb",epsilon\n'))
+        self.assertMultiLineEqual(self.raw(self.source, {1: u's/^$/""/', 0: u's/^5$/five/'}), (
+            u'id,"text",value\n'
+            u'1,"multi\nline, ""quoted""",alpha\n'
+            u'"2",plain,beta\n'
+            u'3,"""""","gamma"\n'
+            u'4,ab,delta\n'
+            u'five,"a\n\nb",epsilon\n'))
+
+    def test_same_as_rows(self):
+        # on input written by agate, the output is the same as with CSVModifier and agate
+        dst = six.StringIO()
+        agate.csv.writer(dst).writerows(agate.csv.reader(six.StringIO(self.source, newline=None)))
+        source = dst.getvalue()
+        for modifiers in ({0: u's/.*//'}, {2: u'y/a/,/', 1: u's/ /\r/g'}, [u's/^/"/', u'y/a/b/', u's/a/b/']):
+            rows = agate.csv.reader(six.StringIO(source))
+            dst = six.StringIO()
+            agate.csv.writer(dst).writerows(CSVModifier(rows, modifiers))
+            self.assertMultiLineEqual(self.raw(source, modifiers), dst.getvalue())
+
+    def test_empty(self):
+        self.assertEqual(self.raw(u'', {0: u's/a/A/'}, header=False), u'')
+        for binary in (False, True):
+            # without a header row, like CSVModifier
+            self.assertRaises(StopIteration, RawModifier, iter([]), {0: u's/a/A/'}, binary=binary)
+
+    def test_binary_modifiers(self):
+        values = [u'', u'a', u'abc', u'άλφα', u'aé\nb', u'é+é', u'x.y']
+        for modifier in (u's/a/b/g', u's/^a(.*)$/\\1-é/', u's/π(é)*/e/', u's/[a-c]+|λ/_/g', u's/(é)+$/\\1\\1/',
+                         u'y/abc/ABC/', [u'y/a/b/', u's/b.*/\\g<0>!/', u'y/b/c/']):
+            mod = modifier_as_function(modifier)
+            binary = binary_modifier(modifier)
+            for value in values:
+                self.assertEqual(binary(value.encode('utf-8')), mod(value).encode('utf-8'), (modifier, value))
+        for modifier in (u's/./x/', u's/a.*?/x/', u's/\\w/x/', u's/a/b/i', u's/[^a]/x/', u's/é+/e/', u's/[é]/e/',
+                         u's/(.+)(.+)/\\2\\1/', u's/(.*)(.+)/x/', u'y/é/e/', [u's/a/b/', len]):
+            if isinstance(modifier, six.string_types) and modifier.startswith(u's'):
+                self.assertFalse(is_byte_safe(modifier_as_function(modifier).regex), modifier)
+            self.assertRaises(InvalidModifier, binary_modifier, modifier)
+        mod = binary_modifier(u'e/^(.+)$/echo "\\1é"/')
+        self.assertEqual(mod(u'πa'.encode('utf-8')), u'πaé'.encode('utf-8'))
+        mod = binary_modifier(u'e/.+/tr a-z A-Z/b')
+        self.assertEqual(mod.call_many([b'ab', u'é'.encode('utf-8'), b'']), [b'AB', u'é'.encode('utf-8'), b''])
+
+    def test_raw_binary(self):
+        modifiers = {'value': u's/a$/a,/', 1: [u'y/i/I/', u's/(é)+/<\\1>/g']}
+        source = self.source.replace(u'plain', u'éé plain é')
+        with RawModifier(iter_records(six.BytesIO(source.encode('utf-8')), b'"'), modifiers, binary=True) as reader:
+            self.assertEqual(reader.column_names, [u'id', u'text', u'value'])
+            # apart from line endings within unmodified fields, the same as in text mode
+            self.assertEqual(b''.join(reader).decode('utf-8'),
+                             self.raw(source, modifiers).replace(u'"multi\n', u'"multi\r\n'))
+
+    def test_cli_raw(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with open(path, 'wb') as f:
+                f.write(self.source.encode('utf-8'))
+            self.assertMultiLineEqual(run_cli(['-c', 'value', '--raw', '-m', u'y/a/A/', path]),
+                                      self.raw(self.source, {2: u'y/a/A/'}))
+            self.assertMultiLineEqual(run_cli(['-c', '3', '-H', '--raw', '-m', u'y/a/A/', path]),
+                                      u'a,b,c\n' + self.raw(self.source, {2: u'y/a/A/'}, header=False))
+            self.assertMultiLineEqual(run_cli(['-c', '2,3', '--bytes', '-m', u'y/a/A/', path]),
+                                      run_cli(['-c', '2,3', '--raw', '-m', u'y/a/A/', path]).replace(
+                                          u'"multi\n', u'"multi\r\n'))
+            # not byte-safe: same as --raw
+            self.assertMultiLineEqual(run_cli(['-c', '3', '--bytes', '-m', u's/./x/', path]),
+                                      run_cli(['-c', '3', '--raw', '-m', u's/./x/', path]))
+            # a repetition after ".+" could split a multi-byte character
+            with open(path + '.ae', 'wb') as f:
+                f.write(u'c\naé\n'.encode('utf-8'))
+            self.assertMultiLineEqual(run_cli(['-c', 'c', '--bytes', '-m', u's/(.+)(.+)/\\2\\1/', path + '.ae']),
+                                      u'c\néa\n')
+            # Mac line endings are new lines to the modifiers, as in text mode (unchanged cells keep theirs)
+            with open(path + '.cr', 'wb') as f:
+                f.write(b'a,b\n1,"x\ry"\n2,"x\r"\n3,"\r\n"\n')
+            for modifier in (u's/\\n/ /', u's/x$/X/', u's/^\\n$/E/'):
+                output = run_cli(['-c', 'b', '--bytes', '-m', modifier, path + '.cr'])
+                self.assertMultiLineEqual(output.replace(u'\r\n', u'\n').replace(u'\r', u'\n'),
+                                          run_cli(['-c', 'b', '-m', modifier, path + '.cr']))
+            # and so are the lone carriage returns ending the records
+            with open(path + '.mac', 'wb') as f:
+                f.write(b'a,b\rfoo,bar\r"x\ny",baz\r,\rqux,a\r')
+            for args in (['-c', 'b', '-m', u's/a/A/'], ['-c', 'a,b', '-m', u's/^$/E/']):
+                chk = run_cli(args + [path + '.mac'])
+                self.assertMultiLineEqual(run_cli(args + ['--bytes', path + '.mac']), chk)
+                self.assertMultiLineEqual(run_cli(args + ['--raw', path + '.mac']), chk)
+            # empty input
+            with open(path + '.empty', 'wb') as f:
+                pass
+            for args in (['-c', '1', '-m', u's/a/A/'], ['-c', '1', '-H', '-m', u's/a/A/']):
+                chk = run_cli(args + [path + '.empty'])
+                self.assertEqual(run_cli(args + ['--bytes', path + '.empty']), chk)
+                self.assertEqual(run_cli(args + ['--raw', path + '.empty']), chk)
+            dst = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+            run_cli(['-c', '3', '--bytes', '-m', u's/a$/α/', path], output_file=dst)
+            dst.flush()
+            self.assertEqual(dst.buffer.getvalue().decode('utf-8'),
+                             self.raw(self.source, {2: u's/a$/α/'}).replace(u'"multi\n', u'"multi\r\n'))
+            # not standard CSV: the cells are parsed and quoted again
+            self.assertMultiLineEqual(run_cli(['-c', '3', '-p', '\\', '--raw', '-m', u'y/a/A/', path]),
+                                      run_cli(['-c', '3', '-p', '\\', '-m', u'y/a/A/', path]))
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestMapped(unittest.TestCase):
+
+    source = (
+        u'id,text,value\r\n'
+        u'1,"multi\r\nline, ""quoted""",α\r\n'
+        u'2,pl\0ain,β\r'
+        u'3,"",γ\n'
+        u'4,"""\n""",δ\r\n'
+        u'5,"a\n\nb",ε'
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'input.csv')
+        with open(self.path, 'wb') as f:
+            f.write(self.source.encode('utf-8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_blocks(self):
+        data = self.source.encode('utf-8')
+        for block_size in range(1, len(data) + 1):
+            blocks = [block.tobytes() for block in iter_blocks(data, 15, block_size=block_size)]
+            self.assertEqual(b''.join(blocks), data[15:])
+            for block in blocks[:-1]:
+                self.assertTrue(len(block) >= block_size)
+                self.assertTrue(block.endswith(b'\n'))
+
+    def test_mapped_file(self):
+        path16 = os.path.join(self.tmpdir, 'input16.csv')
+        with open(path16, 'wb') as f:
+            f.write(self.source.encode('utf-16'))
+        for path, encoding in ((self.path, 'utf-8'), (self.path, 'utf-8-sig'), (path16, 'utf-16'), (self.path, None)):
+            with io.open(path, 'r' if encoding else 'rb', encoding=encoding) as f:
+                nul = u'\0' if encoding else b'\0'
+                expected = [line.replace(nul, nul[:0]) for line in f]
+            for block_size in (1, 2, 3, 10, 1000):
+                with MappedFile(path, encoding, block_size=block_size) as f:
+                    self.assertEqual(list(f), expected)
+        with MappedFile(self.path, 'utf-8', 15, self.source.encode('utf-8').index(b'3,')) as f:
+            self.assertEqual(f.readline(), u'1,"multi\n')
+            self.assertEqual(list(f), [u'line, ""quoted""",α\n', u'2,plain,β\n'])
+            self.assertEqual(f.readline(), u'')
+        self.assertIsNone(map_file(self.tmpdir))
+
+    def test_cli_mmap(self):
+        for args in (['-c', '2', '-m', u'y/a-z/A-Z/'], ['-c', '2,3', '-K', '3', '-H', '--raw', '-m', u's/./x/'],
+                     ['-c', '2,3', '--bytes', '-m', u's/a/A/'], ['-c', 'value', '-P', '2', '-m', u'y/αβ/ab/']):
+            self.assertMultiLineEqual(run_cli(args + [self.path]), run_cli(args + ['--no-mmap', self.path]))
+
+class TestMain(unittest.TestCase):
+
+    source = (
+        u'# comment\n'
+        u'id,name,status\n'
+        u'1,alpha,ok\n'
+        u'2,"be,ta",error\r\n'
+        u'3,"gam\rma",o\0k\n'
+    )
+
+    def test_parser(self):
+        sigpipe, excepthook = signal.getsignal(signal.SIGPIPE), sys.excepthook
+        try:
+            utility = CSVSed(['-n'])
+        finally:
+            signal.signal(signal.SIGPIPE, sigpipe)
+            sys.excepthook = excepthook
+        # every option of csvkit's parser is either parsed the same way, or left to it
+        handled = set()
+        for action in utility.argparser._actions:
+            if action.nargs == 0:
+                values = []
+            elif action.choices:
+                values = [str(action.choices[-1])]
+            elif action.type in (int, float):
+                values = ['3']
+            else:
+                values = ['x'] * (2 if action.nargs in ('+', '*') else 1)
+            for option in action.option_strings:
+                argv = [option] + values + ['-c', '1', '-m', u's/a/b/', 'input.csv']
+                parsed = make_parser().parse_simple_args(argv)
+                if parsed is None:
+                    continue
+                args = parsed[0]
+                handled.add(action.dest)
+                # set by csvsed for both
+                del args.input_path
+                expected = vars(utility.argparser.parse_args(argv))
+                self.assertEqual(vars(args), dict((key, expected[key]) for key in vars(args)), argv)
+        self.assertTrue(set(['delimiter', 'encoding', 'no_header_row', 'zero_based', 'modifier', 'batch_size']) <= handled)
+        self.assertFalse(set(['help', 'version', 'locale', 'line_numbers', 'add_bom']) & handled)
+        # and so are the errors
+        for argv in (['--bogus', 'input.csv'], ['--no-header', 'input.csv'], ['-u', '9', 'input.csv'],
+                     ['-c', '1', 'input.csv']):
+            self.assertIsNone(make_parser().parse_simple_args(argv), argv)
+
+    def test_simple(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'input.csv')
+            with open(path, 'wb') as f:
+                f.write(self.source.encode('utf-8'))
+            for args in (['-c', '2', '-m', u's/a/A/g'], ['-c', 'name,3', '-m', u'y/a-z/A-Z/', '-a', '2,3'],
+                         ['-c', '1-2', '-m', u's/^/x/', '--no-mmap'], ['-H', '-c', '2', '-m', u's/a/A/', '-j', '2'],
+                         ['-n'], ['--zero', '-c', '0', '-m', u's/$/!/', '--max-rows', '2']):
+                args = ['-K', '1', path] + args
+                self.assertTrue(is_simple(make_parser().parse_args(args)), args)
+                self.assertMultiLineEqual(launch(args), run_cli(args))
+            # left to csvkit
+            args = ['-K', '1', '--raw', '-c', '2', '-m', u's/a/A/', path]
+            self.assertFalse(is_simple(make_parser().parse_args(args)))
+            self.assertMultiLineEqual(launch(args), run_cli(args))
+            args = ['-K', '1', '-l', '-c', '2', '-m', u's/a/A/', path]
+            self.assertIsNone(make_parser().parse_simple_args(args))
+            self.assertMultiLineEqual(launch(args), run_cli(args))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_lazy_imports(self):
+        # the command line alone does not import csvkit, nor agate
+        code = 'import sys, csvsed.main; print(sorted(set(sys.modules) & set(["agate", "csvkit", "csvsed.cli"])))'
+        self.assertEqual(subprocess.check_output([sys.executable, '-c', code]).strip(), b'[]')
+
+class TestProgress(unittest.TestCase):
+
+    source = u'﻿id,name\r\n1,alpha\r\n2,"be\r\nta"\r\n3,gam\0ma\r\n' + u''.join(u'%i,row %i\n' % (i, i) for i in range(4, 500))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmpdir, 'input.csv')
+        with open(self.input, 'wb') as f:
+            f.write(self.source.encode('utf-8'))
+        self.output = os.path.join(self.tmpdir, 'output.csv')
+        self.checkpoint = os.path.join(self.tmpdir, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_record_input(self):
+        f = RecordInput(self.input, 'utf-8-sig')
+        records = list(f)
+        f.close()
+        self.assertEqual(records[:4], [u'id,name\n', u'1,alpha\n', u'2,"be\nta"\n', u'3,gamma\n'])
+        self.assertEqual(len(records), 500)
+        data = self.source.encode('utf-8')
+        # the offsets of the ends of the records
+        offset = f.pop_offset(2)
+        self.assertTrue(data[:offset].endswith(b'2,"be\r\nta"\r\n'))
+        self.assertEqual(f.pop_offset(1), data.index(b'4,row 4'))
+        # resuming after them
+        f = RecordInput(self.input, 'utf-8-sig', offset=offset)
+        self.assertEqual(list(f), [records[0]] + records[3:])
+        f.close()
+        f = RecordInput(self.input, 'utf-8-sig', header=False, offset=offset)
+        self.assertEqual(list(f), records[3:])
+        f.close()
+
+    def test_record_input_exact(self):
+        regex = record_regex()
+        for record in (u'a,b\n', u'"a","b ""c"""\n', u'a,"b\nc",\n', u'a,""', u''):
+            self.assertTrue(regex.fullmatch(record), record)
+        for record in (u'a"b\n', u'a,"b"c\n', u'"a\n', u'a, "b"\n'):
+            self.assertFalse(regex.fullmatch(record), record)
+        self.assertTrue(record_regex(delimiter=u'\t', skipinitialspace=True).fullmatch(u'a\t "b\tc"\n'))
+        self.assertFalse(record_regex(doublequote=False).fullmatch(u'"a""b"\n'))
+
+        f = RecordInput(self.input, 'utf-8-sig')
+        list(f)
+        f.close()
+        self.assertTrue(f.exact)
+        # the csv module reads the first two records as one row
+        with open(self.input, 'wb') as out:
+            out.write(b'id,name\n1,x"y,"z\nw",a"b\n3,c\n')
+        f = RecordInput(self.input, 'utf-8-sig')
+        self.assertEqual(next(f), u'id,name\n')
+        self.assertTrue(f.exact)
+        self.assertEqual(next(f), u'1,x"y,"z\n')
+        self.assertFalse(f.exact)
+        f.close()
+
+    def test_progress(self):
+        err = six.StringIO()
+        progress = Progress(err, interval=3600, total=1000)
+        progress.update(10, 250)
+        self.assertEqual(err.getvalue(), u'')
+        progress.interval = 0
+        progress.update(20, 500)
+        self.assertTrue(err.getvalue().startswith(u'progress: 20 rows ('), err.getvalue())
+        self.assertIn(u'500 bytes of 1.0 kB (50.0%), ETA ', err.getvalue())
+        progress.report(done=True)
+        self.assertTrue(err.getvalue().endswith(u'(50.0%), done\n'), err.getvalue())
+
+        path = os.path.join(self.tmpdir, 'progress.json')
+        Progress(path=path, total=None, rows=5, start=100).report()
+        with open(path) as f:
+            status = json.load(f)
+        self.assertEqual((status['rows'], status['bytes'], status['total_bytes'], status['done']), (5, 100, None, False))
+
+    def test_cli_progress(self):
+        args = ['-c', 'name', '-m', u's/a/A/', self.input]
+        chk = run_cli(args)
+        for mode in ([], ['--raw'], ['-P', '2']):
+            err = six.StringIO()
+            self.assertMultiLineEqual(run_cli(args + mode + ['--progress', '--progress-interval', '0.001'], err), chk)
+            last = err.getvalue().splitlines()[-1]
+            self.assertTrue(last.startswith(u'progress: 499 rows'), last)
+            self.assertTrue(last.endswith(u'(100.0%), done'), last)
+        path = os.path.join(self.tmpdir, 'progress.json')
+        self.assertMultiLineEqual(run_cli(args + ['--progress-file', path]), chk)
+        with open(path) as f:
+            status = json.load(f)
+        self.assertEqual((status['rows'], status['percent'], status['done']), (499, 100.0, True))
+        self.assertRaises(SystemExit, run_cli, args + [self.input, '--progress'])
+
+    def test_cli_checkpoint(self):
+        args = ['-c', 'name', '-m', u's/a/A/', '-o', self.output, '--checkpoint', self.checkpoint, self.input]
+        chk = run_cli(args[:4] + [self.input]).encode('utf-8')
+        self.assertEqual(run_cli(args + ['--checkpoint-interval', '0.001']), u'')
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), chk)
+        # removed once the run is complete
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # a run interrupted after 3 rows, with more output written after its last checkpoint
+        f = RecordInput(self.input, 'utf-8-sig')
+        self.assertEqual(len(list(f)), 500)
+        f.close()
+        f.pop_offset(1)
+        offset = f.pop_offset(2)
+        size = len(b'\n'.join(chk.split(b'\n')[:5])) + 1
+        with open(self.output, 'wb') as out:
+            out.write(chk[:size + 20])
+        Checkpoint(self.checkpoint, self.input, self.output).save(offset, 3, size)
+        self.assertEqual(run_cli(args + ['--resume']), u'')
+        with open(self.output, 'rb') as out:
+            self.assertEqual(out.read(), chk)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # without a checkpoint, --resume starts from the beginning
+        self.assertEqual(run_cli(args + ['--resume']), u'')
+        with open(self.output, 'rb') as out:
+            self.assertEqual(out.read(), chk)
+
+        # the checkpoint of another input or output, or of an input that changed since
+        checkpoint = Checkpoint(self.checkpoint, self.input, self.output)
+        checkpoint.save(offset, 3, size)
+        self.assertEqual(checkpoint.load()['rows'], 3)
+        self.assertRaises(CheckpointError, Checkpoint(self.checkpoint, self.input, self.input).load)
+        with open(self.input, 'ab') as f:
+            f.write(b'500,row 500\n')
+        self.assertRaises(CheckpointError, checkpoint.load)
+        self.assertRaises(SystemExit, run_cli, args + ['--resume'])
+
+        # no more checkpoints once the records of the input cannot be told apart by their quotes
+        with open(self.input, 'wb') as f:
+            f.write(self.source.encode('utf-8') + b'500,x"y,"z\nw",a"b\n501,c\n')
+        chk = run_cli(args[:4] + [self.input]).encode('utf-8')
+        err = six.StringIO()
+        self.assertEqual(run_cli(args + ['--checkpoint-interval', '0.001', '--batch-size', '10'], err), u'')
+        with open(self.output, 'rb') as out:
+            self.assertEqual(out.read(), chk)
+        self.assertIn(u'No more checkpoints', err.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        self.assertRaises(SystemExit, run_cli, ['-c', 'name', '-m', u's/a/A/', '--resume', self.input])
+        for bad in (['-P', '2'], ['--raw'], ['-a', '2'], ['-o', self.output + '.gz']):
+            self.assertRaises(SystemExit, run_cli, args[:-1] + bad + args[-1:])
+
+class TestBench(unittest.TestCase):
+
+    def test_generate_csv(self):
+        text = bench.generate_csv(rows=50, width=4, cell_size=6, quoting=0.5, unicode=0.5, seed=1)
+        self.assertEqual(text, bench.generate_csv(rows=50, width=4, cell_size=6, quoting=0.5, unicode=0.5, seed=1))
+        self.assertNotEqual(text, bench.generate_csv(rows=50, width=4, cell_size=6, quoting=0.5, unicode=0.5, seed=2))
+        rows = list(agate.csv.reader(six.StringIO(text)))
+        self.assertEqual(rows[0], [u'c0', u'c1', u'c2', u'c3'])
+        self.assertEqual(rows[1:], bench.generate_rows(rows=50, width=4, cell_size=6, quoting=0.5, unicode=0.5, seed=1))
+        self.assertTrue(u'"' in text and any(ord(c) > 127 for c in text))
+
+    def test_compare(self):
+        base = dict(results=[dict(name='a', rows_per_s=100.0), dict(name='b', rows_per_s=100.0)])
+        current = dict(results=[dict(name='a', rows_per_s=85.0), dict(name='b', rows_per_s=95.0),
+                                dict(name='c', rows_per_s=1.0)])
+        self.assertEqual(bench.compare(base, current), [('a', 100.0, 85.0, 0.85, True), ('b', 100.0, 95.0, 0.95, False)])
+        self.assertEqual([regressed for _, _, _, _, regressed in bench.compare(base, current, 0.2)], [False, False])
+
+@unittest.skipIf(aio is None, 'asyncio is not available')
+class TestAio(unittest.TestCase):
+
+    source = [[u'a', u'b'], [u'x1', u'y1'], [u'x2', u'y2'], [u'x3', u'y3'], [u'x4', u'y4']]
+
+    def rows(self):
+        return AsyncRows([list(row) for row in self.source])
+
+    def test_async_modifier(self):
+        for modifiers in ({'a': u'e/x(.)/echo \\1!/', 1: [u'y/y/Y/', u'e/.*[24]/tr a-z A-Z/b']},
+                          {0: u'e/.*/cat/c', 1: [u's/y/z/', u'e/.*/rev/']}, [u'y/x/X/', u'e/3/echo three/z']):
+            chk = list(CSVModifier(iter([list(row) for row in self.source]), modifiers))
+            for kwargs in ({}, {'concurrency': 1}, {'batch_size': 3}):
+                reader = aio.AsyncCSVModifier(self.rows(), modifiers, **kwargs)
+                self.assertEqual(run_async(reader), chk)
+                self.assertEqual(reader.column_names, [u'a', u'b'])
+        # plain iterables work too
+        self.assertEqual(run_async(aio.AsyncCSVModifier(iter(self.source[1:]), [u's/x/-/'], header=False))[-1],
+                         [u'-4', u'y4'])
+
+    def test_async_coprocess_large(self):
+        # larger than the pipe buffers: cat writes its output back while the cell is still being written
+        value = u'ab' * 1000000
+        reader = aio.AsyncCSVModifier(AsyncRows([[u'a'], [value], [u'c']]), [u'e/./cat/c'])
+        self.assertEqual(run_async(reader), [[u'a'], [value], [u'c']])
+
+    def test_async_concurrency(self):
+        # the commands run concurrently, but the rows come out in order
+        rows = AsyncRows([[u'n']] + [[six.text_type(idx)] for idx in range(8)])
+        reader = aio.AsyncCSVModifier(rows, [u'e/.*/sleep 0.$((7 - \\g<0>)); echo \\g<0>/'], concurrency=8)
+        start = timeit.default_timer()
+        self.assertEqual(run_async(reader), [[u'n']] + [[six.text_type(idx)] for idx in range(8)])
+        self.assertTrue(timeit.default_timer() - start < 2)
+
+    def test_async_failure(self):
+        err = six.StringIO()
+        stderr, sys.stderr = sys.stderr, err
+        try:
+            reader = aio.AsyncCSVModifier(self.rows(), {0: u'e/x3/exit 3/'})
+            self.assertRaises(SystemExit, run_async, reader)
+            reader = aio.AsyncCSVModifier(self.rows(), {0: u'e/x2/echo oops >&2; exit 1/c'})
+            self.assertRaises(SystemExit, run_async, reader)
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(err.getvalue(), u'command `exit 3` failed: command `echo oops >&2; exit 1` failed: oops\n')
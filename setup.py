@@ -43,7 +43,7 @@ dependencies = [
 
 entrypoints = {
   'console_scripts': [
-    'csvsed             = csvsed.cli:launch_new_instance',
+    'csvsed             = csvsed.main:launch_new_instance',
   ],
 }
 